@@ -14,6 +14,7 @@ import os
 import sys
 from datetime import datetime
 import asyncio
+from collections import OrderedDict
 
 # Добавляем путь к core модулям
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
@@ -27,6 +28,11 @@ except ImportError:
     get_safe_news_integrator = None
     get_news_stats_tracker = None
 
+try:
+    from api.response_cache import CacheRule, ResponseCache, ResponseCacheMiddleware
+except ImportError:
+    from response_cache import CacheRule, ResponseCache, ResponseCacheMiddleware
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -40,6 +46,18 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Кеш ответов GET эндпоинтов: опрос дашбордами не превращается в запрос к БД на каждый вызов
+# ttl - ответ свежий, stale - еще отдается, пока обновляется в фоне (/health не кешируется - нужен живой статус)
+CACHE_RULES = {
+    "/stats": CacheRule(ttl=5, stale=30),
+    "/api/news-analysis": CacheRule(ttl=30, stale=120),
+    "/api/config": CacheRule(ttl=300, stale=3600),
+}
+response_cache = ResponseCache()
+
+# Подключается до CORS, т.е. внутренним слоем: заголовки CORS зависят от Origin и в кеш не попадают
+app.add_middleware(ResponseCacheMiddleware, rules=CACHE_RULES, cache=response_cache)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -54,6 +72,10 @@ class TelegramSignal(BaseModel):
     type: str
     timestamp: str
     data: Dict[str, Any]
+    outbox_id: Optional[int] = None
+
+class TelegramSignalBatch(BaseModel):
+    signals: List[TelegramSignal]
 
 class HealthCheck(BaseModel):
     status: str
@@ -66,9 +88,29 @@ app_stats = {
     'start_time': datetime.now(),
     'requests_count': 0,
     'signals_processed': 0,
-    'errors_count': 0
+    'errors_count': 0,
+    'duplicates_skipped': 0
 }
 
+# Недавно принятые записи outbox: повтор пачки после таймаута не обрабатывается второй раз
+# Ключ outbox_id + timestamp - id локальные для outbox отправителя и начинаются заново с новой базой
+recent_outbox_ids: 'OrderedDict[tuple, None]' = OrderedDict()
+RECENT_OUTBOX_IDS_MAX = int(os.getenv('GHOST_WEBHOOK_DEDUPE_SIZE', '50000'))
+
+def is_duplicate_delivery(signal: TelegramSignal) -> bool:
+    """True если запись outbox уже принималась; без outbox_id дубликатом не считается"""
+    if signal.outbox_id is None:
+        return False
+    key = (signal.outbox_id, signal.timestamp)
+    if key in recent_outbox_ids:
+        recent_outbox_ids.move_to_end(key)
+        app_stats['duplicates_skipped'] += 1
+        return True
+    recent_outbox_ids[key] = None
+    while len(recent_outbox_ids) > RECENT_OUTBOX_IDS_MAX:
+        recent_outbox_ids.popitem(last=False)
+    return False
+
 # Middleware для подсчета запросов
 @app.middleware("http")
 async def count_requests(request: Request, call_next):
@@ -136,8 +178,10 @@ async def get_stats():
         "requests_total": app_stats['requests_count'],
         "signals_processed": app_stats['signals_processed'],
         "errors_count": app_stats['errors_count'],
+        "duplicates_skipped": app_stats['duplicates_skipped'],
         "start_time": app_stats['start_time'].isoformat(),
-        "current_time": datetime.now().isoformat()
+        "current_time": datetime.now().isoformat(),
+        "response_cache": response_cache.get_stats()
     }
 
 # Webhook для получения сигналов от Telegram Bridge
@@ -149,6 +193,9 @@ async def telegram_webhook(signal: TelegramSignal, background_tasks: BackgroundT
     try:
         logger.info(f"📨 Received telegram signal: {signal.type}")
         
+        if is_duplicate_delivery(signal):
+            return {"status": "duplicate", "message": "Signal already received"}
+        
         # Обрабатываем в фоне
         background_tasks.add_task(process_telegram_signal, signal)
         
@@ -161,6 +208,27 @@ async def telegram_webhook(signal: TelegramSignal, background_tasks: BackgroundT
         logger.error(f"Error processing telegram webhook: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/webhooks/telegram/batch")
+async def telegram_webhook_batch(batch: TelegramSignalBatch, background_tasks: BackgroundTasks):
+    """
+    Пачка сигналов из outbox Telegram Bridge (один запрос на много сигналов)
+    """
+    try:
+        logger.info(f"📨 Received telegram batch: {len(batch.signals)} signals")
+        
+        fresh = [signal for signal in batch.signals if not is_duplicate_delivery(signal)]
+        for signal in fresh:
+            background_tasks.add_task(process_telegram_signal, signal)
+        
+        app_stats['signals_processed'] += len(fresh)
+        
+        return {"status": "received", "count": len(fresh), "duplicates": len(batch.signals) - len(fresh)}
+        
+    except Exception as e:
+        app_stats['errors_count'] += 1
+        logger.error(f"Error processing telegram batch webhook: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 async def process_telegram_signal(signal: TelegramSignal):
     """Фоновая обработка telegram сигнала"""
     try:
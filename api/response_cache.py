@@ -0,0 +1,240 @@
+"""
+GHOST API Response Cache
+Кеш ответов GET эндпоинтов на уровне ASGI: TTL на маршрут, склейка одновременных одинаковых запросов,
+отдача устаревшего ответа с фоновым обновлением (stale-while-revalidate) и ETag / If-None-Match -> 304
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    """ttl - сколько ответ свежий, stale - сколько еще его можно отдавать, пока он обновляется в фоне"""
+    ttl: float
+    stale: float = 0.0
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    headers: Headers
+    body: bytes
+    etag: str
+    fresh_until: float = 0.0
+    stale_until: float = 0.0
+
+
+def cache_key(scope: Dict[str, Any]) -> str:
+    """Путь + отсортированные параметры запроса (?a=1&b=2 и ?b=2&a=1 - один ключ)"""
+    query = scope.get('query_string', b'').decode('latin-1')
+    params = '&'.join(sorted(p for p in query.split('&') if p))
+    return f"{scope['path']}?{params}"
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match: список тегов через запятую, слабые (W/) сравниваются как сильные, * - любой"""
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or tag.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    LRU кеш отрендеренных ответов
+
+    Свежая запись отдается сразу; устаревшая (в пределах stale) отдается сразу и обновляется в фоне;
+    без записи рендер выполняется один раз на ключ - остальные одновременные запросы ждут его результат.
+    Кешируются только ответы 200.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or int(os.getenv('GHOST_API_CACHE_MAX_ENTRIES', '512'))
+        self._entries: 'OrderedDict[str, CachedResponse]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'stale_served': 0,
+            'coalesced': 0,
+            'revalidations': 0,
+            'not_modified': 0,
+            'render_errors': 0
+        }
+
+    async def get(self, key: str, rule: CacheRule,
+                  render: Callable[[], Awaitable[CachedResponse]]) -> Tuple[CachedResponse, str]:
+        """Ответ и как он получен: HIT / STALE / COALESCED / MISS"""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry, 'HIT'
+            if now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self.stats['stale_served'] += 1
+                self._revalidate(key, rule, render)
+                return entry, 'STALE'
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            # shield: отключение одного клиента не отменяет общий рендер
+            return await asyncio.shield(future), 'COALESCED'
+
+        self.stats['misses'] += 1
+        return await asyncio.shield(self._start(key, rule, render)), 'MISS'
+
+    def _start(self, key: str, rule: CacheRule,
+               render: Callable[[], Awaitable[CachedResponse]]) -> asyncio.Future:
+        future = asyncio.ensure_future(self._fill(key, rule, render))
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return future
+
+    async def _fill(self, key: str, rule: CacheRule,
+                    render: Callable[[], Awaitable[CachedResponse]]) -> CachedResponse:
+        try:
+            response = await render()
+        except Exception:
+            self.stats['render_errors'] += 1
+            raise
+
+        if response.status == 200:
+            now = time.monotonic()
+            response.fresh_until = now + rule.ttl
+            response.stale_until = response.fresh_until + rule.stale
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return response
+
+    def _revalidate(self, key: str, rule: CacheRule, render: Callable[[], Awaitable[CachedResponse]]):
+        """Фоновое обновление устаревшей записи (не больше одного на ключ)"""
+        if key in self._inflight:
+            return
+        self.stats['revalidations'] += 1
+        task = self._start(key, rule, render)
+        self._background.add(task)
+        task.add_done_callback(self._revalidated)
+
+    def _revalidated(self, task: asyncio.Task):
+        self._background.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            # Устаревшая запись остается и отдается до конца окна stale
+            logger.warning(f"⚠️ Response cache revalidation failed: {error}")
+
+    def invalidate(self, prefix: str = ''):
+        """Удалить записи, ключ которых начинается с prefix (все - без аргумента)"""
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            del self._entries[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        served = self.stats['hits'] + self.stats['stale_served'] + self.stats['coalesced']
+        total = served + self.stats['misses']
+        return {
+            **self.stats,
+            'entries': len(self._entries),
+            'inflight': len(self._inflight),
+            'hit_rate': round(served / total, 3) if total else 0.0
+        }
+
+
+class ResponseCacheMiddleware:
+    """
+    ASGI middleware: GET запросы к маршрутам из rules обслуживаются через ResponseCache
+
+    Рендер вызывает внутреннее приложение с собственными receive/send, поэтому фоновое обновление
+    не зависит от соединения клиента. Подключать до CORS (внутренним слоем), чтобы в кеш не попадали
+    заголовки, зависящие от Origin конкретного запроса.
+    """
+
+    def __init__(self, app, rules: Dict[str, CacheRule], cache: Optional[ResponseCache] = None):
+        self.app = app
+        self.rules = rules
+        self.cache = cache or ResponseCache()
+        self.enabled = os.getenv('GHOST_API_CACHE', '1') != '0'
+
+    async def __call__(self, scope, receive, send):
+        rule = self.rules.get(scope.get('path')) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+        if rule is None or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        response, source = await self.cache.get(cache_key(scope), rule, lambda: self._render(scope))
+        if response.status != 200:
+            # Ошибки не кешируются и отдаются как есть
+            await self._send(send, response.status, response.headers, response.body)
+            return
+
+        max_age = max(0, int(response.fresh_until - time.monotonic()))
+        cache_headers = [
+            (b'etag', response.etag.encode()),
+            (b'cache-control', f"max-age={max_age}, stale-while-revalidate={int(rule.stale)}".encode()),
+            (b'x-cache', source.encode())
+        ]
+
+        if_none_match = self._header(scope, b'if-none-match')
+        if if_none_match and etag_matches(if_none_match, response.etag):
+            self.cache.stats['not_modified'] += 1
+            await self._send(send, 304, cache_headers, b'')
+            return
+
+        await self._send(send, 200, response.headers + cache_headers, response.body)
+
+    async def _render(self, scope) -> CachedResponse:
+        status = 500
+        headers: Headers = []
+        chunks: List[bytes] = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def capture(message):
+            nonlocal status, headers
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                headers = [(k, v) for k, v in message.get('headers', [])
+                           if k.lower() not in (b'etag', b'cache-control')]
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        await self.app(dict(scope), receive, capture)
+        body = b''.join(chunks)
+        return CachedResponse(status=status, headers=headers, body=body, etag=make_etag(body))
+
+    @staticmethod
+    def _header(scope, name: bytes) -> Optional[str]:
+        for key, value in scope.get('headers', []):
+            if key.lower() == name:
+                return value.decode('latin-1')
+        return None
+
+    @staticmethod
+    async def _send(send, status: int, headers: Headers, body: bytes):
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,275 @@
+"""
+GHOST Change Feed
+Опрос таблиц по водяной метке (updated_at, id): каждый проход читает только строки, изменившиеся с прошлого
+Keyset-пагинация по (cursor, id), метка сдвигается после успешного применения страницы и может храниться на диске
+
+Опрос начинается с перекрытием (метка минус overlap секунд / id): updated_at = NOW() - время начала транзакции,
+а не коммита, и SERIAL id выдаются до коммита, поэтому строка может стать видимой уже после того, как метка
+прошла ее значение. Уже примененные пары (id, cursor) из окна перекрытия отбрасываются. Строка, закоммиченная
+позже, чем через overlap после своей метки, все еще может быть пропущена - окно настраивается.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (значение cursor-колонки или None, значение id)
+Watermark = Tuple[Any, Any]
+PageFetcher = Callable[[Optional[Watermark], int], List[Dict[str, Any]]]
+
+
+def _quote(value: Any) -> str:
+    """Значение для фильтра PostgREST or=(...) (даты содержат ':' и '+')"""
+    return '"' + str(value).replace('"', '\\"') + '"'
+
+
+def _sort_key(value: Any) -> Optional[float]:
+    """Числовое значение метки для сравнения: epoch / число или ISO дата; None - не сравнивается"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def supabase_fetcher(supabase, table: str, columns: str = '*', cursor_column: Optional[str] = 'updated_at',
+                     id_column: str = 'id',
+                     filters: Optional[Callable[[Any], Any]] = None) -> PageFetcher:
+    """
+    Страница строк Supabase после водяной метки, по возрастанию (cursor, id)
+
+    Метка (cursor, None) - строки с cursor >= значения (начало окна перекрытия).
+    filters - дополнительные условия запроса (например окно по posted_ts), применяются к каждой странице
+    """
+    def fetch(after: Optional[Watermark], limit: int) -> List[Dict[str, Any]]:
+        query = supabase.table(table).select(columns)
+        if filters is not None:
+            query = filters(query)
+
+        if after is not None:
+            cursor_value, id_value = after
+            if cursor_column is None:
+                query = query.gt(id_column, id_value)
+            elif id_value is None:
+                query = query.gte(cursor_column, cursor_value)
+            else:
+                query = query.or_(
+                    f"{cursor_column}.gt.{_quote(cursor_value)},"
+                    f"and({cursor_column}.eq.{_quote(cursor_value)},{id_column}.gt.{_quote(id_value)})"
+                )
+
+        if cursor_column is not None:
+            query = query.order(cursor_column)
+        query = query.order(id_column).limit(limit)
+        return query.execute().data or []
+
+    return fetch
+
+
+class ChangeFeedPoller:
+    """
+    Инкрементальный опрос источника строк
+
+    poll(apply) вызывает apply(rows) на каждую страницу изменений; метка сдвигается,
+    только если apply не упал - при ошибке следующая попытка перечитает ту же страницу.
+    С state_path метка переживает рестарт (для потребителей с сохраняемым состоянием).
+
+    overlap - перекрытие опроса: секунды для cursor-колонки (GHOST_CHANGE_FEED_OVERLAP_SECONDS, 5)
+    или количество id для опроса только по id (GHOST_CHANGE_FEED_OVERLAP_IDS, 100); 0 - без перекрытия.
+    """
+
+    def __init__(self, name: str, fetch: PageFetcher, cursor_column: Optional[str] = 'updated_at',
+                 id_column: str = 'id', page_size: int = 500, state_path: str = None,
+                 overlap: float = None):
+        self.name = name
+        self.fetch = fetch
+        self.cursor_column = cursor_column
+        self.id_column = id_column
+        self.page_size = page_size
+        self.state_path = state_path
+        if overlap is None:
+            overlap = (float(os.getenv('GHOST_CHANGE_FEED_OVERLAP_SECONDS', '5')) if cursor_column
+                       else float(os.getenv('GHOST_CHANGE_FEED_OVERLAP_IDS', '100')))
+        self.overlap = overlap
+
+        self.watermark: Optional[Watermark] = None
+        # Примененные строки окна перекрытия: (id, cursor) -> числовое значение метки
+        self._seen: Dict[Tuple[str, str], float] = {}
+        self._load_state()
+
+        self.stats = {
+            'polls': 0,
+            'pages': 0,
+            'rows': 0,
+            'empty_polls': 0,
+            'overlap_skipped': 0,
+            'errors': 0,
+            'last_poll_ms': 0.0
+        }
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.watermark = (state.get('cursor'), state.get('id'))
+            self._seen = {(row_id, cursor): key for row_id, cursor, key in state.get('seen', [])}
+            logger.info(f"♻️ Change feed {self.name}: resuming after {self.watermark}")
+        except Exception as e:
+            logger.warning(f"⚠️ Change feed {self.name}: state unreadable, starting from scratch: {e}")
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        cursor_value, id_value = self.watermark
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'cursor': cursor_value, 'id': id_value, 'saved_at': time.time(),
+                'seen': [[row_id, cursor, key] for (row_id, cursor), key in self._seen.items()]
+            }, f, default=str)
+        os.replace(tmp_path, self.state_path)
+
+    def _row_watermark(self, row: Dict[str, Any]) -> Watermark:
+        cursor_value = row.get(self.cursor_column) if self.cursor_column else None
+        return cursor_value, row.get(self.id_column)
+
+    def _mark_key(self, watermark: Watermark) -> Optional[float]:
+        cursor_value, id_value = watermark
+        return _sort_key(cursor_value if self.cursor_column else id_value)
+
+    def _row_seen_key(self, row: Dict[str, Any]) -> Tuple[str, str]:
+        cursor_value, id_value = self._row_watermark(row)
+        return str(id_value), str(cursor_value)
+
+    def _floor(self) -> Optional[float]:
+        """Начало окна перекрытия (числом) или None - перекрытия нет"""
+        if self.watermark is None or not self.overlap:
+            return None
+        key = self._mark_key(self.watermark)
+        return None if key is None else key - self.overlap
+
+    def _fetch_start(self) -> Optional[Watermark]:
+        """С какой метки читать: водяная метка минус перекрытие"""
+        floor = self._floor()
+        if floor is None:
+            return self.watermark
+        if self.cursor_column is None:
+            return None, int(floor) if isinstance(self.watermark[1], int) else floor
+        cursor_value = self.watermark[0]
+        if isinstance(cursor_value, (int, float)):
+            return floor, None
+        return datetime.fromtimestamp(floor, timezone.utc).isoformat(), None
+
+    def reset(self):
+        """Следующий опрос прочитает источник целиком (с учетом фильтров fetcher'а)"""
+        self.watermark = None
+        self._seen.clear()
+        if self.state_path and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    def _unseen(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Строки страницы без уже примененных версий из окна перекрытия"""
+        fresh = [row for row in rows if self._row_seen_key(row) not in self._seen]
+        self.stats['overlap_skipped'] += len(rows) - len(fresh)
+        return fresh
+
+    def _advance(self, rows: List[Dict[str, Any]], fresh: List[Dict[str, Any]]):
+        """После применения fresh: метка - максимум из текущей и последней строки страницы"""
+        last = self._row_watermark(rows[-1])
+        last_key, current_key = self._mark_key(last), None
+        if self.watermark is not None:
+            current_key = self._mark_key(self.watermark)
+        if self.watermark is None or last_key is None or current_key is None or last_key >= current_key:
+            self.watermark = last
+
+        floor = self._floor()
+        if floor is not None:
+            for row in fresh:
+                key = self._mark_key(self._row_watermark(row))
+                if key is not None and key >= floor:
+                    self._seen[self._row_seen_key(row)] = key
+            self._seen = {pair: key for pair, key in self._seen.items() if key >= floor}
+
+        self._save_state()
+        self.stats['pages'] += 1
+        self.stats['rows'] += len(fresh)
+
+    def poll_sync(self, apply: Callable[[List[Dict[str, Any]]], Any]) -> int:
+        """Синхронный проход до конца изменений; количество примененных строк"""
+        started = time.perf_counter()
+        applied = 0
+        try:
+            position = self._fetch_start()
+            while True:
+                rows = self.fetch(position, self.page_size)
+                if not rows:
+                    break
+                fresh = self._unseen(rows)
+                if fresh:
+                    apply(fresh)
+                self._advance(rows, fresh)
+                applied += len(fresh)
+                if len(rows) < self.page_size:
+                    break
+                position = self._row_watermark(rows[-1])
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"❌ Change feed {self.name} poll failed: {e}")
+        self._finish_poll(applied, started)
+        return applied
+
+    async def poll(self, apply: Callable[[List[Dict[str, Any]]], Any]) -> int:
+        """Асинхронный проход: запрос страницы в потоке, apply может быть корутиной"""
+        started = time.perf_counter()
+        applied = 0
+        try:
+            position = self._fetch_start()
+            while True:
+                rows = await asyncio.to_thread(self.fetch, position, self.page_size)
+                if not rows:
+                    break
+                fresh = self._unseen(rows)
+                if fresh:
+                    result = apply(fresh)
+                    if asyncio.iscoroutine(result):
+                        await result
+                self._advance(rows, fresh)
+                applied += len(fresh)
+                if len(rows) < self.page_size:
+                    break
+                position = self._row_watermark(rows[-1])
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"❌ Change feed {self.name} poll failed: {e}")
+        self._finish_poll(applied, started)
+        return applied
+
+    def _finish_poll(self, applied: int, started: float):
+        self.stats['polls'] += 1
+        if not applied:
+            self.stats['empty_polls'] += 1
+        self.stats['last_poll_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'watermark': self.watermark, 'overlap_window': len(self._seen)}
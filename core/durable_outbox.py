@@ -0,0 +1,102 @@
+"""
+GHOST Durable Outbox
+Локальная надежная очередь исходящих записей в SQLite (WAL)
+Запись мгновенная и переживает рестарт; отправители забирают пачки, подтверждают или откладывают
+Записи, исчерпавшие попытки, переносятся в outbox_dead и больше не блокируют очередь
+"""
+
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class DurableOutbox:
+    """Очередь сообщений в SQLite: append -> fetch_batch -> ack / retry / dead_letter"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.path, isolation_level=None)
+        # WAL + NORMAL: запись без fsync на каждую транзакцию, переживает падение процесса
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_next ON outbox(next_attempt_at, id)')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox_dead (
+                id INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL,
+                error TEXT,
+                failed_at REAL NOT NULL
+            )
+        ''')
+
+    def append(self, payload: Dict[str, Any]) -> int:
+        cursor = self.conn.execute(
+            'INSERT INTO outbox (payload, created_at) VALUES (?, ?)',
+            (json.dumps(payload, ensure_ascii=False, default=str), time.time())
+        )
+        return cursor.lastrowid
+
+    def fetch_batch(self, limit: int = 100) -> List[Tuple[int, Dict[str, Any], int]]:
+        """Готовые к отправке записи: (id, payload, attempts)"""
+        rows = self.conn.execute(
+            'SELECT id, payload, attempts FROM outbox WHERE next_attempt_at <= ? ORDER BY id LIMIT ?',
+            (time.time(), limit)
+        ).fetchall()
+        return [(row_id, json.loads(payload), attempts) for row_id, payload, attempts in rows]
+
+    def ack(self, ids: List[int]):
+        self.conn.executemany('DELETE FROM outbox WHERE id = ?', [(row_id,) for row_id in ids])
+
+    def retry(self, ids: List[int], delay: float):
+        self.conn.executemany(
+            'UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ? WHERE id = ?',
+            [(time.time() + delay, row_id) for row_id in ids]
+        )
+
+    def dead_letter(self, ids: List[int], error: str = None):
+        """Перенос записей в outbox_dead (последняя попытка засчитывается) - для разбора вручную"""
+        now = time.time()
+        self.conn.execute('BEGIN')
+        try:
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO outbox_dead (id, payload, created_at, attempts, error, failed_at)
+                SELECT id, payload, created_at, attempts + 1, ?, ? FROM outbox WHERE id = ?
+            ''', [(error, now, row_id) for row_id in ids])
+            self.conn.executemany('DELETE FROM outbox WHERE id = ?', [(row_id,) for row_id in ids])
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def dead_count(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM outbox_dead').fetchone()[0]
+
+    def next_due_in(self) -> Optional[float]:
+        """Через сколько секунд будет готова ближайшая запись (None - outbox пуст)"""
+        row = self.conn.execute('SELECT MIN(next_attempt_at) FROM outbox').fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def close(self):
+        self.conn.close()
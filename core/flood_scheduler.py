@@ -0,0 +1,73 @@
+"""
+GHOST Flood Scheduler
+Общий бюджет запросов к Telegram API для нескольких параллельных задач
+Token bucket + глобальная пауза по FloodWait: одна ошибка тормозит всех, а не каждого по очереди
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class FloodWaitScheduler:
+    """
+    Token bucket на запросы с FIFO-очередью ожидающих
+
+    rate - запросов в секунду в среднем, burst - сколько можно подряд после простоя
+    asyncio.Lock отдает управление в порядке ожидания, поэтому каналы получают бюджет по очереди
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 5):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+        self.stats = {
+            'requests': 0,
+            'flood_waits': 0,
+            'flood_wait_seconds': 0,
+            'by_key': {}
+        }
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, key: str = ''):
+        """Дождаться разрешения на один запрос"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+        self.stats['requests'] += 1
+        by_key: Dict[str, int] = self.stats['by_key']
+        by_key[key] = by_key.get(key, 0) + 1
+
+    def flood_wait(self, seconds: float, key: str = ''):
+        """FloodWait от Telegram: пауза для всех и пустой бакет после нее"""
+        until = time.monotonic() + seconds + 1
+        if until > self._paused_until:
+            self._paused_until = until
+        self._tokens = 0.0
+        self._updated = self._paused_until
+        self.stats['flood_waits'] += 1
+        self.stats['flood_wait_seconds'] += seconds
+        logger.warning(f"⏱️ FloodWait {seconds}s ({key or 'request'}) - all requests paused")
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, 'by_key': dict(self.stats['by_key'])}
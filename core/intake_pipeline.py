@@ -0,0 +1,265 @@
+"""
+GHOST Intake Pipeline
+Стадии обработки входящих сообщений, связанные ограниченными очередями
+Справедливость между каналами (round-robin по ключу) и явные политики переполнения
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Политики переполнения очереди канала
+DROP_OLDEST = "drop_oldest"   # свежие сообщения важнее - выбрасываем самое старое
+DROP_NEWEST = "drop_newest"   # очередь не трогаем - новое сообщение отбрасывается
+BLOCK = "block"               # ждем место (backpressure вверх по цепочке)
+
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class FairQueue:
+    """Ограниченные очереди по ключам (каналам) с выдачей по кругу"""
+
+    def __init__(self, maxsize: int = 100, policy: str = DROP_OLDEST):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+
+        self.default_maxsize = maxsize
+        self.default_policy = policy
+
+        self._queues: Dict[str, Deque[Tuple[float, Any]]] = {}
+        self._limits: Dict[str, Tuple[int, str]] = {}
+        self._ring: Deque[str] = deque()  # ключи с ожидающими элементами, в порядке обслуживания
+        self._size = 0
+
+        self._not_empty = asyncio.Event()
+        self._space: Dict[str, asyncio.Event] = {}
+
+        self.dropped: Dict[str, int] = {}
+
+    def configure(self, key: str, maxsize: int = None, policy: str = None):
+        """Лимит и политика для конкретного канала"""
+        policy = policy or self.default_policy
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self._limits[key] = (maxsize or self.default_maxsize, policy)
+
+    def _limit(self, key: str) -> Tuple[int, str]:
+        return self._limits.get(key, (self.default_maxsize, self.default_policy))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def depth(self, key: str) -> int:
+        queue = self._queues.get(key)
+        return len(queue) if queue else 0
+
+    def _append(self, key: str, item: Any):
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+        if not queue:
+            self._ring.append(key)
+        queue.append((time.monotonic(), item))
+        self._size += 1
+        self._not_empty.set()
+
+    def _drop(self, key: str):
+        self.dropped[key] = self.dropped.get(key, 0) + 1
+
+    async def put(self, key: str, item: Any) -> bool:
+        """Постановка в очередь по политике канала (False - элемент отброшен)"""
+        maxsize, policy = self._limit(key)
+
+        while self.depth(key) >= maxsize:
+            if policy == DROP_NEWEST:
+                self._drop(key)
+                return False
+            if policy == DROP_OLDEST:
+                queue = self._queues[key]
+                queue.popleft()
+                self._size -= 1
+                self._drop(key)
+                if not queue:
+                    self._ring.remove(key)
+                break
+            space = self._space.get(key)
+            if space is None:
+                space = self._space[key] = asyncio.Event()
+            space.clear()
+            await space.wait()
+
+        self._append(key, item)
+        return True
+
+    async def get(self) -> Tuple[str, float, Any]:
+        """Следующий элемент по кругу между каналами: (ключ, время постановки, элемент)"""
+        while not self._ring:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        key = self._ring.popleft()
+        queue = self._queues[key]
+        enqueued_at, item = queue.popleft()
+        self._size -= 1
+        if queue:
+            self._ring.append(key)
+
+        space = self._space.get(key)
+        if space is not None:
+            space.set()
+
+        return key, enqueued_at, item
+
+    def drain(self) -> List[Tuple[str, Any]]:
+        """Забрать все ожидающие элементы (при остановке): [(ключ, элемент)]"""
+        items = [(key, item) for key, queue in self._queues.items() for _, item in queue]
+        self._queues.clear()
+        self._ring.clear()
+        self._size = 0
+        for space in self._space.values():
+            space.set()
+        return items
+
+
+class Stage:
+    """Стадия обработки: пул воркеров над собственной FairQueue"""
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[Optional[Any]]],
+                 workers: int = 1, maxsize: int = 100, policy: str = BLOCK):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue = FairQueue(maxsize=maxsize, policy=policy)
+        self.next: Optional['Stage'] = None
+
+        self._tasks: List[asyncio.Task] = []
+        # Элементы в обработке у воркеров и прерванные остановкой
+        self._busy = 0
+        self._abandoned: List[Tuple[str, Any]] = []
+        self.stats = {
+            'processed': 0,
+            'errors': 0,
+            'total_wait': 0.0,
+            'total_time': 0.0,
+            'max_depth': 0
+        }
+
+    async def submit(self, key: str, item: Any) -> bool:
+        accepted = await self.queue.put(key, item)
+        if len(self.queue) > self.stats['max_depth']:
+            self.stats['max_depth'] = len(self.queue)
+        return accepted
+
+    @property
+    def is_idle(self) -> bool:
+        return not len(self.queue) and not self._busy
+
+    async def _worker(self):
+        while True:
+            key, enqueued_at, item = await self.queue.get()
+            self._busy += 1
+            try:
+                await self._process(key, enqueued_at, item)
+            finally:
+                self._busy -= 1
+
+    async def _process(self, key: str, enqueued_at: float, item: Any):
+        started = time.monotonic()
+        self.stats['total_wait'] += started - enqueued_at
+
+        try:
+            result = await self.handler(item)
+        except asyncio.CancelledError:
+            self._abandoned.append((key, item))
+            raise
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"❌ Intake stage {self.name} failed: {e}")
+            return
+        finally:
+            self.stats['total_time'] += time.monotonic() - started
+
+        self.stats['processed'] += 1
+        if result is not None and self.next is not None:
+            try:
+                await self.next.submit(key, result)
+            except asyncio.CancelledError:
+                self._abandoned.append((key, result))
+                raise
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(), name=f"intake-{self.name}-{i}")
+                           for i in range(self.workers)]
+
+    async def stop(self) -> List[Tuple[str, Any]]:
+        """Остановка воркеров; возвращает необработанное: прерванное и оставшееся в очереди"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        unfinished, self._abandoned = self._abandoned, []
+        return unfinished + self.queue.drain()
+
+    def get_stats(self) -> Dict[str, Any]:
+        processed = max(self.stats['processed'] + self.stats['errors'], 1)
+        return {
+            'processed': self.stats['processed'],
+            'errors': self.stats['errors'],
+            'queued': len(self.queue),
+            'max_depth': self.stats['max_depth'],
+            'dropped': dict(self.queue.dropped),
+            'avg_wait_ms': round(self.stats['total_wait'] / processed * 1000, 2),
+            'avg_time_ms': round(self.stats['total_time'] / processed * 1000, 2),
+            'workers': self.workers
+        }
+
+
+class IntakePipeline:
+    """Цепочка стадий; ключ (канал) сохраняется при переходе между стадиями"""
+
+    def __init__(self, stages: List[Stage]):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        for current, following in zip(stages, stages[1:]):
+            current.next = following
+
+    def configure_key(self, key: str, maxsize: int = None, policy: str = None):
+        """Лимит/политика канала на входной стадии (внутренние стадии дают backpressure)"""
+        self.stages[0].queue.configure(key, maxsize, policy)
+
+    async def submit(self, key: str, item: Any) -> bool:
+        return await self.stages[0].submit(key, item)
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self.stages[0]._tasks)
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        logger.info(f"✅ Intake pipeline started: {' -> '.join(s.name for s in self.stages)}")
+
+    async def drain(self, timeout: float = 10.0) -> bool:
+        """Дождаться, пока все стадии разберут очереди (True - успели за timeout)"""
+        deadline = time.monotonic() + timeout
+        while not all(stage.is_idle for stage in self.stages):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    async def stop(self) -> List[Tuple[str, Any]]:
+        """Остановка стадий; возвращает элементы, которые так и не были обработаны до конца"""
+        unfinished = []
+        for stage in self.stages:
+            unfinished.extend(await stage.stop())
+        return unfinished
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {stage.name: stage.get_stats() for stage in self.stages}
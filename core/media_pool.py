@@ -0,0 +1,307 @@
+"""
+GHOST Media Download Pool
+Фоновое скачивание медиа из Telegram: ограниченный параллелизм, лимит размера, только изображения
+Файлы в локальном кеше по sha256 содержимого, повторы (репосты) скачиваются один раз
+Кеш ограничен по объему (LRU) и возрасту файлов, индекс периодически переписывается без мертвых строк
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_INDEX_FILE = 'index.tsv'  # media_key \t sha256 \t ext
+
+
+@dataclass
+class MediaFile:
+    """Скачанное изображение"""
+    data: bytes
+    path: str
+    sha256: str
+    image_format: str  # JPG / PNG / WEBP - как ждут парсеры
+    cached: bool = False
+
+
+def media_key(message) -> Optional[str]:
+    """Стабильный ID файла в Telegram (у репоста тот же photo/document id)"""
+    if getattr(message, 'photo', None) is not None:
+        return f"photo:{message.photo.id}"
+    if getattr(message, 'document', None) is not None:
+        return f"doc:{message.document.id}"
+    return None
+
+
+def _image_format(message) -> Optional[str]:
+    """Формат изображения или None, если медиа парсерам не нужно (видео, файлы, стикеры)"""
+    if getattr(message, 'photo', None) is not None:
+        return 'JPG'
+    document = getattr(message, 'document', None)
+    mime_type = getattr(document, 'mime_type', None) or ''
+    if not mime_type.startswith('image/'):
+        return None
+    return {'image/png': 'PNG', 'image/webp': 'WEBP'}.get(mime_type, 'JPG')
+
+
+def _media_size(message) -> int:
+    """Размер по метаданным (для фото - самый крупный вариант), 0 если неизвестен"""
+    if getattr(message, 'photo', None) is not None:
+        sizes = [getattr(size, 'size', 0) or max(getattr(size, 'sizes', None) or [0])
+                 for size in getattr(message.photo, 'sizes', None) or []]
+        return max(sizes, default=0)
+    return getattr(getattr(message, 'document', None), 'size', 0) or 0
+
+
+class MediaDownloadPool:
+    """Пул фоновых загрузок: fetch() сразу возвращает задачу, сообщение ждет ее только если нужно"""
+
+    def __init__(self, client, cache_dir: str = None, max_concurrency: int = None,
+                 max_bytes: int = None, timeout: float = None,
+                 cache_max_mb: float = None, cache_max_days: float = None):
+        self.client = client
+        self.cache_dir = cache_dir or os.getenv('GHOST_MEDIA_CACHE_DIR', 'data/media_cache')
+        self.max_bytes = max_bytes or int(os.getenv('GHOST_MEDIA_MAX_BYTES', str(10 * 1024 * 1024)))
+        self.timeout = timeout or float(os.getenv('GHOST_MEDIA_TIMEOUT', '30'))
+        self._semaphore = asyncio.Semaphore(max_concurrency or int(os.getenv('GHOST_MEDIA_CONCURRENCY', '3')))
+        # Лимиты кеша: объем (самые давно использованные файлы удаляются первыми) и возраст
+        self.cache_max_bytes = (cache_max_mb or float(os.getenv('GHOST_MEDIA_CACHE_MAX_MB', '500'))) * 1024 * 1024
+        self.cache_max_age = 86400 * (cache_max_days or float(os.getenv('GHOST_MEDIA_CACHE_MAX_DAYS', '7')))
+
+        self._index: Dict[str, tuple] = {}  # media_key -> (sha256, ext)
+        self._files: Dict[str, List] = {}   # sha256 -> [path, size, last_used]
+        self._cache_bytes = 0
+        self._index_lines = 0
+        # Дозапись и перезапись индекса идут из разных потоков
+        self._index_lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        self.stats = {
+            'downloaded': 0,
+            'bytes_downloaded': 0,
+            'cache_hits': 0,
+            'coalesced': 0,
+            'skipped_type': 0,
+            'skipped_size': 0,
+            'evicted': 0,
+            'errors': 0
+        }
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+        victims = self._select_victims()
+        if victims or self._index_bloated():
+            self._remove_files(victims)
+            self._compact_index(self._index_snapshot())
+
+    def _load_index(self):
+        index_path = os.path.join(self.cache_dir, _INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._index_lines += 1
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) == 3:
+                        self._index[parts[0]] = (parts[1], parts[2])
+        except Exception as e:
+            logger.warning(f"⚠️ Media cache index unreadable: {e}")
+
+        # Размер и время последнего использования - с диска; записи без файла выбрасываются
+        for key, (sha256, ext) in list(self._index.items()):
+            if sha256 in self._files:
+                continue
+            path = self._path(sha256, ext)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._index[key]
+                continue
+            self._files[sha256] = [path, stat.st_size, stat.st_mtime]
+            self._cache_bytes += stat.st_size
+        logger.info(f"✅ Media cache index loaded: {len(self._files)} files, {self._cache_bytes / 1048576:.1f} MB")
+
+    # Лимиты кеша
+
+    def _forget(self, sha256: str) -> Optional[str]:
+        entry = self._files.pop(sha256, None)
+        if entry is None:
+            return None
+        self._cache_bytes -= entry[1]
+        return entry[0]
+
+    def _select_victims(self) -> List[str]:
+        """Файлы старше срока и самые давно использованные сверх объема (убираются из памяти сразу)"""
+        cutoff = time.time() - self.cache_max_age
+        victims = []
+        for sha256, (_, size, last_used) in sorted(self._files.items(), key=lambda item: item[1][2]):
+            if last_used >= cutoff and self._cache_bytes <= self.cache_max_bytes:
+                break
+            victims.append(self._forget(sha256))
+            for key in [k for k, (sha, _) in self._index.items() if sha == sha256]:
+                del self._index[key]
+        self.stats['evicted'] += len(victims)
+        return victims
+
+    def _index_bloated(self) -> bool:
+        """Индекс только дописывается - переписываем, когда мертвых строк больше живых"""
+        return self._index_lines > 2 * len(self._index) + 100
+
+    def _index_snapshot(self) -> List[Tuple[str, str, str]]:
+        self._index_lines = len(self._index)
+        return [(key, sha256, ext) for key, (sha256, ext) in self._index.items()]
+
+    @staticmethod
+    def _remove_files(paths: List[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _compact_index(self, entries: List[Tuple[str, str, str]]):
+        index_path = os.path.join(self.cache_dir, _INDEX_FILE)
+        tmp_path = f"{index_path}.tmp"
+        with self._index_lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(f"{key}\t{sha256}\t{ext}\n" for key, sha256, ext in entries)
+            os.replace(tmp_path, index_path)
+
+    def _evict_and_compact(self, victims: List[str], entries: Optional[List[Tuple[str, str, str]]]):
+        self._remove_files(victims)
+        if entries is not None:
+            self._compact_index(entries)
+
+    async def _enforce_limits(self):
+        victims = self._select_victims()
+        if not victims and not self._index_bloated():
+            return
+        entries = self._index_snapshot()
+        try:
+            await asyncio.to_thread(self._evict_and_compact, victims, entries)
+        except OSError as e:
+            logger.warning(f"⚠️ Media cache eviction failed: {e}")
+            return
+        if victims:
+            logger.info(f"🧹 Media cache: evicted {len(victims)} files, {self._cache_bytes / 1048576:.1f} MB left")
+
+    def _path(self, sha256: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, sha256[:2], f"{sha256}.{ext.lower()}")
+
+    def wants(self, message) -> bool:
+        """Медиа нужно парсерам и укладывается в лимит размера"""
+        if _image_format(message) is None:
+            return False
+        size = _media_size(message)
+        return not size or size <= self.max_bytes
+
+    def fetch(self, message) -> Optional[asyncio.Task]:
+        """Запуск фоновой загрузки (None если медиа не нужно); одновременные запросы одного файла склеиваются"""
+        image_format = _image_format(message)
+        if image_format is None:
+            if media_key(message):
+                self.stats['skipped_type'] += 1
+            return None
+
+        size = _media_size(message)
+        if size and size > self.max_bytes:
+            self.stats['skipped_size'] += 1
+            logger.info(f"⚠️ Media skipped: {size} bytes > limit {self.max_bytes}")
+            return None
+
+        key = media_key(message)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats['coalesced'] += 1
+            return task
+
+        task = asyncio.create_task(self._fetch(key, message, image_format))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def _fetch(self, key: str, message, image_format: str) -> Optional[MediaFile]:
+        cached = self._index.get(key)
+        if cached is not None:
+            sha256, ext = cached
+            path = self._path(sha256, ext)
+            try:
+                data = await asyncio.to_thread(self._read, path)
+                self.stats['cache_hits'] += 1
+                entry = self._files.get(sha256)
+                if entry is not None:
+                    entry[2] = time.time()
+                return MediaFile(data, path, sha256, image_format, cached=True)
+            except OSError:
+                self._index.pop(key, None)
+                self._forget(sha256)
+
+        try:
+            async with self._semaphore:
+                data = await asyncio.wait_for(self.client.download_media(message, file=bytes), self.timeout)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"❌ Media download failed ({key}): {e}")
+            return None
+
+        if not data:
+            self.stats['errors'] += 1
+            return None
+        if len(data) > self.max_bytes:
+            self.stats['skipped_size'] += 1
+            return None
+
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self._path(sha256, image_format)
+        try:
+            await asyncio.to_thread(self._store, key, sha256, image_format, path, data)
+        except OSError as e:
+            logger.warning(f"⚠️ Media cache write failed: {e}")
+        else:
+            self._index[key] = (sha256, image_format)
+            self._index_lines += 1
+            if sha256 in self._files:
+                self._files[sha256][2] = time.time()
+            else:
+                self._files[sha256] = [path, len(data), time.time()]
+                self._cache_bytes += len(data)
+            await self._enforce_limits()
+
+        self.stats['downloaded'] += 1
+        self.stats['bytes_downloaded'] += len(data)
+        logger.info(f"✅ Media downloaded: {len(data)} bytes, {image_format} ({sha256[:12]})")
+        return MediaFile(data, path, sha256, image_format)
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, 'rb') as f:
+            data = f.read()
+        # mtime - время последнего использования (LRU переживает рестарт)
+        os.utime(path)
+        return data
+
+    def _store(self, key: str, sha256: str, ext: str, path: str, data: bytes):
+        # Одинаковое содержимое под разными ID - один файл
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        with self._index_lock:
+            with open(os.path.join(self.cache_dir, _INDEX_FILE), 'a', encoding='utf-8') as f:
+                f.write(f"{key}\t{sha256}\t{ext}\n")
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            **self.stats,
+            'cached_files': len(self._files),
+            'cache_mb': round(self._cache_bytes / 1048576, 1),
+            'inflight': len(self._inflight)
+        }
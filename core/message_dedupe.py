@@ -0,0 +1,284 @@
+"""
+GHOST Message Dedupe
+Ограниченный по времени и размеру анти-дубликат сообщений Telegram по (chat_id, message_id)
+Компактный бинарный снапшот на диске - после рестарта catch-up не обрабатывается повторно
+Анти-дубликат по содержимому (хеш нормализованного текста) со скользящим окном
+"""
+
+import hashlib
+import logging
+import os
+import re
+import struct
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Set, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b'GDD2'
+_HEADER = struct.Struct('<4sII')   # magic, generations, floors
+_GENERATION = struct.Struct('<dI')  # started_at, keys
+_KEY = struct.Struct('<qI')         # chat_id, message_id
+_FLOOR = struct.Struct('<qq')      # chat_id, max вытесненный message_id
+
+ChatId = Union[int, str]
+
+
+def _pack_key(chat_id: ChatId, message_id: int) -> int:
+    """(chat_id, message_id) -> одно int (message_id в Telegram < 2^32)"""
+    return (int(chat_id) << 32) | (int(message_id) & 0xFFFFFFFF)
+
+
+def _unpack_key(key: int) -> Tuple[int, int]:
+    return key >> 32, key & 0xFFFFFFFF
+
+
+class MessageDedupe:
+    """
+    Скользящее окно из поколений (множества упакованных ключей) + "пол" на канал
+
+    Окно делится на generations поколений; самое старое целиком выбрасывается по времени
+    или при превышении max_entries, а его message_id поднимают пол канала: id в канале
+    монотонны, поэтому всё, что <= пола, уже видели. Память ограничена max_entries
+    """
+
+    def __init__(self, window_seconds: float = 48 * 3600, max_entries: int = 200000,
+                 snapshot_path: str = None, snapshot_interval: float = 60.0, generations: int = 8):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.generations = max(2, generations)
+        self._generation_span = window_seconds / self.generations
+        self._generation_limit = max(1, max_entries // self.generations)
+
+        self._generations: Deque[Tuple[float, Set[int]]] = deque()
+        self._size = 0
+        self._floors: Dict[int, int] = {}
+        self._dirty = False
+        self._last_snapshot = time.monotonic()
+
+        self.stats = {
+            'checked': 0,
+            'duplicates': 0,
+            'below_floor': 0,
+            'evicted': 0,
+            'snapshots': 0
+        }
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _seen(self, key: int) -> Optional[str]:
+        for _, keys in self._generations:
+            if key in keys:
+                return 'duplicates'
+        chat_id, message_id = _unpack_key(key)
+        if message_id <= self._floors.get(chat_id, -1):
+            return 'below_floor'
+        return None
+
+    def __contains__(self, item: Tuple[ChatId, int]) -> bool:
+        return self._seen(_pack_key(*item)) is not None
+
+    def _drop_oldest(self):
+        _, keys = self._generations.popleft()
+        self._size -= len(keys)
+        self.stats['evicted'] += len(keys)
+        floors = self._floors
+        for key in keys:
+            chat_id, message_id = _unpack_key(key)
+            if message_id > floors.get(chat_id, -1):
+                floors[chat_id] = message_id
+
+    def _rotate(self, now: float):
+        # Новое поколение по времени или по размеру - так max_entries соблюдается и при всплесках
+        if not self._generations or now - self._generations[-1][0] >= self._generation_span \
+                or len(self._generations[-1][1]) >= self._generation_limit:
+            self._generations.append((now, set()))
+
+        cutoff = now - self.window_seconds
+        while len(self._generations) > 1 and (
+            self._generations[0][0] + self._generation_span < cutoff
+            or len(self._generations) > self.generations
+            or self._size > self.max_entries
+        ):
+            self._drop_oldest()
+
+    def check_and_add(self, chat_id: ChatId, message_id: int) -> bool:
+        """True - сообщение новое (и теперь отмечено), False - дубликат"""
+        key = _pack_key(chat_id, message_id)
+        self.stats['checked'] += 1
+
+        reason = self._seen(key)
+        if reason:
+            self.stats[reason] += 1
+            return False
+
+        self._rotate(time.time())
+        self._generations[-1][1].add(key)
+        self._size += 1
+        self._dirty = True
+        return True
+
+    def discard(self, chat_id: ChatId, message_id: int):
+        """Снять отметку (сообщение принято, но не обработано - после рестарта его нужно взять снова)"""
+        key = _pack_key(chat_id, message_id)
+        for _, keys in self._generations:
+            if key in keys:
+                keys.discard(key)
+                self._size -= 1
+                self._dirty = True
+                return
+
+    # Снапшот
+
+    def snapshot_bytes(self) -> bytes:
+        """Сериализация окна и полов (вызывается из event loop, запись можно вынести в поток)"""
+        parts = [_HEADER.pack(_MAGIC, len(self._generations), len(self._floors))]
+        for started_at, keys in self._generations:
+            parts.append(_GENERATION.pack(started_at, len(keys)))
+            parts.extend(_KEY.pack(*_unpack_key(key)) for key in keys)
+        parts.extend(_FLOOR.pack(chat_id, floor) for chat_id, floor in self._floors.items())
+        self._dirty = False
+        self._last_snapshot = time.monotonic()
+        return b''.join(parts)
+
+    def write_snapshot(self, data: bytes):
+        """Атомарная запись снапшота (tmp + rename)"""
+        if not self.snapshot_path:
+            return
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self.stats['snapshots'] += 1
+
+    def save(self):
+        self.write_snapshot(self.snapshot_bytes())
+
+    def snapshot_due(self) -> bool:
+        return bool(self.snapshot_path) and self._dirty and \
+            time.monotonic() - self._last_snapshot >= self.snapshot_interval
+
+    def load(self) -> int:
+        """Загрузка снапшота при старте (просроченные поколения сразу уходят в полы)"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return 0
+
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                data = f.read()
+
+            magic, generation_count, floor_count = _HEADER.unpack_from(data, 0)
+            if magic != _MAGIC:
+                raise ValueError(f"bad magic {magic!r}")
+
+            offset = _HEADER.size
+            for _ in range(generation_count):
+                started_at, count = _GENERATION.unpack_from(data, offset)
+                offset += _GENERATION.size
+                keys = {_pack_key(chat_id, message_id) for chat_id, message_id
+                        in _KEY.iter_unpack(data[offset:offset + count * _KEY.size])}
+                offset += count * _KEY.size
+                self._generations.append((started_at, keys))
+                self._size += len(keys)
+            for chat_id, floor in _FLOOR.iter_unpack(data[offset:offset + floor_count * _FLOOR.size]):
+                self._floors[chat_id] = max(floor, self._floors.get(chat_id, -1))
+
+        except Exception as e:
+            logger.warning(f"⚠️ Dedupe snapshot unreadable, starting empty: {e}")
+            self._generations.clear()
+            self._floors.clear()
+            self._size = 0
+            return 0
+
+        self._rotate(time.time())
+        logger.info(f"✅ Dedupe snapshot loaded: {self._size} messages, {len(self._floors)} channel floors")
+        return self._size
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, 'entries': self._size, 'channels': len(self._floors)}
+
+
+_SPACE_RE = re.compile(r'\s+')
+
+
+def content_hash(scope: str, text: str) -> str:
+    """sha1 от (scope, текст без лишних пробелов и регистра) - ключ дубликата по содержимому"""
+    normalized = _SPACE_RE.sub(' ', text or '').strip().lower()
+    return hashlib.sha1(f"{scope}\x00{normalized}".encode('utf-8')).hexdigest()
+
+
+class ContentDedupe:
+    """
+    Хеши содержимого со скользящим окном: O(1) проверка в памяти вместо запроса в БД
+    Записи в OrderedDict идут в порядке добавления, поэтому просроченные снимаются с головы
+    """
+
+    def __init__(self, window_seconds: float = 2 * 3600, max_entries: int = 100000):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._seen: 'OrderedDict[str, float]' = OrderedDict()
+
+        self.stats = {
+            'checked': 0,
+            'duplicates': 0,
+            'evicted': 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def _expire(self, now: float):
+        cutoff = now - self.window_seconds
+        seen = self._seen
+        while seen:
+            oldest_key = next(iter(seen))
+            if seen[oldest_key] > cutoff and len(seen) <= self.max_entries:
+                break
+            del seen[oldest_key]
+            self.stats['evicted'] += 1
+
+    def __contains__(self, key: str) -> bool:
+        self._expire(time.time())
+        return key in self._seen
+
+    def check_and_add(self, key: str) -> bool:
+        """True - содержимое новое в окне (и теперь отмечено), False - дубликат"""
+        now = time.time()
+        self._expire(now)
+        self.stats['checked'] += 1
+
+        if key in self._seen:
+            self.stats['duplicates'] += 1
+            return False
+
+        self._seen[key] = now
+        return True
+
+    def discard(self, key: str):
+        """Снять отметку (например, если сохранение не удалось и нужна повторная попытка)"""
+        self._seen.pop(key, None)
+
+    def window_bucket(self, timestamp: float = None) -> int:
+        """Номер фиксированного окна (window_seconds от эпохи)"""
+        return int((timestamp if timestamp is not None else time.time()) // self.window_seconds)
+
+    def bucket_key(self, scope: str, text: str, timestamp: float = None) -> str:
+        """
+        Ключ содержимого в фиксированном окне - один и тот же для проверки в памяти и уникального ключа в БД
+
+        Дубликат - тот же текст в том же окне: повтор через 10 минут, но после границы окна, считается новым
+        и в памяти, и в БД (в том числе в других процессах), поэтому решения обоих уровней совпадают.
+        """
+        return content_hash(f"{scope}\x00{self.window_bucket(timestamp)}", text)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, 'entries': len(self._seen)}
@@ -7,13 +7,20 @@ GHOST News Statistics Tracker
 
 import os
 import sys
-import sqlite3
+import atexit
 import logging
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 import json
 
+try:
+    from .sqlite_store import get_sqlite_store
+except ImportError:
+    # Fallback для прямого запуска
+    from sqlite_store import get_sqlite_store
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -40,26 +47,54 @@ class NewsStatistics:
         if self.time_impact_analysis is None:
             self.time_impact_analysis = {'1h': 0.0, '4h': 0.0, '24h': 0.0}
 
+def _new_summary_bucket() -> Dict[str, float]:
+    return {'total_news': 0, 'critical_news': 0, 'bullish_count': 0, 'bearish_count': 0,
+            'neutral_count': 0, 'impact_sum': 0.0}
+
+def _merge_buckets(target: Dict, source: Dict):
+    """Сложить счетчики source в target (ключ -> dict счетчиков)"""
+    for key, bucket in source.items():
+        existing = target.get(key)
+        if existing is None:
+            target[key] = dict(bucket)
+        else:
+            for counter, value in bucket.items():
+                existing[counter] += value
+
 class NewsStatisticsTracker:
     """
     Трекер статистики новостей
     Работает независимо от основной системы торговли
     """
     
-    def __init__(self, db_path: str = "data/news_statistics.db"):
+    def __init__(self, db_path: str = "data/news_statistics.db", flush_interval: float = None):
         self.db_path = db_path
+        self.db = get_sqlite_store(db_path)
         self._init_database()
+        
+        # Счетчики копятся в памяти и сбрасываются одной транзакцией раз в flush_interval секунд
+        self.flush_interval = flush_interval or float(os.getenv('GHOST_NEWS_STATS_FLUSH_SECONDS', '5'))
+        self._lock = threading.Lock()
+        self._pending_summary: Dict[str, Dict[str, float]] = {}  # date -> счетчики дня
+        self._pending_sources: Dict[tuple, Dict[str, float]] = {}  # (source, date) -> счетчики
+        # Снимок, который сейчас пишется: чтения видят его, пока транзакция не закоммичена
+        self._flushing_summary: Dict[str, Dict[str, float]] = {}
+        self._flushing_sources: Dict[tuple, Dict[str, float]] = {}
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        atexit.register(self.close)
+        
         logger.info(f"📊 News Statistics Tracker initialized with DB: {db_path}")
     
     def _init_database(self):
         """Инициализация базы данных для статистики"""
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        self.db.run(self._create_tables).result()
+    
+    @staticmethod
+    def _create_tables(conn):
         # Таблица общей статистики
-        cursor.execute("""
+        conn.execute("""
             CREATE TABLE IF NOT EXISTS news_stats_summary (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 date DATE UNIQUE,
@@ -76,7 +111,7 @@ class NewsStatisticsTracker:
         """)
         
         # Таблица надёжности источников
-        cursor.execute("""
+        conn.execute("""
             CREATE TABLE IF NOT EXISTS source_reliability (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 source_name TEXT,
@@ -91,7 +126,7 @@ class NewsStatisticsTracker:
         """)
         
         # Таблица производительности кластеров
-        cursor.execute("""
+        conn.execute("""
             CREATE TABLE IF NOT EXISTS cluster_performance (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 cluster_name TEXT,
@@ -108,7 +143,7 @@ class NewsStatisticsTracker:
         """)
         
         # Таблица влияния по времени
-        cursor.execute("""
+        conn.execute("""
             CREATE TABLE IF NOT EXISTS time_impact_analysis (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 news_id TEXT,
@@ -124,17 +159,11 @@ class NewsStatisticsTracker:
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
-        
-        conn.commit()
-        conn.close()
     
     def record_news_event(self, news_data: Dict):
-        """Записать новостное событие для статистики"""
+        """Записать новостное событие для статистики (инкремент счетчиков в памяти)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            today = datetime.now().date()
+            today = datetime.now().date().isoformat()
             
             # Определяем sentiment
             sentiment_score = news_data.get('sentiment', 0.0)
@@ -145,31 +174,21 @@ class NewsStatisticsTracker:
             else:
                 sentiment_category = 'neutral'
             
-            # Обновляем общую статистику
-            cursor.execute("""
-                INSERT OR IGNORE INTO news_stats_summary (date) VALUES (?)
-            """, (today,))
-            
-            cursor.execute(f"""
-                UPDATE news_stats_summary 
-                SET total_news = total_news + 1,
-                    {sentiment_category}_count = {sentiment_category}_count + 1,
-                    avg_market_impact = (avg_market_impact * (total_news - 1) + ?) / total_news
-                WHERE date = ?
-            """, (news_data.get('market_impact', 0.0), today))
-            
-            # Отмечаем критические новости
-            if news_data.get('is_critical', False) or news_data.get('urgency', 0.0) > 0.7:
-                cursor.execute("""
-                    UPDATE news_stats_summary 
-                    SET critical_news = critical_news + 1
-                    WHERE date = ?
-                """, (today,))
+            is_critical = news_data.get('is_critical', False) or news_data.get('urgency', 0.0) > 0.7
+            market_impact = news_data.get('market_impact', 0.0) or 0.0
             
-            conn.commit()
-            conn.close()
+            with self._lock:
+                bucket = self._pending_summary.get(today)
+                if bucket is None:
+                    bucket = self._pending_summary[today] = _new_summary_bucket()
+                bucket['total_news'] += 1
+                bucket[f'{sentiment_category}_count'] += 1
+                bucket['impact_sum'] += market_impact
+                if is_critical:
+                    bucket['critical_news'] += 1
+            self._ensure_flusher()
             
-            logger.debug(f"📊 Recorded news event: {sentiment_category}, impact: {news_data.get('market_impact', 0.0):.2f}")
+            logger.debug(f"📊 Recorded news event: {sentiment_category}, impact: {market_impact:.2f}")
             
         except Exception as e:
             logger.error(f"❌ Error recording news event: {e}")
@@ -177,34 +196,32 @@ class NewsStatisticsTracker:
     def record_prediction_accuracy(self, news_id: str, predicted: float, actual: float, timeframe: str):
         """Записать точность предсказания"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Вычисляем точность (обратная к ошибке)
             error = abs(predicted - actual)
             max_error = max(abs(predicted), abs(actual), 1.0)  # Избегаем деления на 0
             accuracy = max(0.0, 1.0 - (error / max_error))
             
-            # Записываем в таблицу временного анализа
-            cursor.execute(f"""
-                UPDATE time_impact_analysis 
-                SET actual_impact_{timeframe} = ?, accuracy_{timeframe} = ?
-                WHERE news_id = ?
-            """, (actual, accuracy, news_id))
-            
-            # Обновляем общую точность за сегодня
             today = datetime.now().date()
-            cursor.execute("""
-                UPDATE news_stats_summary 
-                SET prediction_accuracy = (
-                    SELECT AVG(accuracy_1h) FROM time_impact_analysis 
-                    WHERE date(timestamp) = ?
-                )
-                WHERE date = ?
-            """, (today, today))
             
-            conn.commit()
-            conn.close()
+            def update_accuracy(conn):
+                # Записываем в таблицу временного анализа
+                conn.execute(f"""
+                    UPDATE time_impact_analysis 
+                    SET actual_impact_{timeframe} = ?, accuracy_{timeframe} = ?
+                    WHERE news_id = ?
+                """, (actual, accuracy, news_id))
+                
+                # Обновляем общую точность за сегодня
+                conn.execute("""
+                    UPDATE news_stats_summary 
+                    SET prediction_accuracy = (
+                        SELECT AVG(accuracy_1h) FROM time_impact_analysis 
+                        WHERE date(timestamp) = ?
+                    )
+                    WHERE date = ?
+                """, (today, today))
+            
+            self.db.run(update_accuracy)
             
             logger.debug(f"📊 Recorded prediction accuracy: {accuracy:.2f} for {timeframe}")
             
@@ -212,152 +229,260 @@ class NewsStatisticsTracker:
             logger.error(f"❌ Error recording prediction accuracy: {e}")
     
     def record_source_reliability(self, source_name: str, was_accurate: bool, impact_score: float):
-        """Записать надёжность источника"""
+        """Записать надёжность источника (инкремент счетчиков в памяти)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            today = datetime.now().date()
+            key = (source_name, datetime.now().date().isoformat())
             
-            # Обновляем статистику источника
-            cursor.execute("""
-                INSERT OR REPLACE INTO source_reliability 
-                (source_name, date, total_predictions, correct_predictions, accuracy_rate, avg_impact_score)
-                VALUES (
-                    ?, ?, 
-                    COALESCE((SELECT total_predictions FROM source_reliability WHERE source_name = ? AND date = ?), 0) + 1,
-                    COALESCE((SELECT correct_predictions FROM source_reliability WHERE source_name = ? AND date = ?), 0) + ?,
-                    CASE WHEN (COALESCE((SELECT total_predictions FROM source_reliability WHERE source_name = ? AND date = ?), 0) + 1) > 0 
-                         THEN (COALESCE((SELECT correct_predictions FROM source_reliability WHERE source_name = ? AND date = ?), 0) + ?) * 1.0 / (COALESCE((SELECT total_predictions FROM source_reliability WHERE source_name = ? AND date = ?), 0) + 1)
-                         ELSE 0.0 END,
-                    (COALESCE((SELECT avg_impact_score FROM source_reliability WHERE source_name = ? AND date = ?), 0) * COALESCE((SELECT total_predictions FROM source_reliability WHERE source_name = ? AND date = ?), 0) + ?) / (COALESCE((SELECT total_predictions FROM source_reliability WHERE source_name = ? AND date = ?), 0) + 1)
-                )
-            """, (
-                source_name, today,  # INSERT values
-                source_name, today,  # total_predictions SELECT
-                source_name, today, 1 if was_accurate else 0,  # correct_predictions SELECT + increment
-                source_name, today,  # accuracy_rate calculation - total_predictions
-                source_name, today, 1 if was_accurate else 0,  # accuracy_rate calculation - correct_predictions
-                source_name, today,  # accuracy_rate calculation - total_predictions (denominator)
-                source_name, today,  # avg_impact_score calculation - existing avg
-                source_name, today,  # avg_impact_score calculation - existing total
-                impact_score,  # avg_impact_score calculation - new impact
-                source_name, today   # avg_impact_score calculation - total for denominator
-            ))
-            
-            conn.commit()
-            conn.close()
+            with self._lock:
+                bucket = self._pending_sources.get(key)
+                if bucket is None:
+                    bucket = self._pending_sources[key] = {'total': 0, 'correct': 0, 'impact_sum': 0.0}
+                bucket['total'] += 1
+                bucket['correct'] += 1 if was_accurate else 0
+                bucket['impact_sum'] += impact_score or 0.0
+            self._ensure_flusher()
             
             logger.debug(f"📊 Recorded source reliability: {source_name}, accurate: {was_accurate}")
             
         except Exception as e:
             logger.error(f"❌ Error recording source reliability: {e}")
     
-    def get_full_statistics(self, days: int = 30) -> NewsStatistics:
-        """Получить полную статистику за период"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            start_date = (datetime.now() - timedelta(days=days)).date()
-            
-            # Общая статистика
-            cursor.execute("""
-                SELECT 
-                    SUM(total_news) as total_news,
-                    SUM(critical_news) as critical_news,
-                    AVG(prediction_accuracy) as avg_accuracy,
-                    AVG(avg_market_impact) as avg_impact,
-                    SUM(bullish_count) as bullish,
-                    SUM(bearish_count) as bearish,
-                    SUM(neutral_count) as neutral,
-                    SUM(false_signals) as false_signals
-                FROM news_stats_summary 
-                WHERE date >= ?
-            """, (start_date,))
-            
-            row = cursor.fetchone()
-            if row and row[0]:  # Проверяем что есть данные
-                total_news, critical_news, avg_accuracy, avg_impact, bullish, bearish, neutral, false_signals = row
-            else:
-                total_news = critical_news = bullish = bearish = neutral = false_signals = 0
-                avg_accuracy = avg_impact = 0.0
-            
-            # Надёжность источников
-            cursor.execute("""
-                SELECT source_name, AVG(accuracy_rate) as avg_accuracy
-                FROM source_reliability 
-                WHERE date >= ?
-                GROUP BY source_name
-                ORDER BY avg_accuracy DESC
-            """, (start_date,))
-            
-            source_reliability = dict(cursor.fetchall())
-            
-            # Производительность кластеров
-            cursor.execute("""
-                SELECT 
-                    cluster_name,
-                    AVG(avg_accuracy) as accuracy,
-                    AVG(market_impact_1h) as impact_1h,
-                    AVG(market_impact_4h) as impact_4h,
-                    AVG(market_impact_24h) as impact_24h,
-                    COUNT(*) as count
-                FROM cluster_performance 
-                WHERE date >= ?
-                GROUP BY cluster_name
-            """, (start_date,))
+    def _ensure_flusher(self):
+        if self._flusher is None and not self._stop.is_set():
+            with self._flush_lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name='news-stats-flusher', daemon=True)
+                    self._flusher.start()
+    
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+    
+    def flush(self) -> bool:
+        """Сбросить накопленные счетчики одной транзакцией"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending_summary and not self._pending_sources:
+                    return True
+                self._flushing_summary, self._pending_summary = self._pending_summary, {}
+                self._flushing_sources, self._pending_sources = self._pending_sources, {}
             
-            cluster_performance = {}
-            for row in cursor.fetchall():
-                cluster_name, accuracy, impact_1h, impact_4h, impact_24h, count = row
-                cluster_performance[cluster_name] = {
-                    'accuracy': accuracy or 0.0,
-                    'impact_1h': impact_1h or 0.0,
-                    'impact_4h': impact_4h or 0.0,
-                    'impact_24h': impact_24h or 0.0,
-                    'count': count or 0
-                }
+            summary, sources = self._flushing_summary, self._flushing_sources
             
-            # Временной анализ
-            cursor.execute("""
-                SELECT 
-                    AVG(accuracy_1h) as avg_1h,
-                    AVG(accuracy_4h) as avg_4h,
-                    AVG(accuracy_24h) as avg_24h
-                FROM time_impact_analysis 
-                WHERE timestamp >= ?
-            """, (start_date,))
+            def write_counters(conn):
+                for day, bucket in summary.items():
+                    conn.execute("INSERT OR IGNORE INTO news_stats_summary (date) VALUES (?)", (day,))
+                    # SET вычисляется по старым значениям строки - среднее пересчитывается по итоговому total
+                    conn.execute("""
+                        UPDATE news_stats_summary 
+                        SET total_news = total_news + ?,
+                            critical_news = critical_news + ?,
+                            bullish_count = bullish_count + ?,
+                            bearish_count = bearish_count + ?,
+                            neutral_count = neutral_count + ?,
+                            avg_market_impact = (avg_market_impact * total_news + ?) / (total_news + ?)
+                        WHERE date = ?
+                    """, (
+                        bucket['total_news'], bucket['critical_news'],
+                        bucket['bullish_count'], bucket['bearish_count'], bucket['neutral_count'],
+                        bucket['impact_sum'], bucket['total_news'], day
+                    ))
+                
+                for (source_name, day), bucket in sources.items():
+                    conn.execute(
+                        "INSERT OR IGNORE INTO source_reliability (source_name, date) VALUES (?, ?)",
+                        (source_name, day)
+                    )
+                    conn.execute("""
+                        UPDATE source_reliability 
+                        SET total_predictions = total_predictions + ?,
+                            correct_predictions = correct_predictions + ?,
+                            accuracy_rate = (correct_predictions + ?) * 1.0 / (total_predictions + ?),
+                            avg_impact_score = (avg_impact_score * total_predictions + ?) / (total_predictions + ?)
+                        WHERE source_name = ? AND date = ?
+                    """, (
+                        bucket['total'], bucket['correct'],
+                        bucket['correct'], bucket['total'],
+                        bucket['impact_sum'], bucket['total'],
+                        source_name, day
+                    ))
             
-            time_row = cursor.fetchone()
-            time_impact_analysis = {
-                '1h': time_row[0] or 0.0 if time_row else 0.0,
-                '4h': time_row[1] or 0.0 if time_row else 0.0,
-                '24h': time_row[2] or 0.0 if time_row else 0.0
-            }
+            try:
+                self.db.run(write_counters).result()
+                ok = True
+            except Exception as e:
+                logger.error(f"❌ Error flushing news statistics: {e}")
+                ok = False
             
-            conn.close()
-            
-            return NewsStatistics(
-                total_news_processed=total_news or 0,
-                critical_news_count=critical_news or 0,
-                prediction_accuracy=avg_accuracy or 0.0,
-                avg_market_impact=avg_impact or 0.0,
-                sentiment_distribution={
-                    'bullish': bullish or 0,
-                    'bearish': bearish or 0,
-                    'neutral': neutral or 0
-                },
-                source_reliability=source_reliability,
-                cluster_performance=cluster_performance,
-                time_impact_analysis=time_impact_analysis,
-                false_signals_count=false_signals or 0
-            )
+            with self._lock:
+                if not ok:
+                    # Вернуть несохраненное в очередь - повтор на следующем сбросе
+                    _merge_buckets(self._pending_summary, summary)
+                    _merge_buckets(self._pending_sources, sources)
+                self._flushing_summary, self._flushing_sources = {}, {}
+            return ok
+    
+    def close(self):
+        """Остановить фоновый сброс и записать остаток"""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=self.flush_interval + 1)
+        self.flush()
+    
+    def _pending_snapshot(self):
+        """Еще не закоммиченные счетчики: очередь + сбрасываемый сейчас снимок"""
+        with self._lock:
+            summary: Dict[str, Dict[str, float]] = {}
+            sources: Dict[tuple, Dict[str, float]] = {}
+            for pending, merged in ((self._flushing_summary, summary), (self._pending_summary, summary),
+                                    (self._flushing_sources, sources), (self._pending_sources, sources)):
+                _merge_buckets(merged, pending)
+        return summary, sources
+    
+    def get_full_statistics(self, days: int = 30) -> NewsStatistics:
+        """Получить полную статистику за период"""
+        try:
+            start_date = (datetime.now() - timedelta(days=days)).date().isoformat()
+            # Под _flush_lock сброс не идет: база и несброшенные счетчики не пересекаются
+            with self._flush_lock:
+                pending_summary, pending_sources = self._pending_snapshot()
+                with self.db.reader() as conn:
+                    return self._read_statistics(conn, start_date, pending_summary, pending_sources)
             
         except Exception as e:
             logger.error(f"❌ Error getting full statistics: {e}")
             return NewsStatistics()
     
+    @staticmethod
+    def _read_statistics(conn, start_date: str, pending_summary: Dict[str, Dict[str, float]],
+                         pending_sources: Dict[tuple, Dict[str, float]]) -> NewsStatistics:
+        """Все запросы отчета на одном читающем соединении пула + несброшенные счетчики"""
+        cursor = conn.cursor()
+        
+        # Общая статистика по дням (дневные строки объединяются с памятью, затем агрегируются)
+        cursor.execute("""
+            SELECT date, total_news, critical_news, prediction_accuracy, avg_market_impact,
+                   bullish_count, bearish_count, neutral_count, false_signals
+            FROM news_stats_summary 
+            WHERE date >= ?
+        """, (start_date,))
+        
+        days = {}
+        for day, total, critical, accuracy, impact, bullish, bearish, neutral, false_signals in cursor.fetchall():
+            days[day] = {
+                'total_news': total or 0, 'critical_news': critical or 0,
+                'prediction_accuracy': accuracy, 'avg_market_impact': impact or 0.0,
+                'bullish_count': bullish or 0, 'bearish_count': bearish or 0, 'neutral_count': neutral or 0,
+                'false_signals': false_signals or 0
+            }
+        
+        for day, bucket in pending_summary.items():
+            if day < start_date:
+                continue
+            row = days.setdefault(day, {
+                'total_news': 0, 'critical_news': 0, 'prediction_accuracy': 0.0, 'avg_market_impact': 0.0,
+                'bullish_count': 0, 'bearish_count': 0, 'neutral_count': 0, 'false_signals': 0
+            })
+            total = row['total_news'] + bucket['total_news']
+            if total:
+                row['avg_market_impact'] = (row['avg_market_impact'] * row['total_news'] + bucket['impact_sum']) / total
+            row['total_news'] = total
+            for counter in ('critical_news', 'bullish_count', 'bearish_count', 'neutral_count'):
+                row[counter] += bucket[counter]
+        
+        rows = list(days.values())
+        total_news = sum(row['total_news'] for row in rows)
+        critical_news = sum(row['critical_news'] for row in rows)
+        bullish = sum(row['bullish_count'] for row in rows)
+        bearish = sum(row['bearish_count'] for row in rows)
+        neutral = sum(row['neutral_count'] for row in rows)
+        false_signals = sum(row['false_signals'] for row in rows)
+        accuracies = [row['prediction_accuracy'] for row in rows if row['prediction_accuracy'] is not None]
+        avg_accuracy = sum(accuracies) / len(accuracies) if accuracies else 0.0
+        avg_impact = sum(row['avg_market_impact'] for row in rows) / len(rows) if rows else 0.0
+        
+        # Надёжность источников: среднее дневной точности по источнику
+        cursor.execute("""
+            SELECT source_name, date, total_predictions, correct_predictions
+            FROM source_reliability 
+            WHERE date >= ?
+        """, (start_date,))
+        
+        source_days = {(source_name, day): [total or 0, correct or 0]
+                       for source_name, day, total, correct in cursor.fetchall()}
+        for (source_name, day), bucket in pending_sources.items():
+            if day < start_date:
+                continue
+            counts = source_days.setdefault((source_name, day), [0, 0])
+            counts[0] += bucket['total']
+            counts[1] += bucket['correct']
+        
+        rates: Dict[str, List[float]] = {}
+        for (source_name, _), (total, correct) in source_days.items():
+            rates.setdefault(source_name, []).append(correct / total if total else 0.0)
+        source_reliability = dict(sorted(
+            ((source_name, sum(values) / len(values)) for source_name, values in rates.items()),
+            key=lambda item: item[1], reverse=True
+        ))
+        
+        # Производительность кластеров
+        cursor.execute("""
+            SELECT 
+                cluster_name,
+                AVG(avg_accuracy) as accuracy,
+                AVG(market_impact_1h) as impact_1h,
+                AVG(market_impact_4h) as impact_4h,
+                AVG(market_impact_24h) as impact_24h,
+                COUNT(*) as count
+            FROM cluster_performance 
+            WHERE date >= ?
+            GROUP BY cluster_name
+        """, (start_date,))
+        
+        cluster_performance = {}
+        for row in cursor.fetchall():
+            cluster_name, accuracy, impact_1h, impact_4h, impact_24h, count = row
+            cluster_performance[cluster_name] = {
+                'accuracy': accuracy or 0.0,
+                'impact_1h': impact_1h or 0.0,
+                'impact_4h': impact_4h or 0.0,
+                'impact_24h': impact_24h or 0.0,
+                'count': count or 0
+            }
+        
+        # Временной анализ
+        cursor.execute("""
+            SELECT 
+                AVG(accuracy_1h) as avg_1h,
+                AVG(accuracy_4h) as avg_4h,
+                AVG(accuracy_24h) as avg_24h
+            FROM time_impact_analysis 
+            WHERE timestamp >= ?
+        """, (start_date,))
+        
+        time_row = cursor.fetchone()
+        time_impact_analysis = {
+            '1h': time_row[0] or 0.0 if time_row else 0.0,
+            '4h': time_row[1] or 0.0 if time_row else 0.0,
+            '24h': time_row[2] or 0.0 if time_row else 0.0
+        }
+        
+        return NewsStatistics(
+            total_news_processed=total_news or 0,
+            critical_news_count=critical_news or 0,
+            prediction_accuracy=avg_accuracy or 0.0,
+            avg_market_impact=avg_impact or 0.0,
+            sentiment_distribution={
+                'bullish': bullish or 0,
+                'bearish': bearish or 0,
+                'neutral': neutral or 0
+            },
+            source_reliability=source_reliability,
+            cluster_performance=cluster_performance,
+            time_impact_analysis=time_impact_analysis,
+            false_signals_count=false_signals or 0
+        )
+    
     def generate_daily_report(self) -> Dict:
         """Генерация ежедневного отчёта"""
         stats = self.get_full_statistics(days=1)
@@ -0,0 +1,147 @@
+"""
+GHOST Open Trades Store
+Открытые сделки трекера выхода в SQLite (WAL) вместо JSON файла, перезаписываемого целиком
+Строка на сделку, индекс по статусу, каждое изменение - отдельная атомарная транзакция
+
+Контракт для производителей сделок: новая сделка добавляется через OpenTradesStore.upsert(trade)
+или, как раньше, дописывается в output/open_trades.json. JSON трекер только читает (import_json
+на каждом цикле при изменении файла): новые trade_id добавляются открытыми, уже известные
+(в том числе закрытые) не перетираются, поэтому файл можно не чистить.
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    from core.sqlite_store import get_sqlite_store
+except ImportError:
+    from sqlite_store import get_sqlite_store
+
+logger = logging.getLogger(__name__)
+
+STATUS_OPEN = 'open'
+STATUS_CLOSED = 'closed'
+
+
+def trade_key(trade: Dict[str, Any]) -> str:
+    """Ключ сделки: id, а для старых записей без id - символ и время открытия"""
+    if trade.get('id') is not None:
+        return str(trade['id'])
+    return f"{trade.get('symbol')}:{trade.get('opened_at')}"
+
+
+class OpenTradesStore:
+    """Таблица open_trades: trade_id -> JSON сделки, статус вынесен в индексируемую колонку"""
+
+    def __init__(self, path: str = None, legacy_json: str = None):
+        self.path = path or os.getenv('GHOST_OPEN_TRADES_DB', 'output/open_trades.db')
+        self.db = get_sqlite_store(self.path)
+        self.db.run(self._create_tables).result()
+        self._json_seen: Dict[str, tuple] = {}
+        if legacy_json:
+            self.import_json(legacy_json)
+
+    @staticmethod
+    def _create_tables(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS open_trades (
+                trade_id TEXT PRIMARY KEY,
+                symbol TEXT,
+                status TEXT NOT NULL DEFAULT 'open',
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_open_trades_status ON open_trades(status)')
+
+    def import_json(self, json_path: str) -> int:
+        """
+        Новые сделки из JSON файла производителей (список сделок); сколько добавлено
+
+        Файл не меняется и читается заново только при смене mtime/размера. Недочитанный
+        (пишется прямо сейчас) файл пропускается до следующего вызова.
+        """
+        try:
+            stat = os.stat(json_path)
+        except FileNotFoundError:
+            return 0
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if self._json_seen.get(json_path) == signature:
+            return 0
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                trades = json.load(f)
+        except Exception as e:
+            logger.error(f"❌ Cannot import open trades {json_path}: {e}")
+            return 0
+
+        # В файл пишут только открытые сделки; уже известные (в том числе закрытые) не перетираем
+        def insert(conn):
+            before = conn.total_changes
+            now = time.time()
+            conn.executemany(
+                'INSERT OR IGNORE INTO open_trades (trade_id, symbol, status, data, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(trade_key(t), t.get('symbol'), STATUS_OPEN, json.dumps(t, ensure_ascii=False), now) for t in trades]
+            )
+            return conn.total_changes - before
+
+        added = self.db.run(insert).result()
+        self._json_seen[json_path] = signature
+        if added:
+            logger.info(f"✅ Imported {added} new open trades from {json_path}")
+        return added
+
+    # === Чтение ===
+
+    def list_trades(self, status: str = STATUS_OPEN) -> List[Dict[str, Any]]:
+        """Сделки со статусом (по индексу), в порядке добавления"""
+        rows = self.db.query('SELECT data FROM open_trades WHERE status = ? ORDER BY rowid', (status,))
+        return [json.loads(data) for (data,) in rows]
+
+    def get(self, trade_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.query_one('SELECT data FROM open_trades WHERE trade_id = ?', (trade_id,))
+        return json.loads(row[0]) if row else None
+
+    def count(self, status: str = STATUS_OPEN) -> int:
+        return self.db.query_one('SELECT COUNT(*) FROM open_trades WHERE status = ?', (status,))[0]
+
+    # === Запись (каждый вызов - одна транзакция, ждет коммита) ===
+
+    def upsert(self, trade: Dict[str, Any], trade_id: str = None):
+        """Добавить или полностью заменить сделку (trade_id - если ключ взят до изменения полей)"""
+        self.db.execute('''
+            INSERT INTO open_trades (trade_id, symbol, status, data, updated_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(trade_id) DO UPDATE SET
+                symbol = excluded.symbol, status = excluded.status, data = excluded.data, updated_at = excluded.updated_at
+        ''', (
+            trade_id or trade_key(trade), trade.get('symbol'), trade.get('status') or STATUS_OPEN,
+            json.dumps(trade, ensure_ascii=False), time.time()
+        )).result()
+
+    def update(self, trade_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Изменить поля одной сделки (чтение-изменение-запись атомарно); обновленная сделка или None"""
+        def apply(conn):
+            row = conn.execute('SELECT status, data FROM open_trades WHERE trade_id = ?', (trade_id,)).fetchone()
+            if row is None:
+                return None
+            status, data = row
+            trade = {**json.loads(data), **fields}
+            # Статус строки меняется только явно (в данных сделки может лежать свое поле status)
+            conn.execute(
+                'UPDATE open_trades SET symbol = ?, status = ?, data = ?, updated_at = ? WHERE trade_id = ?',
+                (trade.get('symbol'), fields.get('status', status),
+                 json.dumps(trade, ensure_ascii=False), time.time(), trade_id)
+            )
+            return trade
+
+        return self.db.run(apply).result()
+
+    def mark_closed(self, trade_id: str, trade: Dict[str, Any]):
+        """Сделка закрыта: финальные данные сохраняются, из выборки открытых она выпадает"""
+        self.upsert({**trade, 'status': STATUS_CLOSED}, trade_id)
+
+    def remove(self, trade_id: str):
+        self.db.execute('DELETE FROM open_trades WHERE trade_id = ?', (trade_id,)).result()
@@ -0,0 +1,316 @@
+"""
+GHOST Parquet Store
+Локальная колоночная копия аналитических таблиц Supabase: v_trades, signals_parsed, signal_outcomes, свечи
+Экспорт инкрементальный (водяная метка из change feed), файлы разбиты по дате и трейдеру,
+чтение с проекцией колонок и отсечением партиций вместо постраничного REST
+"""
+
+import glob
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    logging.warning("⚠️ pyarrow not available, Parquet store disabled")
+    pa = None
+
+from core.change_feed import ChangeFeedPoller, supabase_fetcher
+
+logger = logging.getLogger(__name__)
+
+# Служебная колонка: номер выгрузки, из нескольких версий строки при чтении остается последняя
+EXPORT_SEQ = '_export_seq'
+
+# Строки без даты - в начало диапазона, чтобы не попадать в выборки "с даты"
+UNDATED = '0000-00-00'
+
+
+@dataclass
+class ParquetDataset:
+    """Описание выгружаемой таблицы"""
+    table: str
+    key: str                        # уникальный ключ строки (дедупликация версий)
+    cursor_column: Optional[str]    # колонка водяной метки (None - только по id, таблица append-only)
+    id_column: str
+    date_column: str
+    date_is_epoch: bool             # unix timestamp (секунды) или ISO строка
+    partition_column: str           # колонка второго уровня партиций
+    partition_name: str = 'trader'
+
+
+DATASETS: Dict[str, ParquetDataset] = {
+    'v_trades': ParquetDataset('v_trades', key='id', cursor_column='updated_at', id_column='id',
+                               date_column='posted_ts', date_is_epoch=True, partition_column='source_name'),
+    'signals_parsed': ParquetDataset('signals_parsed', key='signal_id', cursor_column=None, id_column='signal_id',
+                                     date_column='posted_at', date_is_epoch=False, partition_column='trader_id'),
+    'signal_outcomes': ParquetDataset('signal_outcomes', key='signal_id', cursor_column='calculated_at',
+                                      id_column='signal_id', date_column='calculated_at', date_is_epoch=False,
+                                      partition_column='trader_id'),
+    'signal_candles_1s': ParquetDataset('signal_candles_1s', key='id', cursor_column='created_at', id_column='id',
+                                        date_column='timestamp', date_is_epoch=True, partition_column='symbol',
+                                        partition_name='symbol'),
+}
+
+
+def _partition_value(value: Any) -> str:
+    """Значение для имени каталога партиции"""
+    if value is None or value == '':
+        return 'unknown'
+    return ''.join(ch if ch.isalnum() or ch in '-_.' else '_' for ch in str(value))
+
+
+def _day(value: Union[str, date, datetime, None]) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)[:10]
+
+
+class ParquetStore:
+    """
+    Каталог датасетов: <root>/<table>/date=YYYY-MM-DD/<trader|symbol>=<value>/part-<seq>.parquet
+
+    export() дописывает новые файлы по водяной метке, обновленные строки приходят новой версией
+    и при чтении перекрывают старую; партиции с большим числом файлов переписываются одним файлом
+    """
+
+    def __init__(self, root: str = None, page_size: int = None, max_files: int = None):
+        self.root = root or os.getenv('GHOST_PARQUET_DIR', 'data/parquet')
+        self.page_size = page_size or int(os.getenv('GHOST_PARQUET_PAGE_SIZE', '1000'))
+        # Больше файлов в партиции - компактизация в один
+        self.max_files = max_files or int(os.getenv('GHOST_PARQUET_MAX_FILES', '8'))
+
+        self._schema_cache: Dict[str, 'pa.Schema'] = {}
+
+        self.stats = {
+            'exported_rows': 0,
+            'files_written': 0,
+            'partitions_compacted': 0,
+            'reads': 0,
+            'rows_read': 0
+        }
+
+    @property
+    def available(self) -> bool:
+        return pa is not None
+
+    def _dataset_dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _state_path(self, name: str) -> str:
+        return os.path.join(self._dataset_dir(name), '_watermark.json')
+
+    def _files(self, name: str) -> List[str]:
+        return sorted(glob.glob(os.path.join(self._dataset_dir(name), 'date=*', '*=*', '*.parquet')))
+
+    def has_data(self, name: str) -> bool:
+        return self.available and bool(self._files(name))
+
+    def watermark(self, name: str) -> Optional[tuple]:
+        """Метка последней выгруженной строки (cursor, id) - строки после нее читать из Supabase"""
+        try:
+            with open(self._state_path(name), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            return state.get('cursor'), state.get('id')
+        except (OSError, ValueError):
+            return None
+
+    # === Экспорт ===
+
+    def export(self, supabase, names: Iterable[str] = None) -> Dict[str, int]:
+        """Инкрементальная выгрузка (блокирующая); количество выгруженных строк по таблицам"""
+        if not self.available:
+            logger.warning("⚠️ Parquet export skipped: pyarrow not installed")
+            return {}
+
+        exported = {}
+        for name in names or DATASETS:
+            spec = DATASETS[name]
+            touched = set()
+            feed = ChangeFeedPoller(
+                f"parquet:{name}",
+                supabase_fetcher(supabase, spec.table, cursor_column=spec.cursor_column, id_column=spec.id_column),
+                cursor_column=spec.cursor_column,
+                id_column=spec.id_column,
+                page_size=self.page_size,
+                state_path=self._state_path(name)
+            )
+            started = time.perf_counter()
+            # Метка сохраняется только после записи файлов страницы - сбой повторит страницу, дубли уйдут при чтении
+            rows = feed.poll_sync(lambda page: touched.update(self._write_page(spec, page)))
+
+            for directory in touched:
+                self._compact_partition(spec, directory)
+
+            exported[name] = rows
+            self.stats['exported_rows'] += rows
+            if rows:
+                logger.info(f"📦 Parquet export {name}: {rows} rows, {len(touched)} partitions "
+                            f"in {time.perf_counter() - started:.1f}s")
+        return exported
+
+    def _row_day(self, spec: ParquetDataset, row: Dict[str, Any]) -> str:
+        value = row.get(spec.date_column)
+        if value in (None, ''):
+            return UNDATED
+        if spec.date_is_epoch:
+            return datetime.fromtimestamp(int(value), timezone.utc).strftime('%Y-%m-%d')
+        return str(value)[:10]
+
+    def _write_page(self, spec: ParquetDataset, rows: List[Dict[str, Any]]) -> List[str]:
+        """Страница строк -> по файлу на затронутую партицию; каталоги партиций"""
+        seq = time.time_ns()
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for row in rows:
+            # JSONB колонки храним строкой - структура у разных строк разная
+            record = {k: json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v for k, v in row.items()}
+            record[EXPORT_SEQ] = seq
+            key = (self._row_day(spec, row), _partition_value(row.get(spec.partition_column)))
+            groups.setdefault(key, []).append(record)
+
+        directories = []
+        for (day, partition), records in groups.items():
+            directory = os.path.join(self._dataset_dir(spec.table), f"date={day}", f"{spec.partition_name}={partition}")
+            self._write_file(directory, f"part-{seq}.parquet", pa.Table.from_pylist(records))
+            directories.append(directory)
+        return directories
+
+    def _write_file(self, directory: str, filename: str, table: 'pa.Table'):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, filename)
+        tmp_path = f"{path}.tmp"
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+        self.stats['files_written'] += 1
+
+    def _compact_partition(self, spec: ParquetDataset, directory: str):
+        """Слить файлы партиции в один, оставив последние версии строк"""
+        files = sorted(glob.glob(os.path.join(directory, '*.parquet')))
+        if len(files) <= self.max_files:
+            return
+        table = self._dedupe(spec, ds.dataset(files, schema=self._unified_schema(files)).to_table())
+        self._write_file(directory, f"part-{table[EXPORT_SEQ].to_numpy().max()}-c.parquet", table)
+        for path in files:
+            os.remove(path)
+        self.stats['partitions_compacted'] += 1
+        logger.debug(f"🗜️ Parquet partition compacted: {directory} ({len(files)} files -> 1)")
+
+    # === Чтение ===
+
+    def _unified_schema(self, files: List[str]) -> 'pa.Schema':
+        """Общая схема файлов: колонка, пустая в одной выгрузке (null), принимает тип из других"""
+        key = '|'.join(files)
+        schema = self._schema_cache.get(key)
+        if schema is None:
+            schema = pa.unify_schemas([pq.read_schema(path) for path in files], promote_options='permissive')
+            self._schema_cache[key] = schema
+            if len(self._schema_cache) > 32:
+                self._schema_cache.pop(next(iter(self._schema_cache)))
+        return schema
+
+    def _dedupe(self, spec: ParquetDataset, table: 'pa.Table') -> 'pa.Table':
+        """Одна строка на ключ - из самой поздней выгрузки"""
+        if table.num_rows < 2:
+            return table
+        table = table.sort_by([(spec.key, 'ascending'), (EXPORT_SEQ, 'descending')])
+        keys = table[spec.key].combine_chunks()
+        changed = pc.not_equal(keys.slice(1), keys.slice(0, len(keys) - 1))
+        keep = pa.concat_arrays([pa.array([True]), pc.fill_null(changed, True)])
+        return table.filter(keep)
+
+    def read(self, name: str, columns: List[str] = None, start: Union[str, date, datetime] = None,
+             end: Union[str, date, datetime] = None, partitions: Iterable[Any] = None,
+             filter: 'ds.Expression' = None) -> 'pa.Table':
+        """
+        Таблица датасета с проекцией колонок
+
+        start / end (включительно) и partitions (трейдеры или символы) отсекают каталоги целиком,
+        filter - дополнительное выражение pyarrow по колонкам файла; применяется после дедупликации,
+        то есть к последней версии строки (иначе старая версия, подходящая под filter, "воскресает")
+        """
+        if not self.available:
+            raise RuntimeError("pyarrow is not installed")
+
+        spec = DATASETS[name]
+        files = self._files(name)
+        if not files:
+            return pa.table({column: pa.array([], pa.null()) for column in (columns or [])})
+
+        base = self._dataset_dir(name)
+        partitioning = ds.partitioning(
+            pa.schema([('date', pa.string()), (spec.partition_name, pa.string())]), flavor='hive'
+        )
+        schema = self._unified_schema(files)
+        schema = schema.append(pa.field('date', pa.string())).append(pa.field(spec.partition_name, pa.string()))
+        dataset = ds.dataset(files, schema=schema, format='parquet', partitioning=partitioning, partition_base_dir=base)
+
+        expression = None
+        conditions = []
+        if start is not None:
+            conditions.append(ds.field('date') >= _day(start))
+        if end is not None:
+            conditions.append(ds.field('date') <= _day(end))
+        if partitions is not None:
+            conditions.append(ds.field(spec.partition_name).isin([_partition_value(p) for p in partitions]))
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        # Ключ и номер выгрузки нужны для дедупликации, даже если не запрошены;
+        # колонки выражения filter из него не извлечь - с filter читаются все колонки
+        wanted = list(columns) if columns else [field.name for field in dataset.schema if field.name != EXPORT_SEQ]
+        projection = None if filter is not None else list(dict.fromkeys(wanted + [spec.key, EXPORT_SEQ]))
+        table = self._dedupe(spec, dataset.to_table(columns=projection, filter=expression))
+        if filter is not None:
+            table = table.filter(filter)
+
+        self.stats['reads'] += 1
+        self.stats['rows_read'] += table.num_rows
+        return table.select(wanted)
+
+    def read_rows(self, name: str, **kwargs) -> List[Dict[str, Any]]:
+        """То же, что read(), списком словарей - формат ответов Supabase для существующей аналитики"""
+        return self.read(name, **kwargs).to_pylist()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'datasets': {name: len(self._files(name)) for name in DATASETS}
+        }
+
+
+# Глобальный экземпляр
+_parquet_store: Optional[ParquetStore] = None
+
+
+def get_parquet_store() -> ParquetStore:
+    """Общий каталог Parquet (GHOST_PARQUET_DIR)"""
+    global _parquet_store
+    if _parquet_store is None:
+        _parquet_store = ParquetStore()
+    return _parquet_store
+
+
+if __name__ == "__main__":
+    # Разовая выгрузка (cron): python -m core.parquet_store [table ...]
+    import sys
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    supabase = create_client(
+        os.getenv('NEXT_PUBLIC_SUPABASE_URL'),
+        os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+    )
+    print(json.dumps(get_parquet_store().export(supabase, sys.argv[1:] or None), indent=2))
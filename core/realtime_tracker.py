@@ -13,6 +13,12 @@ from typing import Dict, List, Set
 from dataclasses import dataclass
 import aiohttp
 
+try:
+    from core.change_feed import ChangeFeedPoller, supabase_fetcher
+except ImportError:
+    # Fallback для запуска из core/
+    from change_feed import ChangeFeedPoller, supabase_fetcher
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -42,15 +48,32 @@ class RealtimeTracker:
         self.binance_ws_url = "wss://stream.binance.com:9443/ws"
         self.running = False
         
+        # signals_parsed без updated_at - метка по signal_id (autoincrement): каждая загрузка читает только новые
+        self.signal_feed = ChangeFeedPoller(
+            'signals_parsed_active',
+            supabase_fetcher(supabase_client, 'signals_parsed', cursor_column=None,
+                             id_column='signal_id', filters=self._active_window),
+            cursor_column=None,
+            id_column='signal_id'
+        )
+        
+    @staticmethod
+    def _active_window(query):
+        """Валидные сигналы за последние 24 часа"""
+        yesterday = (datetime.now() - timedelta(hours=24)).isoformat()
+        return query.gte('posted_at', yesterday).eq('is_valid', True)
+        
     async def load_active_signals(self):
-        """Загрузить активные сигналы из БД"""
-        try:
-            # Получаем сигналы за последние 24 часа
-            yesterday = (datetime.now() - timedelta(hours=24)).isoformat()
-            
-            signals = self.supabase.table('signals_parsed').select('*').gte('posted_at', yesterday).eq('is_valid', True).execute()
-            
-            for signal in signals.data:
+        """Загрузить новые активные сигналы из БД (уже отслеживаемые не перечитываются)"""
+        loaded = await self.signal_feed.poll(self._apply_new_signals)
+        print(f"📊 Загружено активных сигналов: {len(self.active_signals)} (новых: {loaded})")
+    
+    def _apply_new_signals(self, signals: List[dict]):
+        """Добавить страницу новых сигналов; состояние уже отслеживаемых не сбрасывается"""
+        for signal in signals:
+            if signal['signal_id'] in self.active_signals:
+                continue
+            try:
                 if signal['symbol'] and signal['entry'] and signal['tp1']:
                     active_signal = ActiveSignal(
                         signal_id=signal['signal_id'],
@@ -67,10 +90,9 @@ class RealtimeTracker:
                     
                     self.active_signals[signal['signal_id']] = active_signal
                     
-            print(f"📊 Загружено активных сигналов: {len(self.active_signals)}")
-            
-        except Exception as e:
-            logger.error(f"Ошибка загрузки активных сигналов: {e}")
+            except Exception as e:
+                # Битая строка не должна держать метку - пропускаем ее
+                logger.error(f"Ошибка загрузки активного сигнала {signal.get('signal_id')}: {e}")
     
     async def subscribe_to_prices(self):
         """Подписка на цены через Binance WebSocket"""
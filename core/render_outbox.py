@@ -0,0 +1,214 @@
+"""
+GHOST Render Outbox
+Надежная локальная очередь исходящих сигналов (SQLite WAL) и фоновая отправка пачками
+Запись в outbox мгновенная, недоступность Render не блокирует и не теряет сигналы
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from core.durable_outbox import DurableOutbox
+
+logger = logging.getLogger(__name__)
+
+
+class RenderOutbox(DurableOutbox):
+    """Outbox сигналов для Render webhook"""
+
+    def __init__(self, path: str = None):
+        super().__init__(path or os.getenv('GHOST_RENDER_OUTBOX', 'data/render_outbox.db'))
+
+
+class OutboxSender:
+    """
+    Фоновый отправитель: пачки по keep-alive сессии, экспоненциальный backoff при ошибках
+
+    Если batch эндпоинт отвечает 404 (деплой без /batch) - дальше шлем по одной на single_url.
+    Запись, не отправленная за max_attempts попыток, уходит в outbox_dead и не блокирует очередь.
+    """
+
+    def __init__(self, outbox: RenderOutbox, url: str, batch_size: int = None,
+                 base_delay: float = 1.0, max_delay: float = 300.0, timeout: float = 15.0,
+                 single_url: str = None, max_attempts: int = None):
+        self.outbox = outbox
+        self.url = url
+        self.single_url = single_url
+        self.batch_size = batch_size or int(os.getenv('GHOST_RENDER_BATCH_SIZE', '100'))
+        self.max_attempts = max_attempts or int(os.getenv('GHOST_RENDER_MAX_ATTEMPTS', '20'))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._failures = 0
+        self._paused_until = 0.0
+        self._batching = True
+
+        self.stats = {
+            'sent': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'dead_lettered': 0,
+            'last_error': None
+        }
+
+    def notify(self):
+        """Новая запись в outbox - разбудить отправителя"""
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name='render-outbox-sender')
+
+    async def stop(self, flush_timeout: float = 5.0):
+        """Остановка; неотправленное остается в outbox до следующего запуска"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await asyncio.wait_for(self.flush(), flush_timeout)
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            logger.warning(f"⚠️ Outbox flush incomplete: {e}")
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    async def flush(self):
+        """Отправить всё готовое сейчас (до первой ошибки)"""
+        while await self._send_batch():
+            pass
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(limit=4, keepalive_timeout=60)
+            )
+        return self._session
+
+    async def _post(self, url: str, payload: Dict[str, Any]):
+        session = await self._get_session()
+        async with session.post(url, json=payload) as response:
+            if response.status >= 300:
+                raise aiohttp.ClientResponseError(
+                    response.request_info, response.history, status=response.status,
+                    message=(await response.text())[:200]
+                )
+
+    async def _send_batch(self) -> bool:
+        """Одна пачка; True если что-то отправлено"""
+        batch = self.outbox.fetch_batch(self.batch_size)
+        if not batch:
+            return False
+
+        if not self._batching:
+            return await self._send_single(batch)
+
+        ids = [row_id for row_id, _, _ in batch]
+        payload = {'signals': [dict(item, outbox_id=row_id) for row_id, item, _ in batch]}
+
+        try:
+            await self._post(self.url, payload)
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404 and self.single_url:
+                # Приемник без batch маршрута - попытка не засчитывается, та же пачка уходит по одной
+                self._batching = False
+                logger.warning(f"⚠️ Render batch endpoint not found ({self.url}), sending one by one")
+                return await self._send_single(batch)
+            self._fail(batch, e)
+            return False
+        except Exception as e:
+            self._fail(batch, e)
+            return False
+
+        self._succeed(ids)
+        self.stats['batches'] += 1
+        logger.debug(f"✅ Sent {len(ids)} signals to Render")
+        return True
+
+    async def _send_single(self, batch) -> bool:
+        """По одной записи на single_url; клиентская ошибка (4xx) откладывает только свою запись"""
+        sent = False
+        for index, (row_id, item, attempts) in enumerate(batch):
+            try:
+                await self._post(self.single_url, dict(item, outbox_id=row_id))
+            except aiohttp.ClientResponseError as e:
+                if 400 <= e.status < 500 and e.status not in (408, 429):
+                    self._fail([(row_id, item, attempts)], e, pause=False)
+                    continue
+                self._fail(batch[index:], e)
+                return sent
+            except Exception as e:
+                self._fail(batch[index:], e)
+                return sent
+            self._succeed([row_id])
+            sent = True
+        return sent
+
+    def _succeed(self, ids):
+        self._failures = 0
+        self.outbox.ack(ids)
+        self.stats['sent'] += len(ids)
+
+    def _fail(self, batch, error: Exception, pause: bool = True):
+        """Исчерпавшие попытки - в outbox_dead, остальные откладываются с backoff"""
+        self._failures += 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (self._failures - 1))
+        delay *= random.uniform(0.8, 1.2)
+
+        dead = [row_id for row_id, _, attempts in batch if attempts + 1 >= self.max_attempts]
+        retry = [row_id for row_id, _, attempts in batch if attempts + 1 < self.max_attempts]
+        if dead:
+            self.outbox.dead_letter(dead, str(error)[:500])
+            self.stats['dead_lettered'] += len(dead)
+            logger.error(f"❌ {len(dead)} signals moved to outbox_dead after {self.max_attempts} attempts: {error}")
+        if retry:
+            self.outbox.retry(retry, delay)
+
+        if pause:
+            self._paused_until = time.monotonic() + delay
+        self.stats['failed_batches'] += 1
+        self.stats['last_error'] = str(error)[:200]
+        logger.warning(f"⚠️ Render send of {len(batch)} failed ({error}), retry in {delay:.1f}s")
+
+    async def _run(self):
+        while True:
+            # Во время backoff новые записи копятся в outbox и не дергают упавший эндпоинт
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+            try:
+                while await self._send_batch():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Outbox sender error: {e}")
+
+            if self._paused_until > time.monotonic():
+                continue
+
+            # Ждем новую запись или срок ближайшей отложенной
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.outbox.next_due_in())
+            except asyncio.TimeoutError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'pending': len(self.outbox),
+            'dead': self.outbox.dead_count(),
+            'batching': self._batching,
+            'consecutive_failures': self._failures
+        }
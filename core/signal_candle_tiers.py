@@ -0,0 +1,105 @@
+"""
+GHOST Signal Candle Tiers
+Сжатие истории свечей по сигналам: 1s -> 1m -> 5m -> 1h (функции из create_signal_candles_tiers.sql)
+Компакция идет порциями (одна транзакция на вызов), чтение диапазона само выбирает разрешение
+"""
+
+import logging
+import os
+import time
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class SignalCandleTiers:
+    """Компакция ярусов и чтение свечей сигнала через RPC Supabase"""
+
+    def __init__(self, supabase, keep_1s_hours: float = None, keep_1m_days: float = None,
+                 keep_5m_days: float = None, chunk_hours: float = None, max_chunks: int = None):
+        self.supabase = supabase
+        # Сроки хранения мелких ярусов; часовой хранится без ограничения
+        self.keep_1s = int(3600 * (keep_1s_hours or float(os.getenv('GHOST_CANDLES_1S_KEEP_HOURS', '24'))))
+        self.keep_1m = int(86400 * (keep_1m_days or float(os.getenv('GHOST_CANDLES_1M_KEEP_DAYS', '7'))))
+        self.keep_5m = int(86400 * (keep_5m_days or float(os.getenv('GHOST_CANDLES_5M_KEEP_DAYS', '30'))))
+        # Сколько истории сворачивать за одну транзакцию и сколько транзакций за проход
+        self.chunk_seconds = int(3600 * (chunk_hours or float(os.getenv('GHOST_CANDLES_COMPACT_CHUNK_HOURS', '6'))))
+        self.max_chunks = max_chunks or int(os.getenv('GHOST_CANDLES_COMPACT_MAX_CHUNKS', '20'))
+
+        self.stats = {
+            'compactions': 0,
+            'rows_rolled_up': 0,
+            'rows_written': 0,
+            'last_compaction': None,
+            'last_compaction_ms': 0.0,
+            'backlog': False,
+            'errors': 0
+        }
+
+    def compact(self) -> Dict[str, Any]:
+        """
+        Один проход компакции (блокирующий - из async кода вызывать через asyncio.to_thread)
+
+        Порции повторяются, пока есть что сворачивать, но не больше max_chunks за проход -
+        большой накопленный хвост разбирается за несколько проходов, не держа долгих транзакций
+        """
+        started = time.perf_counter()
+        rolled = {'1s': 0, '1m': 0, '5m': 0}
+        written = 0
+        remaining = False
+
+        try:
+            for _ in range(self.max_chunks):
+                result = self.supabase.rpc('compact_signal_candles', {
+                    'p_keep_1s': self.keep_1s,
+                    'p_keep_1m': self.keep_1m,
+                    'p_keep_5m': self.keep_5m,
+                    'p_chunk_seconds': self.chunk_seconds
+                }).execute().data or {}
+
+                for tier in rolled:
+                    tier_result = result.get(tier) or {}
+                    rolled[tier] += tier_result.get('deleted', 0)
+                    written += tier_result.get('written', 0)
+                remaining = bool(result.get('remaining'))
+                if not remaining:
+                    break
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"❌ Candle compaction failed: {e}")
+
+        total = sum(rolled.values())
+        self.stats['compactions'] += 1
+        self.stats['rows_rolled_up'] += total
+        self.stats['rows_written'] += written
+        self.stats['backlog'] = remaining
+        self.stats['last_compaction'] = time.time()
+        self.stats['last_compaction_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+        if total:
+            logger.info(f"🗜️ Candles compacted: 1s={rolled['1s']}, 1m={rolled['1m']}, 5m={rolled['5m']} "
+                        f"rows -> {written} coarser candles" + (" (backlog remains)" if remaining else ""))
+        return {'rolled_up': rolled, 'written': written, 'remaining': remaining}
+
+    def get_candles(self, signal_id: str, start_ts: int, end_ts: int,
+                    max_points: int = 1500) -> List[Dict[str, Any]]:
+        """
+        Свечи сигнала за [start_ts, end_ts] из подходящих ярусов
+
+        Каждая свеча содержит resolution - ширину в секундах; участки старше срока хранения
+        мелкого яруса приходят грубее запрошенного разрешения
+        """
+        result = self.supabase.rpc('get_signal_candles', {
+            'p_signal_id': signal_id,
+            'p_from': int(start_ts),
+            'p_to': int(end_ts),
+            'p_max_points': int(max_points)
+        }).execute()
+        return result.data or []
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'keep_seconds': {'1s': self.keep_1s, '1m': self.keep_1m, '5m': self.keep_5m}
+        }
+
@@ -20,6 +20,8 @@ except ImportError:
     create_client = None
 
 from core.bybit_websocket import get_bybit_client, CandleData
+from core.change_feed import ChangeFeedPoller, supabase_fetcher
+from core.signal_candle_tiers import SignalCandleTiers
 
 logger = logging.getLogger(__name__)
 
@@ -62,6 +64,24 @@ class SignalCandleTracker:
         self.max_tracking_days = 7  # максимум дней отслеживания
         self.check_interval = 30    # интервал проверки новых сигналов (секунды)
         
+        # Изменения v_trades по водяной метке (updated_at, id): опрос читает только измененные строки.
+        # Метка в памяти - после рестарта первый проход заново собирает открытые сигналы окна
+        self.signal_feed: Optional[ChangeFeedPoller] = None
+        if self.supabase:
+            self.signal_feed = ChangeFeedPoller(
+                'v_trades_sim_open',
+                supabase_fetcher(
+                    self.supabase, 'v_trades',
+                    columns='id, symbol, side, entry_min, entry_max, tp1, tp2, sl, posted_ts, status, updated_at',
+                    filters=self._signal_window
+                )
+            )
+        
+        # Сворачивание старых 1s свечей в ярусы 1m/5m/1h (create_signal_candles_tiers.sql)
+        self.candle_tiers: Optional[SignalCandleTiers] = SignalCandleTiers(self.supabase) if self.supabase else None
+        self.compact_interval = int(os.getenv('GHOST_CANDLES_COMPACT_INTERVAL', '3600'))
+        self.last_compact_time = 0.0
+        
         # Статистика
         self.stats = {
             'signals_tracked': 0,
@@ -85,6 +105,9 @@ class SignalCandleTracker:
                 # Проверяем устаревшие подписки
                 await self._cleanup_old_subscriptions()
                 
+                # Компакция истории свечей
+                await self._compact_candles()
+                
                 # Обновляем статистику
                 self._update_stats()
                 
@@ -95,56 +118,65 @@ class SignalCandleTracker:
             logger.error(f"❌ Error in tracking loop: {e}")
             raise
     
+    def _signal_window(self, query):
+        """Только сигналы в окне отслеживания (статус не фильтруем - нужны и закрытия)"""
+        cutoff_time = int(time.time()) - (self.max_tracking_days * 24 * 3600)
+        return query.gte('posted_ts', cutoff_time)
+    
     async def _check_new_signals(self):
-        """Проверка новых сигналов в таблице v_trades"""
-        if not self.supabase:
+        """Проверка изменений в таблице v_trades (новые, закрытые, измененные сигналы)"""
+        if not self.signal_feed:
             return
         
         try:
-            # Получаем сигналы, которые еще не отслеживаются
-            current_time = int(time.time())
-            cutoff_time = current_time - (self.max_tracking_days * 24 * 3600)
-            
-            # Запрос к v_trades на новые сигналы
-            response = self.supabase.table('v_trades').select(
-                'id, symbol, side, entry_min, entry_max, tp1, tp2, sl, posted_ts, status'
-            ).gte('posted_ts', cutoff_time).eq('status', 'sim_open').execute()
-            
-            if response.data:
-                for signal_data in response.data:
-                    signal_id = signal_data['id']
-                    
-                    # Проверяем, не отслеживаем ли уже
-                    if signal_id not in self.tracked_signals:
-                        
-                        # Проверяем, что символ валидный
-                        symbol = signal_data['symbol']
-                        if not symbol or len(symbol) < 3:
-                            logger.warning(f"⚠️ Invalid symbol for signal {signal_id}: {symbol}")
-                            continue
-                        
-                        # Создаем объект сигнала
-                        signal = SignalInfo(
-                            signal_id=signal_id,
-                            symbol=symbol,
-                            side=signal_data['side'],
-                            entry_min=float(signal_data['entry_min'] or 0),
-                            entry_max=float(signal_data['entry_max'] or 0), 
-                            tp1=float(signal_data['tp1'] or 0),
-                            tp2=float(signal_data['tp2'] or 0),
-                            sl=float(signal_data['sl'] or 0),
-                            posted_ts=signal_data['posted_ts'],
-                            status=signal_data['status']
-                        )
-                        
-                        # Запускаем отслеживание
-                        await self._start_signal_tracking(signal)
-            
+            await self.signal_feed.poll(self._apply_signal_changes)
             self.stats['last_signal_check'] = datetime.now()
             
         except Exception as e:
             logger.error(f"❌ Error checking new signals: {e}")
     
+    async def _apply_signal_changes(self, rows: List[dict]):
+        """Применение страницы изменений к отслеживаемым сигналам"""
+        for signal_data in rows:
+            signal_id = signal_data['id']
+            
+            # Сигнал закрыт/пропущен - подписка больше не нужна
+            if signal_data['status'] != 'sim_open':
+                if signal_id in self.tracked_signals:
+                    await self._stop_signal_tracking(signal_id)
+                continue
+            
+            # Уже отслеживаем - обновляем уровни на месте, подписка та же
+            tracked = self.tracked_signals.get(signal_id)
+            if tracked is not None:
+                tracked.tp1 = float(signal_data['tp1'] or 0)
+                tracked.tp2 = float(signal_data['tp2'] or 0)
+                tracked.sl = float(signal_data['sl'] or 0)
+                continue
+            
+            # Проверяем, что символ валидный
+            symbol = signal_data['symbol']
+            if not symbol or len(symbol) < 3:
+                logger.warning(f"⚠️ Invalid symbol for signal {signal_id}: {symbol}")
+                continue
+            
+            # Создаем объект сигнала
+            signal = SignalInfo(
+                signal_id=signal_id,
+                symbol=symbol,
+                side=signal_data['side'],
+                entry_min=float(signal_data['entry_min'] or 0),
+                entry_max=float(signal_data['entry_max'] or 0), 
+                tp1=float(signal_data['tp1'] or 0),
+                tp2=float(signal_data['tp2'] or 0),
+                sl=float(signal_data['sl'] or 0),
+                posted_ts=signal_data['posted_ts'],
+                status=signal_data['status']
+            )
+            
+            # Запускаем отслеживание
+            await self._start_signal_tracking(signal)
+    
     async def _start_signal_tracking(self, signal: SignalInfo):
         """Запуск отслеживания конкретного сигнала"""
         try:
@@ -291,6 +323,18 @@ class SignalCandleTracker:
         except Exception as e:
             logger.error(f"❌ Error in cleanup: {e}")
     
+    async def _compact_candles(self):
+        """Периодическая свертка старых свечей (в потоке - RPC блокирующие)"""
+        if not self.candle_tiers or time.time() - self.last_compact_time < self.compact_interval:
+            return
+        
+        self.last_compact_time = time.time()
+        result = await asyncio.to_thread(self.candle_tiers.compact)
+        
+        # Хвост не разобран - следующая порция на ближайшей проверке, а не через интервал
+        if result['remaining']:
+            self.last_compact_time = 0.0
+    
     async def _stop_signal_tracking(self, signal_id: str):
         """Остановка отслеживания сигнала"""
         try:
@@ -349,6 +393,8 @@ class SignalCandleTracker:
         
         return {
             **self.stats,
+            'signal_feed': self.signal_feed.get_stats() if self.signal_feed else None,
+            'candle_tiers': self.candle_tiers.get_stats() if self.candle_tiers else None,
             'tracked_signals': list(self.tracked_signals.keys()),
             'active_symbols': list(self.symbol_subscriptions.keys()),
             'uptime_seconds': round(uptime),
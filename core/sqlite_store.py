@@ -0,0 +1,314 @@
+"""
+GHOST SQLite Store
+Общий слой доступа к локальным SQLite базам: WAL, настроенные PRAGMA, пул читающих соединений
+Все записи идут через один поток-писатель на базу и группируются в транзакции, event loop не блокируется
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# Виды операций писателя
+_EXECUTE = 'execute'
+_EXECUTEMANY = 'executemany'
+_CALL = 'call'
+
+
+class SQLiteStore:
+    """
+    Одна локальная база: пул читателей + единственный писатель
+
+    Запись (execute / executemany / run) ставится в очередь и сразу возвращает Future;
+    поток-писатель забирает всё накопившееся и коммитит одной транзакцией.
+    Порядок записей сохраняется (FIFO), ошибка одной операции откатывает только ее (SAVEPOINT на операцию), соседние коммитятся.
+    Подготовленные выражения переиспользуются кешем sqlite3 (cached_statements) на каждом соединении.
+    """
+
+    def __init__(self, path: str, readers: int = None, batch_size: int = None,
+                 cache_kb: int = None, mmap_mb: int = None, statement_cache: int = None):
+        self.path = path
+        self.readers = readers or int(os.getenv('GHOST_SQLITE_READERS', '4'))
+        self.batch_size = batch_size or int(os.getenv('GHOST_SQLITE_BATCH', '500'))
+        self.cache_kb = cache_kb or int(os.getenv('GHOST_SQLITE_CACHE_KB', '16384'))
+        self.mmap_mb = mmap_mb if mmap_mb is not None else int(os.getenv('GHOST_SQLITE_MMAP_MB', '64'))
+        self.statement_cache = statement_cache or int(os.getenv('GHOST_SQLITE_STATEMENT_CACHE', '256'))
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._pool: 'queue.LifoQueue[sqlite3.Connection]' = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._opened_readers = 0
+
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._closed = False
+
+        self.stats = {
+            'writes': 0,
+            'write_errors': 0,
+            'transactions': 0,
+            'max_batch': 0,
+            'write_time': 0.0,
+            'reads': 0
+        }
+
+        # Писатель открывает соединение и включает WAL до первой записи
+        ready: Future = Future()
+        self._writer = threading.Thread(target=self._writer_loop, args=(ready,),
+                                        name=f"sqlite-writer:{os.path.basename(path)}", daemon=True)
+        self._writer.start()
+        ready.result()
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                               timeout=5.0, cached_statements=self.statement_cache)
+        if not readonly:
+            conn.execute('PRAGMA journal_mode=WAL')
+        # NORMAL в WAL: fsync только на checkpoint, база переживает падение процесса
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{self.cache_kb}')
+        conn.execute(f'PRAGMA mmap_size={self.mmap_mb * 1024 * 1024}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA busy_timeout=5000')
+        if readonly:
+            conn.execute('PRAGMA query_only=1')
+        return conn
+
+    # === Запись ===
+
+    def _submit(self, kind: str, target: Any, params: Any = None) -> Future:
+        if self._closed:
+            raise RuntimeError(f"SQLite store {self.path} is closed")
+        future: Future = Future()
+        self._queue.put((kind, target, params, future))
+        return future
+
+    def execute(self, sql: str, params: Sequence = ()) -> Future:
+        """Запись одной командой; Future -> lastrowid"""
+        return self._submit(_EXECUTE, sql, params)
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Sequence]) -> Future:
+        """Пакетная запись; Future -> rowcount"""
+        return self._submit(_EXECUTEMANY, sql, list(seq_of_params))
+
+    def run(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        """
+        Функция на соединении писателя (чтение-изменение-запись атомарно, в своем SAVEPOINT)
+        Future -> результат функции
+        """
+        return self._submit(_CALL, fn)
+
+    async def aexecute(self, sql: str, params: Sequence = ()) -> Any:
+        return await asyncio.wrap_future(self.execute(sql, params))
+
+    async def aexecutemany(self, sql: str, seq_of_params: Iterable[Sequence]) -> Any:
+        return await asyncio.wrap_future(self.executemany(sql, seq_of_params))
+
+    async def arun(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await asyncio.wrap_future(self.run(fn))
+
+    def flush(self, timeout: float = None) -> bool:
+        """Дождаться коммита всего, что поставлено в очередь до вызова"""
+        if self._closed:
+            return True
+        try:
+            self.run(lambda conn: None).result(timeout)
+            return True
+        except Exception:
+            return False
+
+    def _writer_loop(self, ready: Future):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            ready.set_exception(e)
+            return
+        ready.set_result(True)
+
+        while True:
+            op = self._queue.get()
+            if op is _STOP:
+                break
+
+            batch = [op]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    op = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if op is _STOP:
+                    stop = True
+                    break
+                batch.append(op)
+
+            self._commit_batch(conn, batch)
+            if stop:
+                break
+
+        conn.close()
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: List[tuple]):
+        started = time.perf_counter()
+        results = []
+
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.Error as e:
+            logger.error(f"❌ SQLite {self.path}: cannot begin transaction: {e}")
+            for *_, future in batch:
+                future.set_exception(e)
+            self.stats['write_errors'] += len(batch)
+            return
+
+        for kind, target, params, future in batch:
+            try:
+                # Каждая операция атомарна: при ошибке откатывается только она, а не вся пачка,
+                # и ее частичные строки (например, часть executemany) не попадают в COMMIT
+                conn.execute('SAVEPOINT op')
+                try:
+                    if kind == _EXECUTE:
+                        result = conn.execute(target, params).lastrowid
+                    elif kind == _EXECUTEMANY:
+                        result = conn.executemany(target, params).rowcount
+                    else:
+                        result = target(conn)
+                except BaseException:
+                    conn.execute('ROLLBACK TO op')
+                    raise
+                finally:
+                    conn.execute('RELEASE op')
+                results.append((future, result, None))
+            except Exception as e:
+                self.stats['write_errors'] += 1
+                logger.error(f"❌ SQLite {os.path.basename(self.path)} write failed: {e}")
+                results.append((future, None, e))
+
+        try:
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            logger.error(f"❌ SQLite {self.path}: commit of {len(batch)} writes failed: {e}")
+            try:
+                conn.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+            results = [(future, None, error or e) for future, _, error in results]
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        self.stats['writes'] += len(batch)
+        self.stats['transactions'] += 1
+        self.stats['write_time'] += time.perf_counter() - started
+        if len(batch) > self.stats['max_batch']:
+            self.stats['max_batch'] = len(batch)
+
+    # === Чтение ===
+
+    @contextmanager
+    def reader(self):
+        """Соединение из пула читателей (только чтение)"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_open = self._opened_readers < self.readers
+                if can_open:
+                    self._opened_readers += 1
+            if can_open:
+                try:
+                    conn = self._connect(readonly=True)
+                except Exception:
+                    with self._pool_lock:
+                        self._opened_readers -= 1
+                    raise
+            else:
+                conn = self._pool.get()
+        self.stats['reads'] += 1
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def query(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params: Sequence = ()) -> Optional[tuple]:
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    async def aquery(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        return await asyncio.to_thread(self.query, sql, params)
+
+    async def aquery_one(self, sql: str, params: Sequence = ()) -> Optional[tuple]:
+        return await asyncio.to_thread(self.query_one, sql, params)
+
+    # === Жизненный цикл ===
+
+    def close(self, timeout: float = 10.0):
+        """Дописать очередь и закрыть соединения"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            logger.warning(f"⚠️ SQLite {self.path}: writer did not finish, {self._queue.qsize()} writes pending")
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def get_stats(self) -> Dict[str, Any]:
+        transactions = max(self.stats['transactions'], 1)
+        return {
+            **self.stats,
+            'pending': self._queue.qsize(),
+            'avg_batch': round(self.stats['writes'] / transactions, 2),
+            'avg_transaction_ms': round(self.stats['write_time'] / transactions * 1000, 3),
+            'readers_open': self._opened_readers
+        }
+
+
+# Глобальный реестр: одна база - один писатель и один пул на процесс
+_stores: Dict[str, SQLiteStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_sqlite_store(path: str, **kwargs) -> SQLiteStore:
+    """Общий экземпляр для файла базы (параметры учитываются при первом открытии)"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None or store._closed:
+            store = _stores[key] = SQLiteStore(path, **kwargs)
+            logger.debug(f"✅ SQLite store opened: {path}")
+        return store
+
+
+@atexit.register
+def close_all_stores():
+    """Дописать очереди всех баз при выходе процесса"""
+    with _stores_lock:
+        stores = list(_stores.values())
+        _stores.clear()
+    for store in stores:
+        store.close()
@@ -10,6 +10,11 @@ from typing import Dict, List, Optional
 from dataclasses import dataclass
 import logging
 
+try:
+    from core.parquet_store import get_parquet_store
+except ImportError:
+    get_parquet_store = None
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -37,6 +42,29 @@ class StatisticsCalculator:
     
     def __init__(self, supabase_client):
         self.supabase = supabase_client
+        # Локальная Parquet копия signals_parsed (core/parquet_store.py), если выгружена
+        self.parquet = get_parquet_store() if get_parquet_store else None
+    
+    def _load_signals(self, trader_id: str, start_date: str) -> List[Dict]:
+        """
+        Сигналы трейдера с даты: выгруженная часть - из Parquet (только нужные колонки),
+        хвост после метки выгрузки - из Supabase; без выгрузки - как раньше, целиком из Supabase
+        """
+        if not self.parquet or not self.parquet.has_data('signals_parsed'):
+            return self.supabase.table('signals_parsed').select('*').eq('trader_id', trader_id).gte('posted_at', start_date).execute().data or []
+        
+        columns = ['signal_id', 'trader_id', 'posted_at', 'is_valid']
+        signals = [
+            s for s in self.parquet.read_rows('signals_parsed', columns=columns, start=start_date, partitions=[trader_id])
+            if (s.get('posted_at') or '') >= start_date
+        ]
+        
+        query = self.supabase.table('signals_parsed').select(', '.join(columns)).eq('trader_id', trader_id).gte('posted_at', start_date)
+        watermark = self.parquet.watermark('signals_parsed')
+        if watermark:
+            query = query.gt('signal_id', watermark[1])
+        signals.extend(query.execute().data or [])
+        return signals
         
     async def calculate_trader_stats(self, trader_id: str, period_days: int = 30) -> TraderStats:
         """Рассчитать статистику трейдера за период"""
@@ -45,9 +73,9 @@ class StatisticsCalculator:
             start_date = (datetime.now() - timedelta(days=period_days)).isoformat()
             
             # Получаем сигналы трейдера
-            signals = self.supabase.table('signals_parsed').select('*').eq('trader_id', trader_id).gte('posted_at', start_date).execute()
+            signals = self._load_signals(trader_id, start_date)
             
-            if not signals.data:
+            if not signals:
                 return TraderStats(
                     trader_id=trader_id,
                     period=f"{period_days}d",
@@ -68,7 +96,7 @@ class StatisticsCalculator:
                 )
             
             # Получаем события и валидации для этих сигналов
-            signal_ids = [s['signal_id'] for s in signals.data]
+            signal_ids = [s['signal_id'] for s in signals]
             
             events = []
             validations = []
@@ -83,8 +111,8 @@ class StatisticsCalculator:
                 validations = validations_result.data if validations_result.data else []
             
             # Анализируем данные
-            total_signals = len(signals.data)
-            valid_signals = len([s for s in signals.data if s.get('is_valid', False)])
+            total_signals = len(signals)
+            valid_signals = len([s for s in signals if s.get('is_valid', False)])
             
             tp1_hits = 0
             tp2_hits = 0
@@ -106,7 +134,7 @@ class StatisticsCalculator:
             validations_by_signal = {v['signal_id']: v for v in validations}
             
             # Анализируем каждый сигнал
-            for signal in signals.data:
+            for signal in signals:
                 signal_id = signal['signal_id']
                 signal_events = events_by_signal.get(signal_id, [])
                 validation = validations_by_signal.get(signal_id)
@@ -8,17 +8,22 @@ import asyncio
 import logging
 import json
 import os
+import time
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Set
+from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
 # Загружаем переменные из .env файла
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
-from telethon import TelegramClient, events
+from telethon import TelegramClient, events, utils
 from telethon.tl.types import Channel, Chat
 
+from core.intake_pipeline import IntakePipeline, Stage, DROP_OLDEST
+from core.media_pool import MediaDownloadPool
+from core.message_dedupe import MessageDedupe
+
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
@@ -70,6 +75,9 @@ class ChannelConfig:
     is_active: bool = True
     keywords_filter: List[str] = None
     exclude_keywords: List[str] = None
+    # Очередь канала на входе конвейера и политика переполнения (drop_oldest / drop_newest / block)
+    queue_size: int = 200
+    overflow_policy: str = DROP_OLDEST
     
     def __post_init__(self):
         if self.keywords_filter is None:
@@ -96,6 +104,8 @@ class TelegramListener:
             'messages_received': 0,
             'signals_detected': 0,
             'signals_parsed': 0,
+            'intake_completed': 0,
+            'intake_latency_total': 0.0,
             'by_channel': {}
         }
         
@@ -105,15 +115,30 @@ class TelegramListener:
             'лонг', 'шорт', 'покупка', 'продажа', 'вход', 'цель', 'стоп'
         ]
         
-        # Обработанные сообщения (анти-дубликаты)
-        self.processed_messages: Set[str] = set()
+        # Обработанные сообщения (анти-дубликаты): окно по времени + снапшот на диске
+        self.processed_messages = MessageDedupe(
+            window_seconds=float(os.getenv('GHOST_DEDUPE_WINDOW_HOURS', '48')) * 3600,
+            max_entries=int(os.getenv('GHOST_DEDUPE_MAX_ENTRIES', '200000')),
+            snapshot_path=os.getenv('GHOST_DEDUPE_SNAPSHOT', 'data/telegram_dedupe.bin')
+        )
+        self.processed_messages.load()
+        self._snapshot_task: Optional[asyncio.Task] = None
+        # После stop() новые сообщения не принимаются (и не отмечаются обработанными)
+        self._stopping = False
         
         # Парсер изображений
         self.image_parser = get_image_parser()
         
+        # Фоновые загрузки изображений (создается при наличии клиента)
+        self.media_pool: Optional[MediaDownloadPool] = None
+        
         # Внешний обработчик сообщений
         self.external_message_handler = None
         
+        # Конвейер: колбэк только ставит в очередь, стадии enrich -> parse -> persist в своих воркерах
+        self.pipeline: Optional[IntakePipeline] = None
+        self.use_pipeline = os.getenv('GHOST_INTAKE_PIPELINE', '1') != '0'
+        
         logger.info("Telegram Listener initialized")
     
 # Старый метод удален - используется новая система автоматической авторизации
@@ -201,7 +226,9 @@ class TelegramListener:
                         trader_id=channel_data['trader_id'],
                         is_active=channel_data.get('is_active', True),
                         keywords_filter=channel_data.get('keywords_filter', []),
-                        exclude_keywords=channel_data.get('exclude_keywords', [])
+                        exclude_keywords=channel_data.get('exclude_keywords', []),
+                        queue_size=channel_data.get('queue_size', 200),
+                        overflow_policy=channel_data.get('overflow_policy', DROP_OLDEST)
                     )
                     self.add_channel(config)
                 
@@ -225,10 +252,17 @@ class TelegramListener:
         
         logger.info(f"Starting to listen to {len(self.channels)} channels...")
         
+        if self.use_pipeline:
+            self.pipeline = self._build_pipeline()
+            self.pipeline.start()
+        
         # Подписываемся на новые сообщения
         @self.client.on(events.NewMessage())
         async def handle_new_message(event):
-            await self._handle_message(event)
+            if self.pipeline:
+                await self._intake(event)
+            else:
+                await self._handle_message(event)
         
         # Держим клиент активным
         try:
@@ -236,6 +270,38 @@ class TelegramListener:
         except Exception as e:
             logger.error(f"Error in Telegram listener: {e}")
             raise
+        finally:
+            await self._stop_pipeline()
+    
+    async def _stop_pipeline(self):
+        """Разбор очередей конвейера; не успевшее обработаться снимается с анти-дубликатов"""
+        if not self.pipeline:
+            return
+        pipeline, self.pipeline = self.pipeline, None
+        
+        if not await pipeline.drain(float(os.getenv('GHOST_INTAKE_DRAIN_TIMEOUT', '10'))):
+            logger.warning("⚠️ Intake pipeline not drained in time")
+        unfinished = await pipeline.stop()
+        
+        # Иначе снапшот запомнит их как обработанные, и после рестарта они потеряются
+        for _, envelope in unfinished:
+            self.processed_messages.discard(envelope['chat_id'], envelope['event'].message.id)
+        if unfinished:
+            logger.warning(f"⚠️ {len(unfinished)} intake messages unfinished, will be taken again after restart")
+    
+    def _build_pipeline(self) -> IntakePipeline:
+        """Стадии конвейера: входная очередь по каналам с их политиками, дальше backpressure"""
+        pipeline = IntakePipeline([
+            Stage('enrich', self._stage_enrich, workers=int(os.getenv('GHOST_INTAKE_ENRICH_WORKERS', '2')),
+                  maxsize=200, policy=DROP_OLDEST),
+            Stage('parse', self._stage_parse, workers=int(os.getenv('GHOST_INTAKE_PARSE_WORKERS', '4')),
+                  maxsize=50),
+            Stage('persist', self._stage_persist, workers=int(os.getenv('GHOST_INTAKE_PERSIST_WORKERS', '2')),
+                  maxsize=200),
+        ])
+        for chat_id, config in self.channels.items():
+            pipeline.configure_key(chat_id, config.queue_size, config.overflow_policy)
+        return pipeline
     
     def set_message_handler(self, handler_func):
         """Установка внешнего обработчика сообщений"""
@@ -243,139 +309,240 @@ class TelegramListener:
         logger.info("External message handler set")
     
     async def _handle_message(self, event):
-        """Обработка нового сообщения"""
+        """Обработка нового сообщения напрямую (без конвейера): все стадии по очереди"""
         try:
-            # Получаем информацию о чате
-            chat = await event.get_chat()
-            
-            # Определяем ID канала
-            if hasattr(chat, 'id'):
+            chat_id = self._event_chat_id(event)
+            if chat_id is None:
+                # Получаем информацию о чате
+                chat = await event.get_chat()
+                if not hasattr(chat, 'id'):
+                    return
                 chat_id = str(chat.id)
-            else:
-                return
-            
-            # Проверяем, мониторим ли мы этот канал
-            if chat_id not in self.channels:
-                return
-            
-            channel_config = self.channels[chat_id]
             
-            # Проверяем, активен ли канал
-            if not channel_config.is_active:
+            envelope = self._accept_message(chat_id, event)
+            if envelope is None:
                 return
             
-            # Получаем текст сообщения
-            message_text = event.message.text or ""
+            for stage in (self._stage_enrich, self._stage_parse, self._stage_persist):
+                envelope = await stage(envelope)
+                if envelope is None:
+                    return
             
-            # Проверяем наличие изображения
-            has_image = bool(event.message.photo or event.message.document)
-            
-            # Если нет ни текста, ни изображения - пропускаем
-            if not message_text and not has_image:
-                return
-            
-            # Генерируем уникальный ID сообщения для анти-дубликатов
-            message_id = f"{chat_id}_{event.message.id}"
-            if message_id in self.processed_messages:
-                return
-            
-            self.processed_messages.add(message_id)
-            
-            # Обновляем статистику
-            self.stats['messages_received'] += 1
-            self.stats['by_channel'][chat_id]['messages'] += 1
-            
-            logger.debug(f"New message from {channel_config.channel_name}: {message_text[:100]}...")
-            
-            # Проверяем фильтры
-            if not self._message_passes_filters(message_text, channel_config):
-                return
-            
-            # Для канала Whales Guide - обрабатываем ВСЕ сообщения с контентом
-            is_whales_guide = channel_config.trader_id == "whales_guide_main"
-            is_ghost_test = channel_config.trader_id == "ghostsignaltest"
-            
-            if is_whales_guide:
-                # Для Whales Guide - берем все сообщения с текстом или изображениями
-                is_signal = (message_text and len(message_text) > 10) or has_image
-            elif is_ghost_test:
-                # Для Ghost Signal Test - берем ВСЕ сообщения для тестирования
-                is_signal = (message_text and len(message_text) > 5) or has_image
-                if has_image:
-                    logger.info(f"📝🖼️ Ghost Test message with IMAGE detected: {message_text[:50]}...")
-                else:
-                    logger.info(f"📝 Ghost Test message detected: {message_text[:50]}...")
-            else:
-                # Для других каналов - стандартная логика
-                is_text_signal = message_text and self._looks_like_signal(message_text)
-                is_image_signal = has_image
-                is_signal = is_text_signal or is_image_signal
+        except Exception as e:
+            logger.error(f"Error handling message: {e}")
+    
+    async def _intake(self, event):
+        """Колбэк Telethon при работе через конвейер: только проверки в памяти и постановка в очередь"""
+        try:
+            chat_id = self._event_chat_id(event)
+            if chat_id is None:
+                chat = await event.get_chat()
+                if not hasattr(chat, 'id'):
+                    return
+                chat_id = str(chat.id)
             
-            if not is_signal:
-                logger.debug("Message doesn't look like a trading signal")
+            envelope = self._accept_message(chat_id, event)
+            if envelope is None:
                 return
             
-            # Обновляем статистику сигналов
-            self.stats['signals_detected'] += 1
-            self.stats['by_channel'][chat_id]['signals'] += 1
-            
-            logger.info(f"Signal detected from {channel_config.channel_name}")
-            
-            # Вызываем внешний обработчик если он установлен
-            if self.external_message_handler:
-                try:
-                    # Скачиваем изображение если есть и это Ghost Test канал
-                    image_data = None
-                    image_format = "PNG"
-                    
-                    if has_image and is_ghost_test:
-                        try:
-                            logger.info("📸 Downloading image for Ghost Test...")
-                            if event.message.photo:
-                                image_bytes = await self.client.download_media(event.message.photo, file=bytes)
-                                image_format = "JPG"
-                            elif event.message.document:
-                                image_bytes = await self.client.download_media(event.message.document, file=bytes)
-                                # Определяем формат по имени файла
-                                if hasattr(event.message.document, 'file_name') and event.message.document.file_name:
-                                    file_name = event.message.document.file_name.lower()
-                                    if file_name.endswith('.png'):
-                                        image_format = "PNG"
-                                    elif file_name.endswith(('.jpg', '.jpeg')):
-                                        image_format = "JPG"
-                            
-                            if image_bytes and len(image_bytes) > 0:
-                                image_data = image_bytes
-                                logger.info(f"✅ Image downloaded: {len(image_bytes)} bytes, format: {image_format}")
-                            else:
-                                logger.warning("⚠️ Failed to download image data")
-                                
-                        except Exception as e:
-                            logger.error(f"❌ Error downloading image for Ghost Test: {e}")
-                    
-                    message_data = {
-                        "chat_id": chat_id,
-                        "message_id": event.message.id,
-                        "text": message_text,
-                        "timestamp": event.message.date,
-                        "has_image": has_image,
-                        "image_data": image_data,  # Данные изображения для Ghost Test
-                        "image_format": image_format,  # Формат изображения
-                        "channel_name": channel_config.channel_name,
-                        "trader_id": channel_config.trader_id
-                    }
-                    
-                    await self.external_message_handler(message_data)
-                    logger.debug(f"External handler called for message from {channel_config.channel_name}")
-                    
-                except Exception as e:
-                    logger.error(f"Error in external message handler: {e}")
-            
-            # Отправляем на парсинг (текст и/или изображение)
-            await self._process_signal(message_text, channel_config, event, has_image)
+            if not await self.pipeline.submit(chat_id, envelope):
+                logger.warning(f"⚠️ Intake queue full for {envelope['config'].channel_name}, message dropped")
             
         except Exception as e:
-            logger.error(f"Error handling message: {e}")
+            logger.error(f"Error in message intake: {e}")
+    
+    @staticmethod
+    def _event_chat_id(event) -> Optional[str]:
+        """ID чата из события без сетевого запроса (как chat.id у get_chat)"""
+        try:
+            marked_id = event.chat_id
+            if marked_id is None:
+                return None
+            return str(utils.resolve_id(marked_id)[0])
+        except Exception:
+            return None
+    
+    def _accept_message(self, chat_id: str, event) -> Optional[Dict[str, Any]]:
+        """Канал мониторится, активен и сообщение еще не обрабатывалось -> конверт для стадий"""
+        if self._stopping:
+            return None
+        
+        # Проверяем, мониторим ли мы этот канал
+        if chat_id not in self.channels:
+            return None
+        
+        channel_config = self.channels[chat_id]
+        
+        # Проверяем, активен ли канал
+        if not channel_config.is_active:
+            return None
+        
+        # Если нет ни текста, ни медиа - пропускаем
+        if not event.message.text and not (event.message.photo or event.message.document):
+            return None
+        
+        # Анти-дубликаты по (chat_id, message_id)
+        if not self.processed_messages.check_and_add(chat_id, event.message.id):
+            return None
+        
+        if self.processed_messages.snapshot_due() and (self._snapshot_task is None or self._snapshot_task.done()):
+            self._snapshot_task = asyncio.create_task(self._save_dedupe_snapshot())
+        
+        return {
+            'chat_id': chat_id,
+            'config': channel_config,
+            'event': event,
+            'received_at': time.monotonic()
+        }
+    
+    def _get_media_pool(self) -> Optional[MediaDownloadPool]:
+        if self.media_pool is None and self.client is not None:
+            self.media_pool = MediaDownloadPool(self.client)
+        return self.media_pool
+    
+    def _fetch_media(self, event) -> Optional[asyncio.Task]:
+        media_pool = self._get_media_pool()
+        return media_pool.fetch(event.message) if media_pool else None
+    
+    @staticmethod
+    async def _await_media(media: Optional[asyncio.Task]):
+        """Результат фоновой загрузки (MediaFile или None)"""
+        if media is None:
+            return None
+        try:
+            return await asyncio.shield(media)
+        except Exception as e:
+            logger.error(f"❌ Error downloading image: {e}")
+            return None
+    
+    async def _stage_enrich(self, envelope: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Стадия 1: текст, фильтры, определение сигнала, запуск фоновой загрузки медиа"""
+        event = envelope['event']
+        chat_id = envelope['chat_id']
+        channel_config = envelope['config']
+        
+        # Получаем текст сообщения
+        message_text = event.message.text or ""
+        
+        # Проверяем наличие изображения
+        has_image = bool(event.message.photo or event.message.document)
+        
+        # Обновляем статистику
+        self.stats['messages_received'] += 1
+        self.stats['by_channel'][chat_id]['messages'] += 1
+        
+        logger.debug(f"New message from {channel_config.channel_name}: {message_text[:100]}...")
+        
+        # Проверяем фильтры
+        if not self._message_passes_filters(message_text, channel_config):
+            return None
+        
+        # Для канала Whales Guide - обрабатываем ВСЕ сообщения с контентом
+        is_whales_guide = channel_config.trader_id == "whales_guide_main"
+        is_ghost_test = channel_config.trader_id == "ghostsignaltest"
+        
+        if is_whales_guide:
+            # Для Whales Guide - берем все сообщения с текстом или изображениями
+            is_signal = (message_text and len(message_text) > 10) or has_image
+        elif is_ghost_test:
+            # Для Ghost Signal Test - берем ВСЕ сообщения для тестирования
+            is_signal = (message_text and len(message_text) > 5) or has_image
+            if has_image:
+                logger.info(f"📝🖼️ Ghost Test message with IMAGE detected: {message_text[:50]}...")
+            else:
+                logger.info(f"📝 Ghost Test message detected: {message_text[:50]}...")
+        else:
+            # Для других каналов - стандартная логика
+            is_text_signal = message_text and self._looks_like_signal(message_text)
+            is_image_signal = has_image
+            is_signal = is_text_signal or is_image_signal
+        
+        if not is_signal:
+            logger.debug("Message doesn't look like a trading signal")
+            return None
+        
+        # Обновляем статистику сигналов
+        self.stats['signals_detected'] += 1
+        self.stats['by_channel'][chat_id]['signals'] += 1
+        
+        logger.info(f"Signal detected from {channel_config.channel_name}")
+        
+        # Загрузка заранее (в фоне, сообщение ее не ждет) - только если изображение точно понадобится:
+        # Ghost Test передает его внешнему обработчику, а без текста разбирать больше нечего.
+        # Иначе изображение скачивается по требованию, если текст не дал сигнала
+        media_pool = self._get_media_pool()
+        prefetch = has_image and ((is_ghost_test and self.external_message_handler) or not message_text)
+        
+        envelope.update({
+            'text': message_text,
+            'has_image': has_image,
+            'is_ghost_test': is_ghost_test,
+            'media': media_pool.fetch(event.message) if media_pool and prefetch else None
+        })
+        return envelope
+    
+    async def _stage_parse(self, envelope: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Стадия 2: внешний обработчик и парсинг (текст и/или изображение)"""
+        event = envelope['event']
+        channel_config = envelope['config']
+        message_text = envelope['text']
+        has_image = envelope['has_image']
+        
+        # Вызываем внешний обработчик если он установлен
+        if self.external_message_handler:
+            try:
+                # Ghost Test получает изображение - ждем только загрузку своего сообщения
+                image_data = None
+                image_format = "PNG"
+                if has_image and envelope['is_ghost_test']:
+                    media = await self._await_media(envelope['media'] or self._fetch_media(event))
+                    if media:
+                        image_data = media.data
+                        image_format = media.image_format
+                        logger.info(f"✅ Image ready: {len(image_data)} bytes, format: {image_format}")
+                    else:
+                        logger.warning("⚠️ Failed to download image data")
+                
+                message_data = {
+                    "chat_id": envelope['chat_id'],
+                    "message_id": event.message.id,
+                    "text": message_text,
+                    "timestamp": event.message.date,
+                    "has_image": has_image,
+                    "image_data": image_data,  # Данные изображения для Ghost Test
+                    "image_format": image_format,  # Формат изображения
+                    "channel_name": channel_config.channel_name,
+                    "trader_id": channel_config.trader_id
+                }
+                
+                await self.external_message_handler(message_data)
+                logger.debug(f"External handler called for message from {channel_config.channel_name}")
+                
+            except Exception as e:
+                logger.error(f"Error in external message handler: {e}")
+        
+        # Отправляем на парсинг (текст и/или изображение)
+        envelope['result'] = await self._parse_signal(message_text, channel_config, event, has_image,
+                                                      envelope.get('media'))
+        return envelope
+    
+    async def _stage_persist(self, envelope: Dict[str, Any]) -> None:
+        """Стадия 3: сохранение сырого сигнала"""
+        result = envelope.get('result')
+        config = envelope['config']
+        
+        if result:
+            self.stats['signals_parsed'] += 1
+            logger.info(f"Signal successfully parsed: {result.get('symbol')} {result.get('side', result.get('direction'))}")
+        else:
+            logger.warning(f"Failed to parse signal from {config.channel_name}")
+        
+        # Сохраняем сырой сигнал для истории (в том числе неудачный)
+        await self._save_raw_signal(envelope['text'], config, envelope['event'], result, envelope['has_image'])
+        
+        self.stats['intake_latency_total'] += time.monotonic() - envelope['received_at']
+        self.stats['intake_completed'] += 1
+        return None
     
     def _message_passes_filters(self, text: str, config: ChannelConfig) -> bool:
         """Проверка сообщения через фильтры"""
@@ -439,8 +606,9 @@ class TelegramListener:
             
         return False
     
-    async def _process_signal(self, text: str, config: ChannelConfig, event, has_image: bool = False):
-        """Обработка сигнала через роутер (текст и/или изображение)"""
+    async def _parse_signal(self, text: str, config: ChannelConfig, event, has_image: bool = False,
+                            media: Optional[asyncio.Task] = None) -> Optional[Dict[str, Any]]:
+        """Парсинг сигнала через роутер (текст и/или изображение)"""
         try:
             # Дополнительная информация об источнике
             source_info = {
@@ -454,39 +622,34 @@ class TelegramListener:
             
             result = None
             
-            # Если есть изображение, анализируем его
-            if has_image:
+            # Сначала текст - текстовый сигнал не ждет загрузку медиа
+            if text:
+                result = await route_signal(text, config.trader_id, source_info)
+            
+            # Если текст не дал сигнала, анализируем изображение
+            if not result and has_image:
                 logger.info(f"🖼️ Processing image signal from {config.channel_name}")
-                image_result = await self._process_image_signal(event, text, config)
+                image_result = await self._process_image_signal(event, text, config, media)
                 if image_result:
                     result = image_result
                     logger.info(f"✅ Image signal parsed: {result.get('symbol')} {result.get('side')}")
             
-            # Если нет результата от изображения, пробуем текст
-            if not result and text:
-                result = await route_signal(text, config.trader_id, source_info)
-            
-            if result:
-                self.stats['signals_parsed'] += 1
-                logger.info(f"Signal successfully parsed: {result.get('symbol')} {result.get('side', result.get('direction'))}")
-                
-                # Сохраняем сырой сигнал для истории
-                await self._save_raw_signal(text, config, event, result, has_image)
-                
-            else:
-                logger.warning(f"Failed to parse signal from {config.channel_name}")
-                
-                # Сохраняем неудачный сигнал
-                await self._save_raw_signal(text, config, event, None, has_image)
+            return result
                 
         except Exception as e:
             logger.error(f"Error processing signal: {e}")
+            return None
     
-    async def _process_image_signal(self, event, caption: str, config: ChannelConfig) -> Optional[Dict[str, Any]]:
+    async def _process_image_signal(self, event, caption: str, config: ChannelConfig,
+                                    media: Optional[asyncio.Task] = None) -> Optional[Dict[str, Any]]:
         """Обработка сигнала из изображения"""
         try:
-            # Получаем изображение
-            image_data = await self._download_image_from_event(event)
+            # Получаем изображение (загрузка уже идет в пуле или запускается сейчас)
+            if media is not None:
+                media_file = await self._await_media(media)
+                image_data = media_file.data if media_file else None
+            else:
+                image_data = await self._download_image_from_event(event)
             if not image_data:
                 return None
             
@@ -521,23 +684,12 @@ class TelegramListener:
             return None
     
     async def _download_image_from_event(self, event) -> Optional[bytes]:
-        """Скачивание изображения из Telegram события"""
-        try:
-            if event.message.photo:
-                # Скачиваем фото
-                image_data = await event.message.download_media(file=bytes)
-                return image_data
-            elif event.message.document:
-                # Проверяем, что это изображение
-                if event.message.document.mime_type and event.message.document.mime_type.startswith('image/'):
-                    image_data = await event.message.download_media(file=bytes)
-                    return image_data
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"❌ Error downloading image: {e}")
+        """Скачивание изображения из Telegram события (через пул: лимиты, кеш, только изображения)"""
+        media_pool = self._get_media_pool()
+        if media_pool is None:
             return None
+        media_file = await self._await_media(media_pool.fetch(event.message))
+        return media_file.data if media_file else None
     
     async def _save_raw_signal(self, text: str, config: ChannelConfig, event, parsed_result: Optional[Dict], has_image: bool = False):
         """Сохранение сырого сигнала в БД"""
@@ -566,17 +718,34 @@ class TelegramListener:
         except Exception as e:
             logger.error(f"Error saving raw signal: {e}")
     
+    async def _save_dedupe_snapshot(self):
+        """Снапшот анти-дубликатов: сериализация в event loop, запись на диск в потоке"""
+        try:
+            data = self.processed_messages.snapshot_bytes()
+            await asyncio.to_thread(self.processed_messages.write_snapshot, data)
+        except Exception as e:
+            logger.error(f"Error saving dedupe snapshot: {e}")
+    
     def get_statistics(self) -> Dict[str, Any]:
         """Получение статистики работы слушателя"""
         return {
             **self.stats,
+            'dedupe': self.processed_messages.get_stats(),
+            'pipeline': self.pipeline.get_stats() if self.pipeline else None,
+            'media': self.media_pool.get_stats() if self.media_pool else None,
+            'avg_intake_latency_ms': self.stats['intake_latency_total'] / max(self.stats['intake_completed'], 1) * 1000,
             'channels_count': len(self.channels),
             'active_channels': len([c for c in self.channels.values() if c.is_active]),
             'parse_rate': (self.stats['signals_parsed'] / max(self.stats['signals_detected'], 1)) * 100
         }
     
     async def stop(self):
-        """Остановка слушателя"""
+        """Остановка слушателя: прием закрывается, конвейер дорабатывает очередь, затем финальный снапшот"""
+        self._stopping = True
+        await self._stop_pipeline()
+        if self._snapshot_task is not None:
+            await asyncio.gather(self._snapshot_task, return_exceptions=True)
+        await self._save_dedupe_snapshot()
         if self.client:
             await self.client.disconnect()
             logger.info("Telegram listener stopped")
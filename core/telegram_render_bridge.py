@@ -14,6 +14,8 @@ from dataclasses import dataclass, asdict
 import aiohttp
 import time
 
+from core.render_outbox import RenderOutbox, OutboxSender
+
 # Telegram imports
 try:
     from telethon import TelegramClient, events
@@ -71,6 +73,15 @@ class TelegramRenderBridge:
         self.supabase_url = os.getenv('SUPABASE_URL')
         self.supabase_key = os.getenv('SUPABASE_ANON_KEY')
         
+        # Outbox: сигнал сначала пишется локально, отправка на Render пачками в фоне
+        self.outbox = None
+        self.outbox_sender = None
+        if self.render_webhook_url:
+            batch_url = os.getenv('RENDER_WEBHOOK_BATCH_URL') or f"{self.render_webhook_url.rstrip('/')}/batch"
+            self.outbox = RenderOutbox()
+            # Без batch маршрута на приемнике (404) отправитель переходит на RENDER_WEBHOOK_URL по одной
+            self.outbox_sender = OutboxSender(self.outbox, batch_url, single_url=self.render_webhook_url)
+        
         # Статистика
         self.stats = {
             'messages_received': 0,
@@ -248,8 +259,8 @@ class TelegramRenderBridge:
         return signals
 
     async def _send_to_render(self, signal: ProcessedSignal):
-        """Отправка сигнала на Render webhook"""
-        if not self.render_webhook_url:
+        """Постановка сигнала в outbox для Render webhook (отправка в фоне пачками)"""
+        if not self.outbox:
             logger.debug("No Render webhook URL configured")
             return
         
@@ -260,19 +271,12 @@ class TelegramRenderBridge:
                 'data': asdict(signal)
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.render_webhook_url,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status == 200:
-                        logger.debug(f"✅ Signal sent to Render: {signal.symbol}")
-                    else:
-                        logger.error(f"❌ Render webhook error: {response.status}")
+            self.outbox.append(payload)
+            self.outbox_sender.notify()
+            logger.debug(f"✅ Signal queued for Render: {signal.symbol}")
                         
         except Exception as e:
-            logger.error(f"Error sending to Render: {e}")
+            logger.error(f"Error queueing signal for Render: {e}")
 
     async def _save_to_supabase(self, signal: ProcessedSignal):
         """Сохранение сигнала в Supabase"""
@@ -331,6 +335,10 @@ class TelegramRenderBridge:
         # Настройка обработчиков
         await self.setup_message_handlers()
         
+        # Отправитель outbox (досылает и то, что осталось с прошлого запуска)
+        if self.outbox_sender:
+            self.outbox_sender.start()
+        
         # Запуск
         logger.info("✅ Bridge is running! Listening for messages...")
         await self.client.run_until_disconnected()
@@ -342,13 +350,17 @@ class TelegramRenderBridge:
             **self.stats,
             'uptime_seconds': int(uptime.total_seconds()),
             'channels_count': len(self.channels),
-            'parsers_count': len(self.parsers)
+            'parsers_count': len(self.parsers),
+            'render_outbox': self.outbox_sender.get_stats() if self.outbox_sender else None
         }
 
     async def stop(self):
         """Остановка моста"""
         if self.client:
             await self.client.disconnect()
+        if self.outbox_sender:
+            await self.outbox_sender.stop()
+            self.outbox.close()
         logger.info("🛑 Bridge stopped")
 
 # Функция для запуска
@@ -11,6 +11,7 @@ import os
 import sys
 import json
 import re
+import time
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Any
 from dotenv import load_dotenv
@@ -33,6 +34,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger('TelegramSupabaseSync')
 
+# Значение аргумента "не передано" (None - допустимый результат поиска)
+_UNSET = object()
+
 class TelegramSupabaseSync:
     """Синхронизация Telegram сигналов с продвинутой Supabase базой"""
     
@@ -71,12 +75,16 @@ class TelegramSupabaseSync:
             'risk': r'(?:Risk|Риск)[\s:]*(\d+\.?\d*)%?'
         }
         
+        # Кеш ID источников (signal_sources почти не меняется)
+        self._source_ids: Dict[str, Optional[str]] = {}
+        
         # Статистика
         self.stats = {
             'messages_received': 0,
             'signals_parsed': 0,
             'signals_saved': 0,
-            'errors': 0
+            'errors': 0,
+            'processing_time_total': 0.0
         }
     
     async def initialize(self):
@@ -178,27 +186,47 @@ class TelegramSupabaseSync:
             self.stats['messages_received'] += 1
             
             logger.info(f"📨 Новое сообщение из {channel_info['source_name']}")
+            started = time.perf_counter()
+            
+            # Граф стадий: каждая ждет только свои входы
+            #   source_id -> raw save ─────────────┐
+            #   parse -> instrument ───────────────┴-> parsed save -> (market snapshot || alert)
+            source_task = asyncio.create_task(self._get_source_id(channel_info['source_code']))
+            
+            async def save_raw():
+                return await self._save_raw_signal(message, channel_info, source_id=await source_task)
             
-            # 1. Сохраняем сырое сообщение
-            raw_signal_id = await self._save_raw_signal(message, channel_info)
+            # 1. Сохраняем сырое сообщение (параллельно с парсингом)
+            raw_task = asyncio.create_task(save_raw())
             
             # 2. Парсим сигнал
             parsed_signal = await self._parse_signal(message.text or "", channel_info)
             
-            if parsed_signal:
+            if not parsed_signal:
+                await raw_task
+            else:
+                # Инструмент нужен только сохранению обработанного сигнала
+                raw_signal_id, instrument_id = await asyncio.gather(
+                    raw_task, self._get_or_create_instrument(parsed_signal['symbol'])
+                )
+                
                 # 3. Сохраняем обработанный сигнал
-                parsed_signal_id = await self._save_parsed_signal(parsed_signal, raw_signal_id, channel_info)
+                parsed_signal_id = await self._save_parsed_signal(
+                    parsed_signal, raw_signal_id, channel_info,
+                    source_id=await source_task, instrument_id=instrument_id
+                )
                 
-                # 4. Создаем снимок рынка (если это торговый сигнал)
+                # 4-5. Снимок рынка (если это торговый сигнал) и алерт независимы друг от друга
+                followups = [self._create_alert(parsed_signal, parsed_signal_id)]
                 if parsed_signal.get('symbol'):
-                    await self._save_market_snapshot(parsed_signal_id, parsed_signal['symbol'])
-                
-                # 5. Создаем алерт
-                await self._create_alert(parsed_signal, parsed_signal_id)
+                    followups.append(self._save_market_snapshot(parsed_signal_id, parsed_signal['symbol']))
+                await asyncio.gather(*followups)
                 
                 self.stats['signals_parsed'] += 1
                 logger.info(f"✅ Сигнал обработан: {parsed_signal.get('symbol', 'Unknown')} {parsed_signal.get('direction', 'Unknown')}")
             
+            self.stats['processing_time_total'] += time.perf_counter() - started
+            
             # Логируем статистику каждые 10 сообщений
             if self.stats['messages_received'] % 10 == 0:
                 await self._log_stats()
@@ -209,12 +237,30 @@ class TelegramSupabaseSync:
             import traceback
             logger.error(traceback.format_exc())
     
-    async def _save_raw_signal(self, message, channel_info) -> str:
+    async def _get_source_id(self, source_code: str) -> Optional[str]:
+        """ID источника из signal_sources (кешируется на процесс)"""
+        if source_code in self._source_ids:
+            return self._source_ids[source_code]
+        
+        try:
+            source_result = await asyncio.to_thread(
+                self.supabase_client.table('signal_sources').select('id').eq('source_code', source_code).execute
+            )
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения источника {source_code}: {e}")
+            return None
+        
+        source_id = source_result.data[0]['id'] if source_result.data else None
+        if source_id is not None:
+            self._source_ids[source_code] = source_id
+        return source_id
+    
+    async def _save_raw_signal(self, message, channel_info, source_id: Optional[str] = _UNSET) -> str:
         """Сохранение сырого сообщения в signals_raw"""
         try:
             # Получаем ID источника
-            source_result = self.supabase_client.table('signal_sources').select('id').eq('source_code', channel_info['source_code']).execute()
-            source_id = source_result.data[0]['id'] if source_result.data else None
+            if source_id is _UNSET:
+                source_id = await self._get_source_id(channel_info['source_code'])
             
             # Извлекаем хэштеги и упоминания
             text = message.text or ""
@@ -253,7 +299,8 @@ class TelegramSupabaseSync:
                 'processing_status': 'processed'
             }
             
-            result = self.supabase_client.table('signals_raw').insert(raw_data).execute()
+            # Синхронный клиент - в потоке, чтобы параллельные стадии не блокировались
+            result = await asyncio.to_thread(self.supabase_client.table('signals_raw').insert(raw_data).execute)
             
             if result.data:
                 return result.data[0]['id']
@@ -424,15 +471,17 @@ class TelegramSupabaseSync:
         
         return tags
     
-    async def _save_parsed_signal(self, parsed_signal: Dict, raw_signal_id: str, channel_info: Dict) -> Optional[str]:
-        """Сохранение обработанного сигнала"""
+    async def _save_parsed_signal(self, parsed_signal: Dict, raw_signal_id: str, channel_info: Dict,
+                                  source_id: Optional[str] = _UNSET, instrument_id: Optional[str] = _UNSET) -> Optional[str]:
+        """Сохранение обработанного сигнала (source_id / instrument_id можно передать уже готовыми)"""
         try:
             # Получаем ID источника
-            source_result = self.supabase_client.table('signal_sources').select('id').eq('source_code', channel_info['source_code']).execute()
-            source_id = source_result.data[0]['id'] if source_result.data else None
+            if source_id is _UNSET:
+                source_id = await self._get_source_id(channel_info['source_code'])
             
             # Получаем или создаем инструмент
-            instrument_id = await self._get_or_create_instrument(parsed_signal['symbol'])
+            if instrument_id is _UNSET:
+                instrument_id = await self._get_or_create_instrument(parsed_signal['symbol'])
             
             signal_data = {
                 'raw_signal_id': raw_signal_id,
@@ -457,7 +506,7 @@ class TelegramSupabaseSync:
                 'tags': parsed_signal.get('tags', [])
             }
             
-            result = self.supabase_client.table('signals_parsed').insert(signal_data).execute()
+            result = await asyncio.to_thread(self.supabase_client.table('signals_parsed').insert(signal_data).execute)
             
             if result.data:
                 self.stats['signals_saved'] += 1
@@ -504,7 +553,8 @@ class TelegramSupabaseSync:
         logger.info(f"📊 Статистика: Сообщений: {self.stats['messages_received']}, "
                    f"Сигналов: {self.stats['signals_parsed']}, "
                    f"Сохранено: {self.stats['signals_saved']}, "
-                   f"Ошибок: {self.stats['errors']}")
+                   f"Ошибок: {self.stats['errors']}, "
+                   f"Среднее время: {self.stats['processing_time_total'] / max(self.stats['messages_received'], 1) * 1000:.0f}мс")
 
 async def main():
     """Главная функция"""
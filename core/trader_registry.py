@@ -3,8 +3,11 @@ GHOST Trader Registry
 Управление реестром трейдеров
 """
 
+import asyncio
 import logging
-from typing import Dict, List, Optional
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -93,4 +96,114 @@ def get_trader_registry() -> TraderRegistry:
     global _trader_registry
     if _trader_registry is None:
         _trader_registry = TraderRegistry()
-    return _trader_registry
\ No newline at end of file
+    return _trader_registry
+
+
+class TraderRegistryCache:
+    """
+    Кеш ID трейдеров из таблицы trader_registry (Supabase) на процесс
+    Загружается при старте, обновляется в фоне по TTL, новые трейдеры пишутся сквозь кеш
+    Проверка трейдера на горячем пути - поиск в множестве без запросов к БД
+    """
+    
+    def __init__(self, ttl: float = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv('GHOST_TRADER_CACHE_TTL', '600') or 600)
+        self.trader_ids: Set[str] = set()
+        self.loaded_at: float = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+        self._inserting: Dict[str, asyncio.Future] = {}
+        
+        self.stats = {
+            'hits': 0,
+            'inserts': 0,
+            'refreshes': 0,
+            'errors': 0
+        }
+    
+    def __contains__(self, trader_id: str) -> bool:
+        return trader_id in self.trader_ids
+    
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.loaded_at >= self.ttl
+    
+    def load(self, supabase) -> int:
+        """Полная загрузка ID трейдеров (один запрос)"""
+        try:
+            result = supabase.table('trader_registry').select('trader_id').execute()
+            self.trader_ids = {row['trader_id'] for row in result.data or []}
+            self.loaded_at = time.monotonic()
+            self.stats['refreshes'] += 1
+            logger.info(f"✅ Trader registry cache loaded: {len(self.trader_ids)} traders")
+        except Exception as e:
+            self.stats['errors'] += 1
+            # Не дергаем БД на каждом сообщении при недоступности - повтор через TTL
+            self.loaded_at = time.monotonic()
+            logger.error(f"❌ Trader registry cache load failed: {e}")
+        return len(self.trader_ids)
+    
+    def _schedule_refresh(self, supabase):
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(asyncio.to_thread(self.load, supabase))
+    
+    async def ensure(self, supabase, trader_id: str, trader_info: Callable[[], Dict[str, Any]]) -> bool:
+        """
+        Трейдер есть в реестре (при необходимости создается)
+        
+        Returns:
+            True если трейдер известен или создан
+        """
+        if self.loaded_at == 0.0:
+            await asyncio.to_thread(self.load, supabase)
+        elif self.is_stale:
+            self._schedule_refresh(supabase)
+        
+        if trader_id in self.trader_ids:
+            self.stats['hits'] += 1
+            return True
+        
+        # Одновременные сообщения нового трейдера ждут одну вставку
+        pending = self._inserting.get(trader_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inserting[trader_id] = future
+        try:
+            created = await asyncio.to_thread(self._insert, supabase, trader_info())
+            future.set_result(created)
+            return created
+        except Exception as e:
+            future.set_result(False)
+            self.stats['errors'] += 1
+            logger.error(f"❌ Ошибка создания трейдера {trader_id}: {e}")
+            return False
+        finally:
+            self._inserting.pop(trader_id, None)
+    
+    def _insert(self, supabase, info: Dict[str, Any]) -> bool:
+        # upsert без перезаписи: запись, созданная другим процессом, не считается ошибкой
+        supabase.table('trader_registry').upsert(
+            info, on_conflict='trader_id', ignore_duplicates=True
+        ).execute()
+        self.trader_ids.add(info['trader_id'])
+        self.stats['inserts'] += 1
+        logger.info(f"✅ Создан новый трейдер: {info['trader_id']}")
+        return True
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'traders': len(self.trader_ids),
+            'age_seconds': round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else None
+        }
+
+# Глобальный кеш реестра в Supabase
+_trader_registry_cache: Optional[TraderRegistryCache] = None
+
+def get_trader_registry_cache() -> TraderRegistryCache:
+    """Получение глобального кеша реестра трейдеров"""
+    global _trader_registry_cache
+    if _trader_registry_cache is None:
+        _trader_registry_cache = TraderRegistryCache()
+    return _trader_registry_cache
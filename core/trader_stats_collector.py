@@ -16,8 +16,22 @@ from dataclasses import dataclass, asdict
 import json
 import statistics
 
+try:
+    from core.parquet_store import get_parquet_store
+except ImportError:
+    get_parquet_store = None
+
 logger = logging.getLogger(__name__)
 
+# final_result из signal_outcomes -> outcome SignalOutcome (NOFILL - входа не было, не учитываем)
+_FINAL_RESULTS = {
+    'TP1_ONLY': 'TP1',
+    'TP2_FULL': 'TP2',
+    'SL': 'SL',
+    'BE': 'BE',
+    'TIMEOUT': 'TIMEOUT'
+}
+
 @dataclass
 class TraderPerformance:
     """Производительность трейдера"""
@@ -108,6 +122,69 @@ class TraderStatsCollector:
         self.outcomes.append(outcome)
         logger.debug(f"Added outcome for {outcome.trader_id}: {outcome.outcome} ({outcome.roi_percent:.1f}%)")
     
+    def load_outcomes_from_parquet(self, store=None, period_days: int = 90,
+                                   traders: Optional[List[str]] = None) -> int:
+        """
+        Загрузка результатов из локальной Parquet копии (signal_outcomes + signals_parsed)
+        Читаются только нужные колонки и партиции периода/трейдеров; возвращает число добавленных
+        """
+        store = store or (get_parquet_store() if get_parquet_store else None)
+        if not store or not store.has_data('signal_outcomes'):
+            logger.warning("⚠️ No Parquet export of signal_outcomes, nothing loaded")
+            return 0
+        
+        start_date = datetime.now() - timedelta(days=period_days)
+        
+        # Исход считается после публикации сигнала - отсечение по дате расчета не теряет сигналы периода
+        outcomes = store.read_rows(
+            'signal_outcomes',
+            columns=['signal_id', 'trader_id', 'entry_exec_price_sim', 'tp1_hit_at', 'tp2_hit_at',
+                     'tp3_hit_at', 'sl_hit_at', 'final_result', 'pnl_sim', 'roi_sim'],
+            start=start_date, partitions=traders
+        )
+        signals = {
+            s['signal_id']: s for s in store.read_rows(
+                'signals_parsed',
+                columns=['signal_id', 'symbol', 'side', 'entry', 'posted_at', 'tp1', 'tp2', 'tp3', 'tp4', 'confidence'],
+                start=start_date, partitions=traders
+            )
+        }
+        
+        added = 0
+        for row in outcomes:
+            outcome = _FINAL_RESULTS.get(row.get('final_result'))
+            signal = signals.get(row['signal_id'])
+            entry_time = _parse_time(signal.get('posted_at')) if signal else None
+            if not outcome or not entry_time or entry_time < start_date:
+                continue
+            
+            hit_times = [_parse_time(row.get(f'tp{n}_hit_at')) for n in (1, 2, 3)]
+            exit_time = _parse_time(row.get('sl_hit_at')) if outcome == 'SL' else max(filter(None, hit_times), default=None)
+            side = signal.get('side')
+            
+            self.add_signal_outcome(SignalOutcome(
+                signal_id=str(row['signal_id']),
+                trader_id=row['trader_id'],
+                symbol=signal.get('symbol'),
+                side={'BUY': 'LONG', 'SELL': 'SHORT'}.get(side, side),
+                entry_price=float(row.get('entry_exec_price_sim') or signal.get('entry') or 0),
+                exit_price=None,
+                outcome=outcome,
+                roi_percent=float(row.get('roi_sim') or 0),
+                pnl_usd=float(row['pnl_sim']) if row.get('pnl_sim') is not None else None,
+                entry_time=entry_time,
+                exit_time=exit_time,
+                duration_hours=(exit_time - entry_time).total_seconds() / 3600 if exit_time else None,
+                targets_hit=sum(1 for t in hit_times if t),
+                total_targets=sum(1 for n in (1, 2, 3, 4) if signal.get(f'tp{n}') is not None),
+                confidence=float(signal.get('confidence') or 0),
+                slippage=None
+            ))
+            added += 1
+        
+        logger.info(f"📦 Loaded {added} signal outcomes from Parquet ({len(outcomes)} rows read)")
+        return added
+    
     def calculate_trader_performance(self, trader_id: str, 
                                    period_days: int = 30) -> TraderPerformance:
         """Расчет производительности трейдера за период"""
@@ -337,6 +414,18 @@ class TraderStatsCollector:
             logger.error(f"Error exporting performance data: {e}")
 
 
+def _parse_time(value: Any) -> Optional[datetime]:
+    """ISO время из выгрузки -> naive datetime (как datetime.now() в расчетах)"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
 # Функция для создания тестовых данных
 def create_test_data() -> List[SignalOutcome]:
     """Создание тестовых данных для демонстрации"""
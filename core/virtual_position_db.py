@@ -1,24 +1,292 @@
 """
 Virtual Position Database Integration
 Реализация методов работы с базой данных для виртуальных позиций
+Входы, выходы, события и свечи буферизуются и сбрасываются пачками (multi-row insert на таблицу),
+изменения статуса позиций схлопываются и пишутся в том же сбросе после событий
+Строки, отвергнутые БД, и пачки, не записанные за max_attempts попыток, уходят в dead-letter файл (JSONL)
 """
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+import os
+import time
+from typing import Optional, Dict, Any, List
 from datetime import datetime, timezone
 import json
 
 logger = logging.getLogger(__name__)
 
+# Порядок записи таблиц в сбросе; статусы virtual_positions - последними
+_BUFFERED_TABLES = ('position_entries', 'position_exits', 'position_events', 'position_candles')
+
+# Классы ошибок Postgres, зависящие от содержимого строки: 22 - данные, 23 - ограничения
+_ROW_ERROR_CLASSES = ('22', '23')
+
+
+def _is_row_error(error: Exception) -> bool:
+    """Ошибка PostgREST из-за содержимого строк, а не сеть / 5xx"""
+    code = getattr(error, 'code', None)
+    return isinstance(code, str) and code[:2] in _ROW_ERROR_CLASSES
+
 class VirtualPositionDB:
     """Класс для работы с базой данных виртуальных позиций"""
     
-    def __init__(self, supabase_client=None):
+    def __init__(self, supabase_client=None, batch_size: int = None, flush_interval: float = None,
+                 max_pending: int = None, max_attempts: int = None, dead_letter_path: str = None):
         self.supabase = supabase_client
+        
+        # Пороги сброса: по количеству строк и по времени
+        self.batch_size = batch_size or int(os.getenv('GHOST_POSITION_EVENTS_BATCH', '200'))
+        self.flush_interval = flush_interval or float(os.getenv('GHOST_POSITION_EVENTS_FLUSH_SECONDS', '2.0'))
+        # Предел буфера при недоступной БД - дальше отбрасываются самые старые строки
+        self.max_pending = max_pending or int(os.getenv('GHOST_POSITION_EVENTS_MAX_PENDING', '20000'))
+        # Попыток на первую пачку таблицы / статус позиции, дальше - в dead-letter файл
+        self.max_attempts = max_attempts or int(os.getenv('GHOST_POSITION_EVENTS_MAX_ATTEMPTS', '10'))
+        self.dead_letter_path = dead_letter_path or os.getenv(
+            'GHOST_POSITION_DEAD_LETTER', 'data/position_dead_letter.jsonl'
+        )
+        
+        # table -> строки в порядке поступления; position_id -> последние значения полей статуса
+        self._pending: Dict[str, List[Dict[str, Any]]] = {table: [] for table in _BUFFERED_TABLES}
+        self._pending_status: Dict[str, Dict[str, Any]] = {}
+        self._pending_count = 0
+        
+        # Неудачные попытки: table -> первая пачка таблицы, position_id -> статус
+        self._attempts: Dict[str, int] = {}
+        self._status_attempts: Dict[str, int] = {}
+        # Backoff сбросов после сбоя записи
+        self._failures = 0
+        self._retry_at = 0.0
+        
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        self.stats = {
+            'queued': 0,
+            'written': 0,
+            'inserts': 0,
+            'status_updates': 0,
+            'status_coalesced': 0,
+            'failed_batches': 0,
+            'split_batches': 0,
+            'status_held': 0,
+            'dead_lettered': 0,
+            'dropped': 0,
+            'flushes': 0
+        }
     
     def set_supabase(self, supabase_client):
         """Установить Supabase клиент"""
         self.supabase = supabase_client
     
+    # === Буфер записи ===
+    
+    def _enqueue(self, table: str, row: Dict[str, Any]):
+        """Строка в буфер таблицы; запуск фонового сброса, пробуждение при наборе пачки"""
+        rows = self._pending[table]
+        rows.append(row)
+        self._pending_count += 1
+        self.stats['queued'] += 1
+        
+        if self._pending_count > self.max_pending:
+            # Самая длинная очередь теряет самую старую строку
+            longest = max(self._pending.values(), key=len)
+            longest.pop(0)
+            self._pending_count -= 1
+            self.stats['dropped'] += 1
+            if self.stats['dropped'] % 1000 == 1:
+                logger.warning(f"⚠️ Position event buffer full ({self.max_pending}), dropping oldest rows")
+        
+        self._ensure_flusher()
+        if self._pending_count >= self.batch_size:
+            self._wakeup.set()
+    
+    def _ensure_flusher(self):
+        if self._task is None or self._task.done():
+            self._flush_lock = self._flush_lock or asyncio.Lock()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name='position-events-flusher')
+    
+    async def _run(self):
+        while True:
+            # Во время backoff строки копятся в буфере и не дергают недоступную БД
+            pause = self._retry_at - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Position event flusher error: {e}")
+    
+    async def flush(self) -> bool:
+        """Записать всё накопленное; True если буфер полностью сброшен"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        # Один сброс за раз - порядок строк внутри таблицы сохраняется
+        async with self._flush_lock:
+            if not self._pending_count and not self._pending_status:
+                return True
+            if not self.supabase:
+                return False
+            
+            pending, self._pending = self._pending, {table: [] for table in _BUFFERED_TABLES}
+            statuses, self._pending_status = self._pending_status, {}
+            self._pending_count = 0
+            self.stats['flushes'] += 1
+            
+            deferred, dead = await asyncio.to_thread(self._write_rows, pending)
+            
+            # Статус ждет только позиции, у которых остались незаписанные строки
+            held_positions = {row.get('position_id') for rows in deferred.values() for row in rows}
+            ready = {pid: data for pid, data in statuses.items() if pid not in held_positions}
+            held = {pid: data for pid, data in statuses.items() if pid in held_positions}
+            self.stats['status_held'] += len(held)
+            failed_statuses, dead_statuses = await asyncio.to_thread(self._write_statuses, ready)
+            failed_statuses.update(held)
+            
+            dead.extend(dead_statuses)
+            if dead:
+                await asyncio.to_thread(self._dead_letter, dead)
+            self._requeue(deferred, failed_statuses)
+            
+            if deferred or len(failed_statuses) > len(held):
+                self._failures += 1
+                self._retry_at = time.monotonic() + min(60.0, self.flush_interval * 2 ** (self._failures - 1))
+            else:
+                self._failures = 0
+                self._retry_at = 0.0
+            return not deferred and not failed_statuses
+    
+    def _insert(self, table: str, rows: List[Dict[str, Any]]):
+        """
+        Вставка пачки; при ошибке данных пачка делится пополам, чтобы хорошие строки прошли
+        
+        Возвращает (отвергнутые строки, незаписанный хвост при сбое сети / 5xx, последняя ошибка)
+        """
+        try:
+            self.supabase.table(table).insert(rows).execute()
+            self.stats['inserts'] += 1
+            self.stats['written'] += len(rows)
+            return [], [], None
+        except Exception as e:
+            if not _is_row_error(e):
+                return [], rows, e
+            if len(rows) == 1:
+                return rows, [], e
+        
+        self.stats['split_batches'] += 1
+        middle = len(rows) // 2
+        rejected, rest, error = self._insert(table, rows[:middle])
+        if rest:
+            return rejected, rest + rows[middle:], error
+        right_rejected, rest, right_error = self._insert(table, rows[middle:])
+        return rejected + right_rejected, rest, right_error or error
+    
+    def _write_rows(self, pending: Dict[str, List[Dict[str, Any]]]):
+        """Multi-row insert на таблицу пачками batch_size; (отложенные строки по таблицам, [(table, row, error)] в dead-letter)"""
+        deferred: Dict[str, List[Dict[str, Any]]] = {}
+        dead: List[tuple] = []
+        for table in _BUFFERED_TABLES:
+            rows = pending[table]
+            for start in range(0, len(rows), self.batch_size):
+                chunk = rows[start:start + self.batch_size]
+                rejected, rest, error = self._insert(table, chunk)
+                if rejected:
+                    logger.error(f"❌ {len(rejected)} rows rejected by {table}: {error}")
+                    dead.extend((table, row, error) for row in rejected)
+                if not rest:
+                    self._attempts.pop(table, None)
+                    continue
+                
+                self.stats['failed_batches'] += 1
+                attempts = self._attempts[table] = self._attempts.get(table, 0) + 1
+                if attempts >= self.max_attempts:
+                    logger.error(f"❌ {len(rest)} rows to {table} failed {attempts} times, moved to dead-letter: {error}")
+                    dead.extend((table, row, error) for row in rest)
+                    self._attempts.pop(table, None)
+                    rest = []
+                else:
+                    logger.error(f"❌ Failed to write {len(rest)} rows to {table} (attempt {attempts}): {error}")
+                # Хвост таблицы тоже откладываем, чтобы не нарушить порядок
+                tail = rest + rows[start + len(chunk):]
+                if tail:
+                    deferred[table] = tail
+                break
+            if rows and table not in deferred:
+                logger.debug(f"✅ {len(rows)} rows written to {table}")
+        return deferred, dead
+    
+    def _write_statuses(self, statuses: Dict[str, Dict[str, Any]]):
+        """Одно обновление на позицию (последнее состояние); (отложенные по позициям, [(table, row, error)] в dead-letter)"""
+        failed: Dict[str, Dict[str, Any]] = {}
+        dead: List[tuple] = []
+        for position_id, update_data in statuses.items():
+            try:
+                self.supabase.table('virtual_positions').update(update_data).eq('id', position_id).execute()
+                self.stats['status_updates'] += 1
+                self._status_attempts.pop(position_id, None)
+            except Exception as e:
+                self.stats['failed_batches'] += 1
+                attempts = self._status_attempts[position_id] = self._status_attempts.get(position_id, 0) + 1
+                if _is_row_error(e) or attempts >= self.max_attempts:
+                    self._status_attempts.pop(position_id, None)
+                    dead.append(('virtual_positions', {'id': position_id, **update_data}, e))
+                    logger.error(f"❌ Position status {position_id} moved to dead-letter after {attempts} attempts: {e}")
+                else:
+                    failed[position_id] = update_data
+                    logger.error(f"❌ Error updating position status {position_id}: {e}")
+        return failed, dead
+    
+    def _dead_letter(self, dead: List[tuple]):
+        """Незаписываемые строки - в JSONL файл для разбора и ручной дозагрузки"""
+        failed_at = datetime.now(timezone.utc).isoformat()
+        try:
+            directory = os.path.dirname(self.dead_letter_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                for table, row, error in dead:
+                    f.write(json.dumps({
+                        'table': table, 'row': row, 'error': str(error)[:500], 'failed_at': failed_at
+                    }, ensure_ascii=False, default=str) + '\n')
+            self.stats['dead_lettered'] += len(dead)
+        except OSError as e:
+            logger.error(f"❌ Position dead-letter write failed, {len(dead)} rows lost: {e}")
+    
+    def _requeue(self, failed_rows: Dict[str, List[Dict[str, Any]]], failed_statuses: Dict[str, Dict[str, Any]]):
+        """Вернуть несохраненное в начало буфера - перед тем, что пришло во время сброса"""
+        for table, rows in failed_rows.items():
+            self._pending[table] = rows + self._pending[table]
+            self._pending_count += len(rows)
+        for position_id, update_data in failed_statuses.items():
+            self._pending_status[position_id] = {**update_data, **self._pending_status.get(position_id, {})}
+    
+    async def close(self):
+        """Остановить фоновый сброс и записать остаток"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if not await self.flush():
+            logger.warning(f"⚠️ Position event buffer not empty on close: {self._pending_count} rows, "
+                           f"{len(self._pending_status)} status updates")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'pending_rows': self._pending_count,
+            'pending_status': len(self._pending_status),
+            'consecutive_failures': self._failures,
+            'pending_by_table': {table: len(rows) for table, rows in self._pending.items() if rows}
+        }
+    
     async def save_position(
         self, 
         position_id: str, 
@@ -120,15 +388,10 @@ class VirtualPositionDB:
                 'created_at': datetime.now(timezone.utc).isoformat()
             }
             
-            # Сохраняем в таблицу position_entries
-            result = self.supabase.table('position_entries').insert(entry_data).execute()
-            
-            if result.data:
-                logger.info(f"✅ Position entry saved to DB: {entry_percent:.1f}% at ${entry_price}")
-                return True
-            else:
-                logger.error(f"❌ Failed to save position entry to DB")
-                return False
+            # В буфер таблицы position_entries
+            self._enqueue('position_entries', entry_data)
+            logger.info(f"✅ Position entry queued: {entry_percent:.1f}% at ${entry_price}")
+            return True
                 
         except Exception as e:
             logger.error(f"❌ Error saving position entry to DB: {e}")
@@ -164,15 +427,10 @@ class VirtualPositionDB:
                 'created_at': datetime.now(timezone.utc).isoformat()
             }
             
-            # Сохраняем в таблицу position_exits
-            result = self.supabase.table('position_exits').insert(exit_data).execute()
-            
-            if result.data:
-                logger.info(f"✅ Position exit saved to DB: {exit_percent:.1f}% at ${exit_price} (PnL: {pnl_percent:.2f}%)")
-                return True
-            else:
-                logger.error(f"❌ Failed to save position exit to DB")
-                return False
+            # В буфер таблицы position_exits
+            self._enqueue('position_exits', exit_data)
+            logger.info(f"✅ Position exit queued: {exit_percent:.1f}% at ${exit_price} (PnL: {pnl_percent:.2f}%)")
+            return True
                 
         except Exception as e:
             logger.error(f"❌ Error saving position exit to DB: {e}")
@@ -204,15 +462,10 @@ class VirtualPositionDB:
                 'created_at': datetime.now(timezone.utc).isoformat()
             }
             
-            # Сохраняем в таблицу position_events
-            result = self.supabase.table('position_events').insert(event_db_data).execute()
-            
-            if result.data:
-                logger.debug(f"✅ Position event logged: {event_type} - {description}")
-                return True
-            else:
-                logger.error(f"❌ Failed to log position event to DB")
-                return False
+            # В буфер таблицы position_events
+            self._enqueue('position_events', event_db_data)
+            logger.debug(f"✅ Position event queued: {event_type} - {description}")
+            return True
                 
         except Exception as e:
             logger.error(f"❌ Error logging position event to DB: {e}")
@@ -264,15 +517,15 @@ class VirtualPositionDB:
             # Автоматически обновляем updated_at
             update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
             
-            # Выполняем обновление
-            result = self.supabase.table('virtual_positions').update(update_data).eq('id', position_id).execute()
-            
-            if result.data:
-                logger.debug(f"✅ Position status updated: {position_id}")
-                return True
+            # Схлопываем с еще не записанным обновлением этой позиции - в БД уйдет последнее состояние
+            if position_id in self._pending_status:
+                self.stats['status_coalesced'] += 1
+                self._pending_status[position_id].update(update_data)
             else:
-                logger.error(f"❌ Failed to update position status")
-                return False
+                self._pending_status[position_id] = update_data
+            self._ensure_flusher()
+            logger.debug(f"✅ Position status update queued: {position_id}")
+            return True
                 
         except Exception as e:
             logger.error(f"❌ Error updating position status: {e}")
@@ -308,15 +561,10 @@ class VirtualPositionDB:
                 'created_at': datetime.now(timezone.utc).isoformat()
             }
             
-            # Сохраняем в таблицу position_candles
-            result = self.supabase.table('position_candles').insert(candle_db_data).execute()
-            
-            if result.data:
-                logger.debug(f"✅ Candle data saved for {symbol} {timeframe}")
-                return True
-            else:
-                logger.error(f"❌ Failed to save candle data")
-                return False
+            # В буфер таблицы position_candles
+            self._enqueue('position_candles', candle_db_data)
+            logger.debug(f"✅ Candle data queued for {symbol} {timeframe}")
+            return True
                 
         except Exception as e:
             logger.error(f"❌ Error saving candle data: {e}")
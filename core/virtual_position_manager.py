@@ -517,10 +517,6 @@ class VirtualPositionManager:
                 position.status = PositionStatus.CLOSED
                 position.close_time = datetime.now(timezone.utc)
                 
-                # Удаляем из активных позиций
-                if position_id in self.active_positions:
-                    del self.active_positions[position_id]
-                
                 await self._log_position_event(
                     position_id,
                     EventType.POSITION_CLOSED,
@@ -528,6 +524,10 @@ class VirtualPositionManager:
                     price_at_event=exit_price,
                     pnl_at_event=position.current_pnl_usd
                 )
+                
+                # Удаляем из активных позиций (после события - статус CLOSED попадает в сброс)
+                if position_id in self.active_positions:
+                    del self.active_positions[position_id]
             
             logger.info(f"📈 Partial close: {position.symbol} {close_percent:.1f}% at ${exit_price:.6f} (PnL: {pnl_percent:.2f}%)")
             
@@ -552,6 +552,9 @@ class VirtualPositionManager:
                 pass
             self.monitoring_task = None
             logger.info("⏹️ Virtual position monitoring stopped")
+        
+        # Дописать буфер событий и статусов
+        await virtual_position_db.close()
     
     async def _monitoring_loop(self) -> None:
         """Основной цикл мониторинга"""
@@ -637,7 +640,7 @@ class VirtualPositionManager:
         """Логировать событие позиции"""
         logger.info(f"📝 Position Event: {position_id} | {event_type.value} | {description}")
         
-        return await virtual_position_db.log_event(
+        logged = await virtual_position_db.log_event(
             position_id=position_id,
             event_type=event_type.value,
             description=description,
@@ -645,6 +648,24 @@ class VirtualPositionManager:
             pnl_at_event=pnl_at_event,
             event_data=event_data
         )
+        
+        # Состояние позиции на момент события - в том же сбросе буфера, после строк событий
+        position = self.active_positions.get(position_id)
+        if logged and position:
+            await virtual_position_db.update_position_status(position_id, {
+                'avg_entry_price': position.avg_entry_price,
+                'current_price': position.current_price,
+                'current_pnl_usd': position.current_pnl_usd,
+                'current_pnl_percent': position.current_pnl_percent,
+                'status': position.status.value,
+                'filled_percent': position.filled_percent,
+                'remaining_percent': position.remaining_percent,
+                'first_entry_time': position.first_entry_time,
+                'last_update_time': position.last_update_time,
+                'close_time': position.close_time
+            })
+        
+        return logged
 
 # Глобальный экземпляр менеджера
 virtual_position_manager = VirtualPositionManager()
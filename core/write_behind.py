@@ -0,0 +1,210 @@
+"""
+GHOST Write-Behind Writer
+Отложенная запись строк в Supabase: enqueue в локальный outbox сразу, фоновый сброс пачками
+Строки группируются по таблицам в multi-row upsert с ключами идемпотентности - повтор после сбоя не дублирует
+Пачка с ошибкой данных делится пополам, чтобы хорошие строки прошли; исчерпавшие попытки - в outbox_dead
+"""
+
+import asyncio
+import logging
+import os
+import random
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from core.durable_outbox import DurableOutbox
+
+logger = logging.getLogger(__name__)
+
+# Классы ошибок Postgres, зависящие от содержимого строки: 22 - данные, 23 - ограничения
+ROW_ERROR_CLASSES = ('22', '23')
+
+Row = Tuple[int, Dict[str, Any], int]
+
+
+class WriteBehindWriter:
+    """Outbox строк для Supabase и фоновый flusher"""
+
+    def __init__(self, supabase, conflict_keys: Dict[str, str] = None, path: str = None,
+                 batch_size: int = None, linger: float = None,
+                 base_delay: float = 1.0, max_delay: float = 300.0,
+                 optional_keys: Iterable[str] = (), max_attempts: int = None):
+        self.supabase = supabase
+        # table -> колонка уникальности для upsert(on_conflict=..., ignore_duplicates=True)
+        self.conflict_keys = dict(conflict_keys or {})
+        # Таблицы, где колонки уникальности может не быть (миграция не применена): тогда она
+        # вырезается из строк и пишется обычный insert
+        self.optional_keys = set(optional_keys)
+        self._dropped_columns: Dict[str, str] = {}
+        self.max_attempts = max_attempts or int(os.getenv('GHOST_WRITE_BEHIND_MAX_ATTEMPTS', '10'))
+        self.outbox = DurableOutbox(path or os.getenv('GHOST_WRITE_BEHIND_DB', 'data/supabase_outbox.db'))
+        self.batch_size = batch_size or int(os.getenv('GHOST_WRITE_BEHIND_BATCH', '200'))
+        # Короткое ожидание после первой записи - чтобы в пачку попали соседние
+        self.linger = linger if linger is not None else float(os.getenv('GHOST_WRITE_BEHIND_LINGER', '0.2'))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._failures: Dict[str, int] = {}
+
+        self.stats = {
+            'queued': 0,
+            'written': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'split_batches': 0,
+            'dead_lettered': 0,
+            'by_table': {},
+            'last_error': None
+        }
+
+    def enqueue(self, table: str, row: Dict[str, Any]) -> int:
+        """Мгновенная постановка строки в outbox (флашер запускается при первом вызове)"""
+        row_id = self.outbox.append({'table': table, 'row': row})
+        self.stats['queued'] += 1
+        self._wakeup.set()
+        if self._task is None:
+            self.start()
+        return row_id
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name='supabase-write-behind')
+            pending = len(self.outbox)
+            if pending:
+                logger.info(f"♻️ Write-behind: {pending} rows pending from previous run")
+
+    async def stop(self, flush_timeout: float = 10.0):
+        """Остановка; несброшенное остается в outbox до следующего запуска"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await asyncio.wait_for(self.flush(), flush_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Write-behind flush incomplete, {len(self.outbox)} rows left in outbox")
+
+    async def flush(self):
+        """Сбросить всё готовое сейчас"""
+        while await self._flush_once():
+            pass
+
+    def _write(self, table: str, rows: List[Dict[str, Any]]):
+        dropped = self._dropped_columns.get(table)
+        if dropped:
+            rows = [{k: v for k, v in row.items() if k != dropped} for row in rows]
+
+        query = self.supabase.table(table)
+        conflict = self.conflict_keys.get(table)
+        if conflict:
+            query = query.upsert(rows, on_conflict=conflict, ignore_duplicates=True)
+        else:
+            query = query.insert(rows)
+
+        try:
+            query.execute()
+        except Exception as e:
+            if not conflict or table not in self.optional_keys or conflict not in str(e):
+                raise
+            logger.warning(f"⚠️ Write-behind {table}: column {conflict} missing, writing without it "
+                           f"(apply the migration that adds it)")
+            self.conflict_keys.pop(table, None)
+            self._dropped_columns[table] = conflict
+            self._write(table, rows)
+
+    @staticmethod
+    def _is_row_error(error: Exception) -> bool:
+        """Ошибка PostgREST из-за содержимого строк (битая строка), а не сеть / 5xx"""
+        code = getattr(error, 'code', None)
+        return isinstance(code, str) and code[:2] in ROW_ERROR_CLASSES
+
+    async def _write_rows(self, table: str, batch: List[Row]) -> Tuple[List[Row], List[Tuple[List[Row], Exception]]]:
+        """(записанные, [(незаписанные, ошибка)]); при ошибке данных пачка делится пополам"""
+        try:
+            await asyncio.to_thread(self._write, table, [item['row'] for _, item, _ in batch])
+            return batch, []
+        except Exception as e:
+            if len(batch) == 1 or not self._is_row_error(e):
+                return [], [(batch, e)]
+
+        self.stats['split_batches'] += 1
+        middle = len(batch) // 2
+        left_ok, left_failed = await self._write_rows(table, batch[:middle])
+        right_ok, right_failed = await self._write_rows(table, batch[middle:])
+        return left_ok + right_ok, left_failed + right_failed
+
+    def _fail(self, table: str, failed: List[Tuple[List[Row], Exception]]):
+        """Исчерпавшие попытки - в outbox_dead, остальные откладываются с backoff таблицы"""
+        failures = self._failures[table] = self._failures.get(table, 0) + 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (failures - 1)) * random.uniform(0.8, 1.2)
+
+        for rows, error in failed:
+            dead = [row_id for row_id, _, attempts in rows if attempts + 1 >= self.max_attempts]
+            retry = [row_id for row_id, _, attempts in rows if attempts + 1 < self.max_attempts]
+            if dead:
+                self.outbox.dead_letter(dead, f"{table}: {str(error)[:500]}")
+                self.stats['dead_lettered'] += len(dead)
+                logger.error(f"❌ Write-behind {table}: {len(dead)} rows moved to outbox_dead "
+                             f"after {self.max_attempts} attempts ({error})")
+            if retry:
+                self.outbox.retry(retry, delay)
+                logger.warning(f"⚠️ Write-behind {table}: {len(retry)} rows failed ({error}), retry in {delay:.1f}s")
+            self.stats['failed_batches'] += 1
+            self.stats['last_error'] = f"{table}: {str(error)[:200]}"
+
+    async def _flush_once(self) -> bool:
+        """Одна пачка из outbox, одна вставка на таблицу; True если что-то записано"""
+        batch = self.outbox.fetch_batch(self.batch_size)
+        if not batch:
+            return False
+
+        by_table: Dict[str, List[Row]] = {}
+        for row in batch:
+            by_table.setdefault(row[1]['table'], []).append(row)
+
+        written = False
+        for table, rows in by_table.items():
+            ok, failed = await self._write_rows(table, rows)
+            if ok:
+                self.outbox.ack([row_id for row_id, _, _ in ok])
+                written = True
+                self.stats['written'] += len(ok)
+                self.stats['batches'] += 1
+                self.stats['by_table'][table] = self.stats['by_table'].get(table, 0) + len(ok)
+                logger.debug(f"✅ Write-behind {table}: {len(ok)} rows")
+            if failed:
+                self._fail(table, failed)
+            else:
+                self._failures.pop(table, None)
+        return written
+
+    async def _run(self):
+        while True:
+            try:
+                while await self._flush_once():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Write-behind flusher error: {e}")
+                await asyncio.sleep(self.base_delay)
+
+            # Новая запись или срок отложенных после ошибки
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.outbox.next_due_in())
+            except asyncio.TimeoutError:
+                pass
+            if self.linger:
+                await asyncio.sleep(self.linger)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'by_table': dict(self.stats['by_table']),
+            'pending': len(self.outbox),
+            'dead': self.outbox.dead_count(),
+            'failing_tables': dict(self._failures),
+            'dropped_columns': dict(self._dropped_columns)
+        }
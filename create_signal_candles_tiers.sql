@@ -0,0 +1,224 @@
+-- Ярусы свечей по сигналам: 1s -> 1m -> 5m -> 1h
+-- Старые 1-секундные свечи сворачиваются в минутные, минутные в 5-минутные, 5-минутные в часовые.
+-- Исходные строки удаляются в той же транзакции, поэтому каждый момент времени хранится ровно в одном ярусе,
+-- а объем таблиц ограничен сроками хранения, а не длиной истории.
+-- Выполнять после create_signal_candles_tables.sql
+
+-- 1. Таблицы ярусов (схема как у signal_candles_1s, timestamp - начало интервала)
+CREATE TABLE IF NOT EXISTS signal_candles_1m (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    signal_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,        -- unix timestamp начала минуты
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    volume REAL NOT NULL,
+    quote_volume REAL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    UNIQUE(signal_id, timestamp)
+);
+
+CREATE TABLE IF NOT EXISTS signal_candles_5m (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    signal_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,        -- unix timestamp начала 5-минутки
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    volume REAL NOT NULL,
+    quote_volume REAL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    UNIQUE(signal_id, timestamp)
+);
+
+CREATE TABLE IF NOT EXISTS signal_candles_1h (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    signal_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,        -- unix timestamp начала часа
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    volume REAL NOT NULL,
+    quote_volume REAL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    UNIQUE(signal_id, timestamp)
+);
+
+-- UNIQUE(signal_id, timestamp) уже дает индекс для чтения диапазона по сигналу;
+-- отдельный индекс по timestamp нужен компакции (поиск самых старых строк)
+CREATE INDEX IF NOT EXISTS idx_signal_candles_1m_timestamp ON signal_candles_1m(timestamp);
+CREATE INDEX IF NOT EXISTS idx_signal_candles_5m_timestamp ON signal_candles_5m(timestamp);
+CREATE INDEX IF NOT EXISTS idx_signal_candles_1h_timestamp ON signal_candles_1h(timestamp);
+
+-- 2. Свертка одного яруса в следующий
+-- Берет строки p_source старше p_cutoff (округленного вниз до p_bucket - только полные интервалы),
+-- не больше p_chunk_seconds истории за вызов, агрегирует OHLCV и удаляет исходные строки
+CREATE OR REPLACE FUNCTION rollup_signal_candles(
+    p_source TEXT,
+    p_target TEXT,
+    p_bucket INTEGER,
+    p_cutoff INTEGER,
+    p_chunk_seconds INTEGER DEFAULT 21600
+)
+RETURNS JSON AS $$
+DECLARE
+    v_cutoff INTEGER := p_cutoff - (p_cutoff % p_bucket);
+    v_start INTEGER;
+    v_end INTEGER;
+    v_deleted INTEGER := 0;
+    v_written INTEGER := 0;
+BEGIN
+    EXECUTE format('SELECT MIN(timestamp) FROM %I WHERE timestamp < $1', p_source)
+    INTO v_start
+    USING v_cutoff;
+
+    IF v_start IS NULL THEN
+        RETURN json_build_object('source', p_source, 'deleted', 0, 'written', 0, 'remaining', false);
+    END IF;
+
+    v_start := v_start - (v_start % p_bucket);
+    v_end := LEAST(v_cutoff, v_start + GREATEST(p_chunk_seconds / p_bucket, 1) * p_bucket);
+
+    -- open - первая свеча интервала, close - последняя, high/low - экстремумы, объемы - суммы.
+    -- Если интервал в целевом ярусе уже есть (поздние строки после прошлой свертки) - сливаем
+    EXECUTE format($sql$
+        WITH moved AS (
+            DELETE FROM %1$I
+            WHERE timestamp >= $1 AND timestamp < $2
+            RETURNING signal_id, symbol, timestamp, open, high, low, close, volume, quote_volume
+        ),
+        written AS (
+            INSERT INTO %2$I (signal_id, symbol, timestamp, open, high, low, close, volume, quote_volume)
+            SELECT
+                m.signal_id,
+                MIN(m.symbol),
+                (m.timestamp / %3$s) * %3$s AS bucket_ts,
+                (array_agg(m.open ORDER BY m.timestamp))[1],
+                MAX(m.high),
+                MIN(m.low),
+                (array_agg(m.close ORDER BY m.timestamp DESC))[1],
+                SUM(m.volume),
+                SUM(m.quote_volume)
+            FROM moved m
+            GROUP BY m.signal_id, bucket_ts
+            ON CONFLICT (signal_id, timestamp) DO UPDATE SET
+                high = GREATEST(%2$I.high, EXCLUDED.high),
+                low = LEAST(%2$I.low, EXCLUDED.low),
+                close = EXCLUDED.close,
+                volume = %2$I.volume + EXCLUDED.volume,
+                quote_volume = COALESCE(%2$I.quote_volume, 0) + COALESCE(EXCLUDED.quote_volume, 0)
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM moved)::INTEGER, (SELECT COUNT(*) FROM written)::INTEGER
+    $sql$, p_source, p_target, p_bucket)
+    INTO v_deleted, v_written
+    USING v_start, v_end;
+
+    RETURN json_build_object(
+        'source', p_source,
+        'deleted', v_deleted,
+        'written', v_written,
+        'window_start', v_start,
+        'window_end', v_end,
+        'remaining', v_end < v_cutoff
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- 3. Проход компакции по всем ярусам (один вызов - одна транзакция, ограниченная p_chunk_seconds)
+-- Сроки хранения в секундах: 1s - p_keep_1s, 1m - p_keep_1m, 5m - p_keep_5m, 1h - без ограничения
+-- (сигнал отслеживается ограниченное время, поэтому часовых строк на сигнал конечное число)
+CREATE OR REPLACE FUNCTION compact_signal_candles(
+    p_keep_1s INTEGER DEFAULT 86400,
+    p_keep_1m INTEGER DEFAULT 604800,
+    p_keep_5m INTEGER DEFAULT 2592000,
+    p_chunk_seconds INTEGER DEFAULT 21600
+)
+RETURNS JSON AS $$
+DECLARE
+    v_now INTEGER := EXTRACT(EPOCH FROM NOW())::INTEGER;
+    r_1s JSON;
+    r_1m JSON;
+    r_5m JSON;
+BEGIN
+    r_1s := rollup_signal_candles('signal_candles_1s', 'signal_candles_1m', 60, v_now - p_keep_1s, p_chunk_seconds);
+    r_1m := rollup_signal_candles('signal_candles_1m', 'signal_candles_5m', 300, v_now - p_keep_1m, p_chunk_seconds);
+    r_5m := rollup_signal_candles('signal_candles_5m', 'signal_candles_1h', 3600, v_now - p_keep_5m, p_chunk_seconds);
+
+    RETURN json_build_object(
+        '1s', r_1s,
+        '1m', r_1m,
+        '5m', r_5m,
+        'remaining', (r_1s->>'remaining')::BOOLEAN OR (r_1m->>'remaining')::BOOLEAN OR (r_5m->>'remaining')::BOOLEAN
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- 4. Чтение диапазона с автоматическим выбором яруса
+-- Разрешение - наименьшее из 1s/1m/5m/1h, при котором в диапазон помещается не больше p_max_points свечей.
+-- Читаются все ярусы (каждый момент лежит ровно в одном), более мелкие строки агрегируются до разрешения;
+-- resolution в ответе - фактическая ширина свечи (старые участки могут быть грубее запрошенного)
+CREATE OR REPLACE FUNCTION get_signal_candles(
+    p_signal_id TEXT,
+    p_from INTEGER,
+    p_to INTEGER,
+    p_max_points INTEGER DEFAULT 1500
+)
+RETURNS TABLE (
+    "timestamp" INTEGER,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    volume REAL,
+    quote_volume REAL,
+    resolution INTEGER
+) AS $$
+    WITH res AS (
+        SELECT COALESCE(MIN(r), 3600) AS sec
+        FROM unnest(ARRAY[1, 60, 300, 3600]) AS r
+        WHERE (p_to - p_from) / r <= GREATEST(p_max_points, 1)
+    ),
+    tiers AS (
+        SELECT c.timestamp AS ts, c.open AS o, c.high AS h, c.low AS l, c.close AS cl, c.volume AS v, c.quote_volume AS qv, 1 AS native
+        FROM signal_candles_1s c
+        WHERE c.signal_id = p_signal_id AND c.timestamp >= p_from AND c.timestamp <= p_to
+        UNION ALL
+        SELECT c.timestamp, c.open, c.high, c.low, c.close, c.volume, c.quote_volume, 60
+        FROM signal_candles_1m c
+        WHERE c.signal_id = p_signal_id AND c.timestamp >= p_from - 59 AND c.timestamp <= p_to
+        UNION ALL
+        SELECT c.timestamp, c.open, c.high, c.low, c.close, c.volume, c.quote_volume, 300
+        FROM signal_candles_5m c
+        WHERE c.signal_id = p_signal_id AND c.timestamp >= p_from - 299 AND c.timestamp <= p_to
+        UNION ALL
+        SELECT c.timestamp, c.open, c.high, c.low, c.close, c.volume, c.quote_volume, 3600
+        FROM signal_candles_1h c
+        WHERE c.signal_id = p_signal_id AND c.timestamp >= p_from - 3599 AND c.timestamp <= p_to
+    )
+    SELECT
+        (t.ts / res.sec) * res.sec,
+        (array_agg(t.o ORDER BY t.ts))[1],
+        MAX(t.h),
+        MIN(t.l),
+        (array_agg(t.cl ORDER BY t.ts DESC))[1],
+        SUM(t.v)::REAL,
+        SUM(t.qv)::REAL,
+        GREATEST(res.sec, MAX(t.native))
+    FROM tiers t CROSS JOIN res
+    GROUP BY 1, res.sec
+    ORDER BY 1;
+$$ LANGUAGE sql STABLE;
+
+-- 5. Прежняя очистка удаляла 1s свечи без следа - теперь их сворачивает compact_signal_candles
+COMMENT ON FUNCTION cleanup_old_candles(INTEGER) IS 'Устарело: используйте compact_signal_candles (свертка в ярусы вместо удаления)';
+
+COMMENT ON TABLE signal_candles_1m IS 'Минутные свечи, свернутые из signal_candles_1s';
+COMMENT ON TABLE signal_candles_5m IS '5-минутные свечи, свернутые из signal_candles_1m';
+COMMENT ON TABLE signal_candles_1h IS 'Часовые свечи, свернутые из signal_candles_5m';
@@ -0,0 +1,7 @@
+-- Анти-дубликат сырых сигналов без предварительного SELECT
+-- content_hash = sha1(trader_id, окно 2ч, нормализованный текст) - вычисляется в SignalOrchestratorWithSupabase
+-- Вставка идет через upsert(on_conflict=content_hash, ignore_duplicates) - дубликат просто не вставляется
+
+ALTER TABLE signals_raw ADD COLUMN IF NOT EXISTS content_hash VARCHAR(40);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_signals_raw_content_hash ON signals_raw(content_hash);
@@ -6,7 +6,6 @@ GHOST Critical News Engine v2.0 - Боевая версия
 
 import asyncio
 import aiohttp
-import sqlite3
 import logging
 import hashlib
 import time
@@ -18,8 +17,13 @@ from dataclasses import dataclass
 from enum import Enum
 import yaml
 import os
+import sys
 from pathlib import Path
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.sqlite_store import get_sqlite_store
+
 # GHOST-META
 __version__ = "2.0.0"
 __author__ = "GHOST Team"
@@ -251,6 +255,7 @@ class CriticalNewsEngineV2:
             }
         }
         
+        self.db = get_sqlite_store(self.db_path)
         self._init_rate_limiters()
         self._init_database()
     
@@ -264,13 +269,8 @@ class CriticalNewsEngineV2:
             self.circuit_breakers[source_name] = CircuitBreaker()
     
     def _init_database(self):
-        """Инициализация базы данных с WAL и индексами"""
-        with sqlite3.connect(self.db_path) as conn:
-            # Включение WAL режима
-            conn.execute("PRAGMA journal_mode=WAL")
-            conn.execute("PRAGMA synchronous=NORMAL")
-            conn.execute("PRAGMA busy_timeout=5000")
-            
+        """Инициализация базы данных с индексами (WAL и PRAGMA настраивает SQLiteStore)"""
+        def create_tables(conn):
             # Создание таблиц с улучшенной схемой
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS critical_news (
@@ -328,6 +328,8 @@ class CriticalNewsEngineV2:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+        
+        self.db.run(create_tables).result()
     
     def _generate_topic_hash(self, title: str, url: str, symbol: str, published_at: datetime) -> str:
         """Генерация уникального хеша для дедупликации"""
@@ -341,30 +343,28 @@ class CriticalNewsEngineV2:
         hash_input = f"{title_normalized}|{url_root}|{symbol_normalized}|{date_bucket}"
         return hashlib.sha1(hash_input.encode()).hexdigest()
     
-    def _validate_price_change(self, symbol: str, current_price: float, 
-                             price_change_period: int = 60) -> Optional[float]:
+    async def _validate_price_change(self, symbol: str, current_price: float, 
+                                     price_change_period: int = 60) -> Optional[float]:
         """Валидация изменения цены с явным окном"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                # Получение цены за период
-                cutoff_time = datetime.now(timezone.utc) - timedelta(seconds=price_change_period)
-                
-                cursor = conn.execute("""
-                    SELECT price_change, detected_at 
-                    FROM critical_news 
-                    WHERE symbol = ? AND detected_at > ? 
-                    ORDER BY detected_at DESC 
-                    LIMIT 1
-                """, (symbol, cutoff_time.isoformat()))
-                
-                result = cursor.fetchone()
-                if result:
-                    last_price_change, last_detected = result
-                    # Проверка окна ±2%
-                    if abs(current_price - last_price_change) / last_price_change > 0.02:
-                        return (current_price - last_price_change) / last_price_change
-                
-                return None
+            # Получение цены за период (чтение в потоке - цикл событий не ждет диск)
+            cutoff_time = datetime.now(timezone.utc) - timedelta(seconds=price_change_period)
+            
+            result = await self.db.aquery_one("""
+                SELECT price_change, detected_at 
+                FROM critical_news 
+                WHERE symbol = ? AND detected_at > ? 
+                ORDER BY detected_at DESC 
+                LIMIT 1
+            """, (symbol, cutoff_time.isoformat()))
+            
+            if result:
+                last_price_change, last_detected = result
+                # Проверка окна ±2%
+                if abs(current_price - last_price_change) / last_price_change > 0.02:
+                    return (current_price - last_price_change) / last_price_change
+            
+            return None
         except Exception as e:
             logger.error(f"Error validating price change: {e}")
             return None
@@ -580,8 +580,8 @@ class CriticalNewsEngineV2:
         
         return regulatory_alerts
     
-    def _save_news_item(self, news_item: Dict) -> bool:
-        """Сохранение новости с дедупликацией"""
+    async def _save_news_item(self, news_item: Dict) -> bool:
+        """Сохранение новости с дедупликацией; алерт - только после коммита новости"""
         try:
             # Генерация topic_hash
             topic_hash = self._generate_topic_hash(
@@ -591,62 +591,60 @@ class CriticalNewsEngineV2:
                 news_item['published_at']
             )
             
-            with sqlite3.connect(self.db_path) as conn:
-                # UPSERT с дедупликацией
-                conn.execute("""
-                    INSERT OR REPLACE INTO critical_news (
-                        topic_hash, source_name, title, content, url, symbol,
-                        published_at, sentiment, urgency, is_critical, priority,
-                        market_impact, price_change, price_change_period, regulatory_news
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    topic_hash,
-                    news_item['source_name'],
-                    news_item['title'],
-                    news_item.get('content', ''),
-                    news_item.get('url', ''),
-                    news_item.get('symbol'),
-                    news_item['published_at'].isoformat(),
-                    news_item.get('sentiment', 0.0),
-                    news_item.get('urgency', 1.0),
-                    news_item.get('is_critical', True),
-                    news_item.get('priority', 1),
-                    news_item.get('market_impact', 0.0),
-                    news_item.get('price_change', 0.0),
-                    news_item.get('price_change_period', 60),
-                    news_item.get('regulatory_news', False)
-                ))
-                
-                # Проверка, нужно ли отправлять алерт
-                if self.alert_aggregator.should_send_alert(topic_hash, news_item):
-                    self._create_alert(topic_hash, news_item)
-                
-                return True
-                
+            # UPSERT с дедупликацией; ждем коммита писателя без блокировки цикла событий
+            await asyncio.wrap_future(self.db.execute("""
+                INSERT OR REPLACE INTO critical_news (
+                    topic_hash, source_name, title, content, url, symbol,
+                    published_at, sentiment, urgency, is_critical, priority,
+                    market_impact, price_change, price_change_period, regulatory_news
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                topic_hash,
+                news_item['source_name'],
+                news_item['title'],
+                news_item.get('content', ''),
+                news_item.get('url', ''),
+                news_item.get('symbol'),
+                news_item['published_at'].isoformat(),
+                news_item.get('sentiment', 0.0),
+                news_item.get('urgency', 1.0),
+                news_item.get('is_critical', True),
+                news_item.get('priority', 1),
+                news_item.get('market_impact', 0.0),
+                news_item.get('price_change', 0.0),
+                news_item.get('price_change_period', 60),
+                news_item.get('regulatory_news', False)
+            )))
+            
+            # Проверка, нужно ли отправлять алерт
+            if self.alert_aggregator.should_send_alert(topic_hash, news_item):
+                await self._create_alert(topic_hash, news_item)
+            
+            return True
+            
         except Exception as e:
             logger.error(f"Error saving news item: {e}")
             return False
     
-    def _create_alert(self, topic_hash: str, news_item: Dict):
-        """Создание алерта"""
+    async def _create_alert(self, topic_hash: str, news_item: Dict):
+        """Создание алерта (новость уже записана)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                alert_message = f"{news_item['title']}\n{news_item.get('content', '')}"
-                
-                conn.execute("""
-                    INSERT OR REPLACE INTO critical_alerts (
-                        topic_hash, alert_type, message, severity, symbols, regulatory_news
-                    ) VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    topic_hash,
-                    'critical_news',
-                    alert_message,
-                    news_item.get('priority', 1),
-                    news_item.get('symbol'),
-                    news_item.get('regulatory_news', False)
-                ))
-                
-                logger.info(f"🚨 Critical alert created: {news_item['title'][:50]}...")
+            alert_message = f"{news_item['title']}\n{news_item.get('content', '')}"
+            
+            await asyncio.wrap_future(self.db.execute("""
+                INSERT OR REPLACE INTO critical_alerts (
+                    topic_hash, alert_type, message, severity, symbols, regulatory_news
+                ) VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                topic_hash,
+                'critical_news',
+                alert_message,
+                news_item.get('priority', 1),
+                news_item.get('symbol'),
+                news_item.get('regulatory_news', False)
+            )))
+            
+            logger.info(f"🚨 Critical alert created: {news_item['title'][:50]}...")
                 
         except Exception as e:
             logger.error(f"Error creating alert: {e}")
@@ -670,15 +668,17 @@ class CriticalNewsEngineV2:
                 results = await asyncio.gather(*tasks, return_exceptions=True)
                 
                 # Обработка результатов
-                total_saved = 0
+                news_items = []
                 for result in results:
                     if isinstance(result, list):
-                        for news_item in result:
-                            if self._save_news_item(news_item):
-                                total_saved += 1
+                        news_items.extend(result)
                     elif isinstance(result, Exception):
                         logger.error(f"Error in fetch task: {result}")
                 
+                # Одновременно: писатель коммитит их одной транзакцией
+                saved = await asyncio.gather(*(self._save_news_item(item) for item in news_items))
+                total_saved = sum(saved)
+                
                 if total_saved > 0:
                     logger.warning(f"🚨 КРИТИЧЕСКИЕ НОВОСТИ: {total_saved} сохранено!")
                 
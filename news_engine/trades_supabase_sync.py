@@ -12,17 +12,28 @@ Environment:
 - NEXT_PUBLIC_SUPABASE_URL
 - SUPABASE_SERVICE_ROLE_KEY (or SUPABASE_SECRET_KEY)
 - GHOST_DB_PATH (default: ./ghost.db)
+- SYNC_STATE_PATH (default: ./trades_sync_state.db) - watermark and content hashes of synced rows
+- SYNC_BATCH_SIZE / SYNC_BATCH_MIN / SYNC_BATCH_MAX (default: 100 / 10 / 500) - adaptive upsert batch
 
 Notes:
 - This script does NOT recalculate PnL/ROI. It mirrors current values.
 - Safe to run on server (read-only to SQLite). Upserts by `trade_id`.
+- Incremental: each pass reads only rows after the (updated_at, rowid) watermark.
+  Without an updated_at column the watermark is rowid only, so still-open trades
+  (closed_at IS NULL) are re-read every pass, and every trade_id seen open is remembered
+  and re-read by id until its closed version has been synced - closes are not missed.
+- Rows whose content hash matches the last synced version are skipped, so a steady-state
+  pass sends nothing. Watermark and hashes are checkpointed after every successful batch.
+- Self-contained on purpose: the file is copied alone to the server (scripts/safe_server_install.py).
 """
 
 import os
+import json
+import hashlib
 import sqlite3
 import time
 import logging
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from datetime import datetime
 from supabase import create_client, Client
 
@@ -39,91 +50,246 @@ def get_supabase_client() -> Client | None:
     return create_client(url, key)
 
 
-def read_trades(db_path: str, limit: int = 500, full: bool = False) -> List[Dict]:
+class SyncState:
+    """
+    Watermark (updated_at, rowid) + content hash of every synced trade
+    Kept in a separate local SQLite file - the source DB stays read-only
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS row_hashes (trade_id TEXT PRIMARY KEY, hash TEXT NOT NULL)")
+        # Trades last seen open (no-updated_at mode): re-read by id until synced closed
+        self.conn.execute("CREATE TABLE IF NOT EXISTS open_trades (trade_id TEXT PRIMARY KEY)")
+        self.conn.commit()
+
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = 'watermark'").fetchone()
+        self.cursor: Optional[str] = None
+        self.rowid: int = 0
+        if row:
+            self.cursor, self.rowid = json.loads(row[0])
+            logger.info(f"Resuming after watermark cursor={self.cursor} rowid={self.rowid}")
+        self.hashes: Dict[str, str] = dict(self.conn.execute("SELECT trade_id, hash FROM row_hashes").fetchall())
+        self.open_ids: Set[str] = {r[0] for r in self.conn.execute("SELECT trade_id FROM open_trades")}
+
+    def is_synced(self, item: Dict, digest: str) -> bool:
+        return self.hashes.get(str(item.get("trade_id"))) == digest
+
+    def commit(self, watermark: Optional[Tuple[str, int]], synced: List[Tuple[str, str]]) -> None:
+        """One transaction: hashes of the batch just upserted + watermark (None - leave as is)"""
+        with self.conn:
+            if synced:
+                self.conn.executemany(
+                    "INSERT INTO row_hashes (trade_id, hash) VALUES (?, ?) "
+                    "ON CONFLICT(trade_id) DO UPDATE SET hash = excluded.hash",
+                    synced
+                )
+            if watermark is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('watermark', ?)",
+                    (json.dumps(list(watermark)),)
+                )
+        self.hashes.update(synced)
+        if watermark is not None:
+            self.cursor, self.rowid = watermark
+
+    def set_open(self, trade_ids: Set[str]) -> None:
+        """Replace the set of trades to re-read by id on the next pass"""
+        if trade_ids == self.open_ids:
+            return
+        with self.conn:
+            self.conn.execute("DELETE FROM open_trades")
+            self.conn.executemany("INSERT INTO open_trades (trade_id) VALUES (?)", [(t,) for t in trade_ids])
+        self.open_ids = set(trade_ids)
+
+
+def content_hash(item: Dict) -> str:
+    """Hash of the row as it would be sent (synced_at excluded - it changes every pass)"""
+    payload = {k: v for k, v in item.items() if k != "synced_at"}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class AdaptiveBatch:
+    """
+    Upsert batch size: doubles after a success, halves after a failure
+    After a failure the size is capped at the halved value until `probe_after`
+    consecutive successes - a hard payload limit does not fail every other request
+    """
+
+    def __init__(self, size: int = 100, min_size: int = 10, max_size: int = 500, probe_after: int = 50):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.size = min(max(size, self.min_size), self.max_size)
+        self.probe_after = probe_after
+        self.cap = self.max_size
+        self.successes = 0
+
+    def grow(self) -> None:
+        self.successes += 1
+        if self.cap < self.max_size and self.successes >= self.probe_after:
+            self.cap = self.max_size
+        self.size = min(self.cap, self.size * 2)
+
+    def shrink(self) -> bool:
+        """False when already at the minimum - give up until the next pass"""
+        self.successes = 0
+        if self.size <= self.min_size:
+            return False
+        self.size = self.cap = max(self.min_size, self.size // 2)
+        return True
+
+
+def _connect_readonly(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _selected_columns(conn: sqlite3.Connection, full: bool) -> Tuple[List[str], List[str]]:
+    """(all columns of trades, columns to read)"""
+    # Try to guess available columns
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(trades)").fetchall()]
+    if full:
+        return cols, cols  # mirror all columns
+    # Minimal field mapping with graceful fallbacks
+    return cols, [c for c in [
+        "id", "trade_id", "symbol", "side", "entry_price", "exit_price",
+        "pnl_net", "pnl_final_real", "roi_percent", "roi_final_real",
+        "opened_at", "closed_at", "tp1_hit", "tp2_hit", "sl_hit",
+    ] if c in cols]
+
+
+def _normalize(row: Dict, full: bool) -> Dict:
+    # Normalize field names
+    row_out = {
+        "id": row.get("id"),
+        "trade_id": row.get("trade_id") or row.get("id"),
+        "symbol": row.get("symbol"),
+        "side": row.get("side"),
+        "entry_price": row.get("entry_price"),
+        "exit_price": row.get("exit_price"),
+        "pnl": row.get("pnl_final_real") or row.get("pnl_net"),
+        "roi": row.get("roi_final_real") or row.get("roi_percent"),
+        "opened_at": row.get("opened_at"),
+        "closed_at": row.get("closed_at"),
+        "tp1_hit": row.get("tp1_hit"),
+        "tp2_hit": row.get("tp2_hit"),
+        "sl_hit": row.get("sl_hit"),
+        "synced_at": datetime.utcnow().isoformat(),
+    }
+    if full:
+        # merge all original columns for full mirror
+        row_out.update(row)
+    return row_out
+
+
+def read_trades(db_path: str, limit: int = 500, full: bool = False,
+                after: Optional[Tuple[Optional[str], int]] = None) -> List[Tuple[Tuple[str, int], Dict]]:
+    """
+    Rows changed after the watermark, ascending by (updated_at, rowid)
+    Returns [(row watermark, item)]
+    """
     if not os.path.exists(db_path):
         logger.error(f"SQLite DB not found: {db_path}")
         return []
 
-    with sqlite3.connect(db_path) as conn:
-        conn.row_factory = sqlite3.Row
-
-        # Try to guess available columns
-        cols = [r[1] for r in conn.execute("PRAGMA table_info(trades)").fetchall()]
+    with _connect_readonly(db_path) as conn:
+        cols, selected = _selected_columns(conn, full)
         if not cols:
             logger.warning("Table 'trades' not found")
             return []
 
-        # Minimal field mapping with graceful fallbacks
-        def has(c: str) -> bool:
-            return c in cols
+        # Keyset pagination: (cursor, rowid) > watermark
+        cursor_expr = "COALESCE(updated_at, '')" if "updated_at" in cols else "''"
+        last_cursor, last_rowid = after or ("", 0)
+        query = (f"SELECT rowid AS _rowid, {cursor_expr} AS _cursor, {', '.join(selected)} FROM trades "
+                 f"WHERE {cursor_expr} > ? OR ({cursor_expr} = ? AND rowid > ?) "
+                 f"ORDER BY {cursor_expr}, rowid LIMIT ?")
+        rows = conn.execute(query, (last_cursor or "", last_cursor or "", last_rowid, limit)).fetchall()
 
-        if full:
-            selected = cols  # mirror all columns
-        else:
-            selected = [c for c in [
-            "id", "trade_id", "symbol", "side", "entry_price", "exit_price",
-            "pnl_net", "pnl_final_real", "roi_percent", "roi_final_real",
-            "opened_at", "closed_at", "tp1_hit", "tp2_hit", "sl_hit",
-        ] if has(c)]
-
-        query = f"SELECT {', '.join(selected)} FROM trades ORDER BY opened_at DESC LIMIT ?"
-        rows = conn.execute(query, (limit,)).fetchall()
-
-        items: List[Dict] = []
+        items: List[Tuple[Tuple[str, int], Dict]] = []
         for r in rows:
             row = dict(r)
-            # Normalize field names
-            row_out = {
-                "id": row.get("id"),
-                "trade_id": row.get("trade_id") or row.get("id"),
-                "symbol": row.get("symbol"),
-                "side": row.get("side"),
-                "entry_price": row.get("entry_price"),
-                "exit_price": row.get("exit_price"),
-                "pnl": row.get("pnl_final_real") or row.get("pnl_net"),
-                "roi": row.get("roi_final_real") or row.get("roi_percent"),
-                "opened_at": row.get("opened_at"),
-                "closed_at": row.get("closed_at"),
-                "tp1_hit": row.get("tp1_hit"),
-                "tp2_hit": row.get("tp2_hit"),
-                "sl_hit": row.get("sl_hit"),
-                "synced_at": datetime.utcnow().isoformat(),
-            }
-            if full:
-                # merge all original columns for full mirror
-                row_out.update(row)
-            items.append(row_out)
-        logger.info(f"Collected {len(items)} trades from SQLite")
+            watermark = (row.pop("_cursor"), row.pop("_rowid"))
+            items.append((watermark, _normalize(row, full)))
+        logger.info(f"Collected {len(items)} trades after watermark from SQLite")
         return items
 
 
-def upsert_trades_min(sb: Client, items: List[Dict]) -> None:
+def tracks_open_trades(db_path: str) -> bool:
+    """True when trades has closed_at but no updated_at - open trades need the rescan"""
+    if not os.path.exists(db_path):
+        return False
+    with _connect_readonly(db_path) as conn:
+        cols, _ = _selected_columns(conn, False)
+        return "closed_at" in cols and "updated_at" not in cols
+
+
+def read_open_trades(db_path: str, full: bool = False, tracked: Iterable[str] = ()) -> List[Dict]:
+    """
+    Still-open trades (closed_at IS NULL) plus the `tracked` trade_ids (last seen open) whatever
+    their state - only when trades has no updated_at: without a change marker their updates,
+    including the close, are invisible to the watermark
+    """
+    if not os.path.exists(db_path):
+        return []
+
+    with _connect_readonly(db_path) as conn:
+        cols, selected = _selected_columns(conn, full)
+        if not cols or "updated_at" in cols or "closed_at" not in cols:
+            return []
+        rows = {r["_rowid"]: r for r in conn.execute(
+            f"SELECT rowid AS _rowid, {', '.join(selected)} FROM trades WHERE closed_at IS NULL"
+        ).fetchall()}
+
+        # Same key as _normalize: trade_id, falling back to id
+        key_cols = [c for c in ("trade_id", "id") if c in cols]
+        tracked = list(tracked)
+        if key_cols and tracked:
+            key_expr = f"CAST(COALESCE({', '.join(key_cols)}) AS TEXT)" if len(key_cols) > 1 else f"CAST({key_cols[0]} AS TEXT)"
+            for start in range(0, len(tracked), 500):
+                chunk = tracked[start:start + 500]
+                for r in conn.execute(
+                    f"SELECT rowid AS _rowid, {', '.join(selected)} FROM trades "
+                    f"WHERE {key_expr} IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall():
+                    rows[r["_rowid"]] = r
+
+        items = []
+        for r in rows.values():
+            row = dict(r)
+            row.pop("_rowid")
+            items.append(_normalize(row, full))
+        return items
+
+
+def upsert_trades_min(sb: Client, items: List[Dict]) -> bool:
     if not items:
-        return
+        return True
     # Upsert by trade_id when possible, else by id
     # Ensure table `trades_min` with unique constraint on trade_id or (id)
     try:
-        # Chunk to avoid payload limits
-        CHUNK = 100
-        for i in range(0, len(items), CHUNK):
-            chunk = items[i : i + CHUNK]
-            res = sb.table("trades_min").upsert(chunk, on_conflict="trade_id").execute()
-            logger.info(f"Upserted {len(chunk)} rows -> {len(res.data or [])}")
+        res = sb.table("trades_min").upsert(items, on_conflict="trade_id").execute()
+        logger.info(f"Upserted {len(items)} rows -> {len(res.data or [])}")
+        return True
     except Exception as e:
-        logger.error(f"Upsert error: {e}")
+        logger.error(f"Upsert error ({len(items)} rows): {e}")
+        return False
 
 
-def upsert_trades_full(sb: Client, items: List[Dict]) -> None:
+def upsert_trades_full(sb: Client, items: List[Dict]) -> bool:
     if not items:
-        return
+        return True
     try:
-        CHUNK = 100
-        for i in range(0, len(items), CHUNK):
-            chunk = items[i : i + CHUNK]
-            res = sb.table("trades").upsert(chunk, on_conflict="id").execute()
-            logger.info(f"Upserted FULL {len(chunk)} rows -> {len(res.data or [])}")
+        res = sb.table("trades").upsert(items, on_conflict="id").execute()
+        logger.info(f"Upserted FULL {len(items)} rows -> {len(res.data or [])}")
+        return True
     except Exception as e:
-        logger.error(f"Upsert FULL error: {e}")
+        logger.error(f"Upsert FULL error ({len(items)} rows): {e}")
+        return False
 
 
 def main() -> None:
@@ -131,16 +297,85 @@ def main() -> None:
     interval = int(os.getenv("SYNC_INTERVAL_SEC", "60"))
     loop = os.getenv("SYNC_LOOP", "1") == "1"
     full = os.getenv("FULL_SYNC", "0") == "1"
+    page_size = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+    state = SyncState(os.getenv("SYNC_STATE_PATH", "./trades_sync_state.db"))
+    batch = AdaptiveBatch(
+        int(os.getenv("SYNC_BATCH_SIZE", "100")),
+        int(os.getenv("SYNC_BATCH_MIN", "10")),
+        int(os.getenv("SYNC_BATCH_MAX", "500")),
+    )
 
     sb = get_supabase_client()
     if sb is None:
         return
 
-    def one_pass():
-        items = read_trades(db_path, full=full)
-        upsert_trades_min(sb, items)
+    def upsert(items: List[Dict]) -> bool:
+        ok = upsert_trades_min(sb, items)
         if full:
-            upsert_trades_full(sb, items)
+            ok = upsert_trades_full(sb, items) and ok
+        return ok
+
+    stats = {"sent": 0, "skipped": 0}
+
+    def sync_rows(rows: List[Tuple[Optional[Tuple[str, int]], Dict]]) -> bool:
+        """
+        Send changed rows in adaptive batches, checkpoint after each one
+        Row watermark None - the row is outside the watermark (open trade rescan)
+        """
+        changed = []
+        for index, (_, item) in enumerate(rows):
+            digest = content_hash(item)
+            if not state.is_synced(item, digest):
+                changed.append((index, item, digest))
+        stats["skipped"] += len(rows) - len(changed)
+
+        pos = 0
+        while pos < len(changed):
+            chunk = changed[pos:pos + batch.size]
+            if not upsert([item for _, item, _ in chunk]):
+                if batch.shrink():
+                    logger.warning(f"Batch failed, retrying with size {batch.size}")
+                    continue
+                return False
+            batch.grow()
+            pos += len(chunk)
+            # Watermark of the last sent row also covers the unchanged rows before it
+            state.commit(rows[chunk[-1][0]][0], [(str(item.get("trade_id")), digest) for _, item, digest in chunk])
+            stats["sent"] += len(chunk)
+
+        if rows and rows[-1][0] is not None:
+            state.commit(rows[-1][0], [])
+        return True
+
+    def one_pass():
+        stats["sent"] = stats["skipped"] = 0
+        try:
+            track_open = tracks_open_trades(db_path)
+            rescan = read_open_trades(db_path, full=full, tracked=state.open_ids) if track_open else []
+            if not sync_rows([(None, item) for item in rescan]):
+                logger.warning("Open trades rescan failed, will retry next pass")
+            # Keep re-reading a trade until its closed version is synced; deleted rows drop out
+            state.set_open({
+                str(item.get("trade_id")) for item in rescan
+                if item.get("closed_at") is None or not state.is_synced(item, content_hash(item))
+            })
+
+            # Page by page until caught up; watermark moves only after a successful upsert
+            while True:
+                rows = read_trades(db_path, limit=page_size, full=full, after=(state.cursor, state.rowid))
+                if not rows:
+                    return
+                if track_open:
+                    # Passed by the watermark while open - the close has to come from the rescan
+                    opened = {str(item.get("trade_id")) for _, item in rows if item.get("closed_at") is None}
+                    state.set_open(state.open_ids | opened)
+                if not sync_rows(rows):
+                    logger.warning("Sync pass stopped, will retry from the last checkpoint")
+                    return
+                if len(rows) < page_size:
+                    return
+        finally:
+            logger.info(f"Sync pass: sent {stats['sent']}, unchanged {stats['skipped']}, batch size {batch.size}")
 
     if loop:
         logger.info(f"Starting sync loop. DB={db_path} interval={interval}s")
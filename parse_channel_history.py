@@ -2,13 +2,21 @@
 """
 Парсинг истории сообщений из Telegram каналов
 Обрабатывает ВСЕ сообщения и сохраняет в базу данных
+
+Каналы импортируются параллельно страницами, общий бюджет запросов учитывает FloodWait
+После каждой сохраненной страницы пишется чекпоинт (последний message_id канала),
+прерванный импорт продолжается с него, повторный запуск догружает новые сообщения:
+    python parse_channel_history.py --days 7
+    python parse_channel_history.py --days 30      # догрузить более старую историю
+    python parse_channel_history.py --reset        # сбросить позиции и перечитать период заново
 """
 
+import argparse
 import asyncio
 import os
 import json
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
 # Загружаем переменные окружения
@@ -16,6 +24,7 @@ load_dotenv()
 
 try:
     from telethon import TelegramClient
+    from telethon.errors import FloodWaitError
     from supabase import create_client, Client
 except ImportError as e:
     print(f"❌ Отсутствуют модули: {e}")
@@ -27,16 +36,60 @@ sys.path.append('.')
 sys.path.append('signals')
 sys.path.append('core')
 
+from core.flood_scheduler import FloodWaitScheduler
+
 try:
     from signals.unified_signal_system import UnifiedSignalParser, SignalSource
 except ImportError as e:
     print(f"⚠️ Не удалось импортировать парсер: {e}")
     print("Будем использовать базовый парсинг")
 
+CHECKPOINT_PATH = os.getenv('GHOST_HISTORY_CHECKPOINTS', 'data/history_checkpoints.json')
+
+
+class ImportCheckpoints:
+    """Чекпоинты импорта по каналам в JSON (атомарная запись)"""
+    
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        self.path = path
+        self.data = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Чекпоинты не прочитаны, начинаем заново: {e}")
+    
+    def get(self, channel_id: str) -> dict:
+        return self.data.get(channel_id, {})
+    
+    def commit(self, channel_id: str, **fields):
+        """Обновление чекпоинта канала и запись на диск"""
+        checkpoint = self.data.setdefault(channel_id, {})
+        checkpoint.update(fields, updated_at=datetime.now().isoformat())
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+    
+    def reset(self, channel_ids: list = None):
+        """Сбросить позиции каналов (все - без аргумента): следующий импорт перечитает период с начала"""
+        for channel_id in channel_ids or list(self.data):
+            checkpoint = self.data.get(channel_id)
+            if checkpoint:
+                for field in ('last_id', 'from_date', 'backfill_from', 'backfill_id', 'done'):
+                    checkpoint.pop(field, None)
+                self.commit(channel_id)
+
+
 class ChannelHistoryParser:
     """Парсер истории каналов"""
     
-    def __init__(self):
+    def __init__(self, page_size: int = 100, requests_per_second: float = 1.0):
         # Telegram настройки
         self.api_id = os.getenv('TELEGRAM_API_ID')
         self.api_hash = os.getenv('TELEGRAM_API_HASH')
@@ -60,6 +113,11 @@ class ChannelHistoryParser:
             'by_channel': {}
         }
         
+        # Постраничный импорт: один запрос GetHistory на страницу, общий бюджет на все каналы
+        self.page_size = page_size
+        self.scheduler = FloodWaitScheduler(rate=requests_per_second, burst=3)
+        self.checkpoints = ImportCheckpoints()
+        
         # Каналы для обработки
         self.channels = {
             '-1001263635145': {
@@ -80,6 +138,8 @@ class ChannelHistoryParser:
         
         # Telegram клиент
         self.telegram_client = TelegramClient('ghost_session', self.api_id, self.api_hash)
+        # FloodWait не "пересыпаем" внутри Telethon - его учитывает общий планировщик
+        self.telegram_client.flood_sleep_threshold = 0
         await self.telegram_client.start(phone=self.phone)
         
         if not await self.telegram_client.is_user_authorized():
@@ -100,7 +160,12 @@ class ChannelHistoryParser:
         return True
     
     async def parse_channel_history(self, channel_id: str, days_back: int = 7):
-        """Парсинг истории канала"""
+        """
+        Парсинг истории канала страницами от старых к новым с чекпоинтами
+
+        Чекпоинт канала: last_id - последнее обработанное сообщение (следующий запуск догоняет новые с него),
+        from_date - начало уже импортированного периода (больший --days догружает только более старую часть)
+        """
         channel_info = self.channels.get(channel_id)
         if not channel_info:
             print(f"❌ Канал {channel_id} не найден в конфигурации")
@@ -110,75 +175,131 @@ class ChannelHistoryParser:
         print(f"   ID: {channel_id}")
         print(f"   Trader: {channel_info['trader_id']}")
         
-        # Временной диапазон
-        end_date = datetime.now()
+        # Временной диапазон (UTC, как message.date у Telethon)
+        end_date = datetime.now(timezone.utc)
         start_date = end_date - timedelta(days=days_back)
         
-        print(f"   Период: {start_date.strftime('%Y-%m-%d')} - {end_date.strftime('%Y-%m-%d')}")
+        checkpoint = self.checkpoints.get(channel_id)
+        last_id = checkpoint.get('last_id', 0)
+        imported_before = checkpoint.get('messages', 0)
+        
+        if last_id:
+            print(f"   ♻️ Продолжаем с сообщения {last_id} ({imported_before} уже обработано)")
+        else:
+            print(f"   Период: {start_date.strftime('%Y-%m-%d')} - {end_date.strftime('%Y-%m-%d')}")
+            self.checkpoints.commit(channel_id, from_date=start_date.isoformat())
+        
+        # Инициализируем статистику для канала
+        channel_stats = self.stats['by_channel'][channel_id] = {
+            'name': channel_info['name'],
+            'messages': 0,
+            'signals': 0,
+            'saved': 0,
+            'errors': 0
+        }
+        
+        def progress(**fields):
+            self.checkpoints.commit(channel_id, messages=imported_before + channel_stats['messages'], **fields)
         
         try:
+            await self.scheduler.acquire(channel_id)
             entity = await self.telegram_client.get_entity(int(channel_id))
             print(f"   ✅ Подключен к каналу: {entity.title}")
             
-            # Инициализируем статистику для канала
-            self.stats['by_channel'][channel_id] = {
-                'name': channel_info['name'],
-                'messages': 0,
-                'signals': 0,
-                'saved': 0,
-                'errors': 0
-            }
+            # Период стал длиннее (--days) - догружаем только то, что старше уже импортированного
+            while checkpoint.get('from_date') and start_date < datetime.fromisoformat(checkpoint['from_date']):
+                backfill_from = checkpoint.get('backfill_from') or start_date.isoformat()
+                print(f"   ⏪ Догрузка истории с {backfill_from[:10]} до {checkpoint['from_date'][:10]}")
+                await self._import_pages(
+                    entity, channel_id, channel_info, channel_stats,
+                    after_id=checkpoint.get('backfill_id') or 0,
+                    start_date=datetime.fromisoformat(backfill_from),
+                    until=datetime.fromisoformat(checkpoint['from_date']),
+                    on_page=lambda processed_id, since=backfill_from: progress(
+                        backfill_from=since, backfill_id=processed_id
+                    )
+                )
+                self.checkpoints.commit(channel_id, from_date=backfill_from, backfill_from=None, backfill_id=None)
+                checkpoint = self.checkpoints.get(channel_id)
+            
+            # Новые сообщения после позиции (для завершенного канала - то, что появилось с прошлого запуска)
+            last_id = await self._import_pages(
+                entity, channel_id, channel_info, channel_stats,
+                after_id=last_id, start_date=start_date, until=end_date,
+                on_page=lambda processed_id: progress(last_id=processed_id, done=False)
+            )
             
-            message_count = 0
-            signals_found = 0
+            self.checkpoints.commit(channel_id, last_id=last_id, done=True)
+            print(f"   ✅ {channel_info['name']}: завершено, {channel_stats['messages']} сообщений, {channel_stats['signals']} сигналов")
             
-            # Получаем сообщения
-            print(f"   📥 Получаем сообщения...")
+        except Exception as e:
+            print(f"   ❌ Ошибка обработки канала {channel_info['name']}: {e}")
+            print("   💾 Позиция сохранена - повторный запуск продолжит с нее")
+            self.stats['errors'] += 1
+            channel_stats['errors'] += 1
+    
+    async def _import_pages(self, entity, channel_id: str, channel_info: dict, channel_stats: dict,
+                            after_id: int, start_date: datetime, until: datetime, on_page) -> int:
+        """
+        Страницы после after_id (без него - с start_date) до первого сообщения не раньше until;
+        on_page(processed_id) после каждой обработанной страницы. Последний обработанный id
+        """
+        while True:
+            page = await self._fetch_page(entity, channel_id, after_id, start_date)
+            # Последнее действительно обработанное сообщение - позиция чекпоинта
+            processed_id = None
+            reached_end = False
             
-            async for message in self.telegram_client.iter_messages(
-                entity, 
-                offset_date=end_date,
-                reverse=True,
-                limit=1000  # Ограничиваем для начала
-            ):
-                # Проверяем дату
-                if message.date < start_date:
-                    continue
-                if message.date > end_date:
+            for message in page:
+                if message.date >= until:
+                    reached_end = True
                     break
                 
-                message_count += 1
                 self.stats['messages_processed'] += 1
-                self.stats['by_channel'][channel_id]['messages'] += 1
+                channel_stats['messages'] += 1
                 
                 # Обрабатываем сообщение
                 if message.text:
-                    signal_data = await self.process_message(
-                        message, 
-                        channel_info
-                    )
+                    signal_data = await self.process_message(message, channel_info)
                     
                     if signal_data:
-                        signals_found += 1
                         self.stats['signals_found'] += 1
-                        self.stats['by_channel'][channel_id]['signals'] += 1
+                        channel_stats['signals'] += 1
                         
                         # Сохраняем в базу
                         if await self.save_signal_to_db(signal_data, message, channel_info):
                             self.stats['signals_saved'] += 1
-                            self.stats['by_channel'][channel_id]['saved'] += 1
+                            channel_stats['saved'] += 1
                 
-                # Прогресс каждые 50 сообщений
-                if message_count % 50 == 0:
-                    print(f"   📊 Обработано: {message_count} сообщений, найдено: {signals_found} сигналов")
+                processed_id = message.id
             
-            print(f"   ✅ Завершено: {message_count} сообщений, {signals_found} сигналов")
+            if processed_id is not None:
+                # Обработанная часть страницы сохранена - фиксируем позицию
+                after_id = processed_id
+                on_page(processed_id)
+                print(f"   📊 {channel_info['name']}: {channel_stats['messages']} сообщений, "
+                      f"{channel_stats['signals']} сигналов (до id {after_id})")
             
-        except Exception as e:
-            print(f"   ❌ Ошибка обработки канала: {e}")
-            self.stats['errors'] += 1
-            if channel_id in self.stats['by_channel']:
-                self.stats['by_channel'][channel_id]['errors'] += 1
+            if reached_end or len(page) < self.page_size:
+                return after_id
+    
+    async def _fetch_page(self, entity, channel_id: str, last_id: int, start_date: datetime) -> list:
+        """Одна страница истории (один запрос) с учетом общего бюджета и FloodWait"""
+        while True:
+            await self.scheduler.acquire(channel_id)
+            try:
+                if last_id:
+                    # reverse=True: сообщения с id > offset_id, от старых к новым
+                    iterator = self.telegram_client.iter_messages(
+                        entity, limit=self.page_size, offset_id=last_id, reverse=True, wait_time=0
+                    )
+                else:
+                    iterator = self.telegram_client.iter_messages(
+                        entity, limit=self.page_size, offset_date=start_date, reverse=True, wait_time=0
+                    )
+                return [message async for message in iterator]
+            except FloodWaitError as e:
+                self.scheduler.flood_wait(e.seconds, channel_id)
     
     async def process_message(self, message, channel_info):
         """Обработка одного сообщения"""
@@ -232,7 +353,11 @@ class ChannelHistoryParser:
             return None
     
     async def save_signal_to_db(self, signal_data, message, channel_info):
-        """Сохранение сигнала в базу данных"""
+        """Сохранение сигнала в базу данных (синхронный клиент - в потоке, другие каналы не ждут)"""
+        return await asyncio.to_thread(self._save_signal_sync, signal_data, message, channel_info)
+    
+    def _save_signal_sync(self, signal_data, message, channel_info):
+        """Сохранение сигнала в базу данных (синхронный клиент Supabase)"""
         try:
             # Подготавливаем данные для signals_raw
             raw_signal = {
@@ -274,8 +399,8 @@ class ChannelHistoryParser:
             print(f"   ❌ Ошибка сохранения в БД: {e}")
             return False
     
-    async def run_full_parsing(self, days_back: int = 7):
-        """Запуск полного парсинга всех каналов"""
+    async def run_full_parsing(self, days_back: int = 7, channel_ids: list = None):
+        """Запуск полного парсинга всех каналов (параллельно, общий бюджет запросов)"""
         print("🚀 ЗАПУСК ПОЛНОГО ПАРСИНГА КАНАЛОВ")
         print("=" * 50)
         
@@ -285,9 +410,12 @@ class ChannelHistoryParser:
         print(f"📊 Будет обработано каналов: {len(self.channels)}")
         print(f"📅 Период: последние {days_back} дней")
         
-        # Обрабатываем каждый канал
-        for channel_id in self.channels:
-            await self.parse_channel_history(channel_id, days_back)
+        # Каналы параллельно; завершенные продолжают с последней позиции (новые сообщения)
+        pending = channel_ids or list(self.channels)
+        
+        started = datetime.now()
+        await asyncio.gather(*(self.parse_channel_history(channel_id, days_back) for channel_id in pending))
+        elapsed = (datetime.now() - started).total_seconds()
         
         # Финальная статистика
         print("\n" + "=" * 50)
@@ -296,6 +424,8 @@ class ChannelHistoryParser:
         print(f"   Сигналов найдено: {self.stats['signals_found']}")
         print(f"   Сигналов сохранено: {self.stats['signals_saved']}")
         print(f"   Ошибок: {self.stats['errors']}")
+        print(f"   Время: {elapsed:.1f}с, запросов: {self.scheduler.stats['requests']}, "
+              f"FloodWait: {self.scheduler.stats['flood_waits']} ({self.scheduler.stats['flood_wait_seconds']}с)")
         
         print("\n📋 ПО КАНАЛАМ:")
         for channel_id, stats in self.stats['by_channel'].items():
@@ -312,10 +442,20 @@ class ChannelHistoryParser:
 
 async def main():
     """Главная функция"""
-    parser = ChannelHistoryParser()
+    args_parser = argparse.ArgumentParser(description="Импорт истории Telegram каналов")
+    args_parser.add_argument('--days', type=int, default=7, help="Глубина истории в днях")
+    args_parser.add_argument('--channels', nargs='*', help="ID каналов (по умолчанию все)")
+    args_parser.add_argument('--page-size', type=int, default=100)
+    args_parser.add_argument('--rate', type=float, default=1.0, help="Запросов к Telegram в секунду на все каналы")
+    args_parser.add_argument('--reset', action='store_true', help="Сбросить позиции каналов и перечитать период")
+    args = args_parser.parse_args()
+    
+    parser = ChannelHistoryParser(page_size=args.page_size, requests_per_second=args.rate)
+    if args.reset:
+        parser.checkpoints.reset(args.channels)
     
-    # Запускаем парсинг за последние 7 дней
-    success = await parser.run_full_parsing(days_back=7)
+    # Запускаем парсинг за последние N дней
+    success = await parser.run_full_parsing(days_back=args.days, channel_ids=args.channels)
     
     if success:
         print("\n🎉 Все каналы обработаны успешно!")
@@ -4,7 +4,6 @@
 # 🔒 Статус: ✅ боевой (v2.0 - fills-first + fallback)
 # 🤝 Зависимости: pybit.unified_trading.HTTP, ghost_write_safe, utils.ghost_trace_logger.trace, utils.send_to_queue.log_to_queue, utils.bybit_api.get_executions|get_closed_pnl, utils.get_last_fill_price, leverage_parser.get_leverage
 
-import json
 import time
 import yaml
 import calendar
@@ -19,6 +18,7 @@ from utils.ghost_trace_logger import trace
 from utils.send_to_queue import log_to_queue
 from utils.get_last_fill_price import get_last_exit_fill_price_safe
 from leverage_parser import get_leverage
+from core.open_trades_store import OpenTradesStore, trade_key
 
 # === API Подключение к Bybit ===
 with open("config/api_keys.yaml") as f:
@@ -26,23 +26,28 @@ with open("config/api_keys.yaml") as f:
 
 session = HTTP(api_key=keys["api_key"], api_secret=keys["api_secret"])
 
-OPEN_TRADES_PATH = "output/open_trades.json"
+OPEN_TRADES_PATH = "output/open_trades.json"  # файл производителей сделок, новые сделки подхватываются каждый цикл
+OPEN_TRADES_DB = "output/open_trades.db"
 FEE_RATE = 0.00055
 BE_EPS = 0.0002  # 2 bps допуск для BE
 
+# Открытые сделки: строка на сделку, запись только изменившихся (вместо перезаписи всего JSON)
+open_trades = OpenTradesStore(OPEN_TRADES_DB, legacy_json=OPEN_TRADES_PATH)
+
 def _load_open_trades() -> List[Dict[str, Any]]:
     try:
-        with open(OPEN_TRADES_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
+        # Сделки, дописанные в JSON после старта; известные не перетираются
+        open_trades.import_json(OPEN_TRADES_PATH)
+        return open_trades.list_trades()
+    except Exception as e:
+        trace("OPEN_TRADES_READ_FAIL", {"err": str(e)}, "position_exit_tracker")
         return []
 
-def _save_open_trades(data: List[Dict[str, Any]]) -> None:
+def _mark_trade_closed(key: str, trade: Dict[str, Any]) -> None:
     try:
-        with open(OPEN_TRADES_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        open_trades.mark_closed(key, trade)
     except Exception as e:
-        trace("OPEN_TRADES_WRITE_FAIL", {"err": str(e)}, "position_exit_tracker")
+        trace("OPEN_TRADES_WRITE_FAIL", {"err": str(e), "id": key}, "position_exit_tracker")
 
 def _signed_profit(entry: float, exit_price: float, qty: float, side: str) -> float:
     """Вычисляет PnL с учётом направления позиции"""
@@ -365,10 +370,12 @@ def repeat_cancel_until_clean(symbol):
 
 def check_and_close_positions():
     """Основная функция отслеживания закрытия позиций"""
+    # Открытые сделки остаются в БД как есть; записывается только закрытая сделка
     trades = _load_open_trades()
-    still_open = []
 
     for trade in trades:
+        # Ключ до обработки: запись сделки может дописать в нее поля
+        key = trade_key(trade)
         try:
             symbol = trade["symbol"]
             entry = float(trade.get("real_entry_price", 0))
@@ -378,7 +385,6 @@ def check_and_close_positions():
             pos1 = get_position(symbol)
             size1 = float(pos1.get("size", 0))
             if size1 > 0:
-                still_open.append(trade)
                 continue
 
             # Перепроверяем спустя 3 секунды
@@ -389,7 +395,6 @@ def check_and_close_positions():
             # Защита от преждевременного закрытия
             if size2 > 0 and trade.get("tp1_hit") and not trade.get("tp2_hit") and not trade.get("sl_hit"):
                 log_to_queue("SKIP_EXIT_TP1_ONLY", f"{symbol} | TP1 был, но позиция активна — не закрываем")
-                still_open.append(trade)
                 continue
 
             if size2 == 0:
@@ -398,7 +403,6 @@ def check_and_close_positions():
                 qty = float(trade.get("position_qty", 0))
                 if not entry or not qty:
                     log_to_queue("EXIT_SKIPPED", f"{symbol} | Пропущено: entry или qty = 0")
-                    still_open.append(trade)
                     continue
 
                 # Отмена ордеров (если SL уже перенесён в BE)
@@ -472,7 +476,7 @@ def check_and_close_positions():
                     elif tp1_hit:
                         trade["exit_reason"] = "tp1_be"
                     else:
-                    trade["exit_reason"] = "manual"
+                        trade["exit_reason"] = "manual"
 
                 # Получаем PnL через API
                 try:
@@ -558,6 +562,7 @@ def check_and_close_positions():
                     log_to_queue("EXIT_INSERT_PREVIEW", preview)
 
                     ghost_write_safe("trades", trade)
+                    _mark_trade_closed(key, trade)
                     trace("EXIT_RECORDED", {"symbol": symbol, "roi": trade.get("roi_final_real"), "id": trade.get("id")}, "position_exit_tracker")
                     log_to_queue("DEAL_CLOSED", f"{symbol} | ROI: {trade.get('roi_final_real')}%")
                     print(f"[✅] WRITE_OK → {symbol}")
@@ -570,8 +575,6 @@ def check_and_close_positions():
             trace("EXIT_CHECK_FAIL", {"error": str(e), "symbol": trade.get("symbol"), "id": trade.get("id")}, "position_exit_tracker")
             log_to_queue("EXIT_EXCEPTION", f"{trade.get('symbol', 'UNKNOWN')} | ошибка в блоке try: {str(e)}")
 
-    _save_open_trades(still_open)
-
 if __name__ == "__main__":
     print("🔁 GHOST Exit Monitor v2.0 (fills-first) запущен...")
     while True:
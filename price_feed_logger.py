@@ -7,11 +7,12 @@ GHOST | Price Feed Logger
 
 import json
 import time
-import sqlite3
 from datetime import datetime
 from pybit.unified_trading import HTTP
 import yaml
 
+from core.sqlite_store import get_sqlite_store
+
 # === API Подключение ===
 with open("config/api_keys.yaml") as f:
     keys = yaml.safe_load(f)["bybit"]
@@ -23,12 +24,8 @@ SYMBOLS = ["BTCUSDT", "ETHUSDT", "SOLUSDT", "WIFUSDT"]
 INTERVALS = ["1", "5"]  # 1m и 5m свечи
 DB_PATH = "data/price_feed.db"
 
-def init_database():
-    """Инициализация базы данных для цен"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
+def _create_tables(conn):
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS price_feed (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             symbol TEXT NOT NULL,
@@ -45,11 +42,12 @@ def init_database():
     """)
     
     # Индексы для быстрого поиска
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_symbol_timestamp ON price_feed(symbol, timestamp)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_interval ON price_feed(interval)")
-    
-    conn.commit()
-    conn.close()
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_symbol_timestamp ON price_feed(symbol, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_interval ON price_feed(interval)")
+
+def init_database():
+    """Инициализация базы данных для цен"""
+    get_sqlite_store(DB_PATH).run(_create_tables).result()
 
 def get_kline_data(symbol, interval, limit=1):
     """Получение свечей с Bybit"""
@@ -72,43 +70,31 @@ def get_kline_data(symbol, interval, limit=1):
         return []
 
 def save_price_data(symbol, interval, kline_data):
-    """Сохранение ценовых данных в БД"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    """Сохранение ценовых данных в БД (одной транзакцией в потоке-писателе)"""
+    rows = []
+    for kline in kline_data:
+        # kline: [timestamp, open, high, low, close, volume, ...]
+        rows.append((
+            symbol, interval, int(kline[0]),
+            float(kline[1]), float(kline[2]), float(kline[3]), float(kline[4]), float(kline[5])
+        ))
     
     try:
-        for kline in kline_data:
-            # kline: [timestamp, open, high, low, close, volume, ...]
-            timestamp = int(kline[0])
-            open_price = float(kline[1])
-            high_price = float(kline[2])
-            low_price = float(kline[3])
-            close_price = float(kline[4])
-            volume = float(kline[5])
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO price_feed 
-                (symbol, interval, timestamp, open_price, high_price, low_price, close_price, volume)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (symbol, interval, timestamp, open_price, high_price, low_price, close_price, volume))
-            
-        conn.commit()
+        get_sqlite_store(DB_PATH).executemany("""
+            INSERT OR REPLACE INTO price_feed 
+            (symbol, interval, timestamp, open_price, high_price, low_price, close_price, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows).result()
         print(f"✅ Сохранено {len(kline_data)} свечей {symbol} {interval}m")
         
     except Exception as e:
         print(f"❌ Ошибка сохранения {symbol}: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
 
 def get_price_at(symbol, target_timestamp):
     """Получение цены на конкретный момент времени"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
     try:
         # Ищем ближайшую свечу к целевому времени
-        cursor.execute("""
+        result = get_sqlite_store(DB_PATH).query_one("""
             SELECT close_price, timestamp 
             FROM price_feed 
             WHERE symbol = ? AND timestamp <= ?
@@ -116,7 +102,6 @@ def get_price_at(symbol, target_timestamp):
             LIMIT 1
         """, (symbol, target_timestamp))
         
-        result = cursor.fetchone()
         if result:
             return {
                 "price": result[0],
@@ -129,8 +114,6 @@ def get_price_at(symbol, target_timestamp):
     except Exception as e:
         print(f"❌ Ошибка получения цены {symbol}: {e}")
         return None
-    finally:
-        conn.close()
 
 def log_price_feed():
     """Основной цикл сбора ценовых данных"""
@@ -5,19 +5,15 @@ GHOST | Reaction Logger
 """
 
 import json
-import sqlite3
 import time
 from datetime import datetime, timedelta
 from price_feed_logger import get_price_at
+from core.sqlite_store import get_sqlite_store
 
 DB_PATH = "data/reactions.db"
 
-def init_reactions_database():
-    """Инициализация базы данных для реакций"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
+def _create_tables(conn):
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS news_reactions (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             news_id TEXT UNIQUE,
@@ -42,24 +38,23 @@ def init_reactions_database():
     """)
     
     # Индексы
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cluster ON news_reactions(cluster)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_timestamp ON news_reactions(event_timestamp)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reaction_type ON news_reactions(reaction_type)")
-    
-    conn.commit()
-    conn.close()
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cluster ON news_reactions(cluster)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_timestamp ON news_reactions(event_timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reaction_type ON news_reactions(reaction_type)")
+
+def init_reactions_database():
+    """Инициализация базы данных для реакций"""
+    get_sqlite_store(DB_PATH).run(_create_tables).result()
 
 def log_news_event(news_data):
     """Логирование нового события новости"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
     try:
         # Получаем цену на момент события
         event_timestamp = int(time.time() * 1000)  # в миллисекундах
         price_data = get_price_at(news_data.get('symbol', 'BTCUSDT'), event_timestamp)
         
-        cursor.execute("""
+        # Запись уходит в поток-писатель, вызывающий не ждет диск
+        get_sqlite_store(DB_PATH).execute("""
             INSERT OR REPLACE INTO news_reactions 
             (news_id, cluster, title, content, source, published_at, event_timestamp, 
              symbol, price_at_event)
@@ -76,30 +71,34 @@ def log_news_event(news_data):
             price_data['price'] if price_data else None
         ))
         
-        conn.commit()
         print(f"✅ Логировано событие: {news_data.get('cluster')} | {news_data.get('title')[:50]}...")
         
     except Exception as e:
         print(f"❌ Ошибка логирования события: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+
+# Колонки цены и изменения по горизонту
+_REACTION_COLUMNS = {
+    1: ('price_1h', 'price_change_1h'),
+    4: ('price_4h', 'price_change_4h'),
+    24: ('price_24h', 'price_change_24h')
+}
 
 def update_reaction_prices(news_id, hours_later=1):
     """Обновление цен через указанное время"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    store = get_sqlite_store(DB_PATH)
     
     try:
-        # Получаем время события
-        cursor.execute("SELECT event_timestamp, symbol FROM news_reactions WHERE news_id = ?", (news_id,))
-        result = cursor.fetchone()
+        # Получаем время события и цену на момент события
+        result = store.query_one(
+            "SELECT event_timestamp, symbol, price_at_event FROM news_reactions WHERE news_id = ?",
+            (news_id,)
+        )
         
         if not result:
             print(f"❌ Событие {news_id} не найдено")
             return
             
-        event_timestamp, symbol = result
+        event_timestamp, symbol, event_price = result
         event_time = event_timestamp / 1000  # конвертируем в секунды
         
         # Вычисляем время для проверки
@@ -108,56 +107,34 @@ def update_reaction_prices(news_id, hours_later=1):
         
         # Получаем цену через указанное время
         price_data = get_price_at(symbol, check_timestamp)
+        columns = _REACTION_COLUMNS.get(hours_later)
         
-        if price_data:
-            # Получаем цену на момент события
-            cursor.execute("SELECT price_at_event FROM news_reactions WHERE news_id = ?", (news_id,))
-            event_price = cursor.fetchone()[0]
+        if price_data and event_price and columns:
+            price_change = ((price_data['price'] - event_price) / event_price) * 100
             
-            if event_price:
-                price_change = ((price_data['price'] - event_price) / event_price) * 100
-                
-                # Обновляем данные
-                if hours_later == 1:
-                    cursor.execute("""
-                        UPDATE news_reactions 
-                        SET price_1h = ?, price_change_1h = ?
-                        WHERE news_id = ?
-                    """, (price_data['price'], price_change, news_id))
-                elif hours_later == 4:
-                    cursor.execute("""
-                        UPDATE news_reactions 
-                        SET price_4h = ?, price_change_4h = ?
-                        WHERE news_id = ?
-                    """, (price_data['price'], price_change, news_id))
-                elif hours_later == 24:
-                    cursor.execute("""
-                        UPDATE news_reactions 
-                        SET price_24h = ?, price_change_24h = ?
-                        WHERE news_id = ?
-                    """, (price_data['price'], price_change, news_id))
-                
-                conn.commit()
-                print(f"✅ Обновлена цена через {hours_later}ч: {price_change:.2f}%")
+            # Ждем коммит: classify_reaction сразу читает обновленные значения
+            price_column, change_column = columns
+            store.execute(f"""
+                UPDATE news_reactions 
+                SET {price_column} = ?, {change_column} = ?
+                WHERE news_id = ?
+            """, (price_data['price'], price_change, news_id)).result()
+            
+            print(f"✅ Обновлена цена через {hours_later}ч: {price_change:.2f}%")
                 
     except Exception as e:
         print(f"❌ Ошибка обновления цен: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
 
 def classify_reaction(news_id):
     """Классификация типа реакции"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    store = get_sqlite_store(DB_PATH)
     
     try:
-        cursor.execute("""
+        result = store.query_one("""
             SELECT price_change_1h, price_change_4h, price_change_24h
             FROM news_reactions WHERE news_id = ?
         """, (news_id,))
         
-        result = cursor.fetchone()
         if not result:
             return None
             
@@ -180,44 +157,39 @@ def classify_reaction(news_id):
             reaction_type = "moderate_move"
         
         # Обновляем тип реакции
-        cursor.execute("""
+        store.execute("""
             UPDATE news_reactions 
             SET reaction_type = ?
             WHERE news_id = ?
         """, (reaction_type, news_id))
         
-        conn.commit()
         print(f"✅ Классифицирована реакция: {reaction_type}")
         return reaction_type
         
     except Exception as e:
         print(f"❌ Ошибка классификации: {e}")
         return None
-    finally:
-        conn.close()
 
 def get_reaction_stats(cluster=None, days=30):
     """Получение статистики реакций"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    store = get_sqlite_store(DB_PATH)
     
     try:
         if cluster:
-            cursor.execute("""
+            results = store.query("""
                 SELECT reaction_type, COUNT(*) as count
                 FROM news_reactions 
                 WHERE cluster = ? AND created_at >= datetime('now', '-{} days')
                 GROUP BY reaction_type
             """.format(days), (cluster,))
         else:
-            cursor.execute("""
+            results = store.query("""
                 SELECT reaction_type, COUNT(*) as count
                 FROM news_reactions 
                 WHERE created_at >= datetime('now', '-{} days')
                 GROUP BY reaction_type
             """.format(days))
         
-        results = cursor.fetchall()
         stats = {row[0]: row[1] for row in results}
         
         return stats
@@ -225,53 +197,42 @@ def get_reaction_stats(cluster=None, days=30):
     except Exception as e:
         print(f"❌ Ошибка получения статистики: {e}")
         return {}
-    finally:
-        conn.close()
 
 def schedule_reaction_updates():
     """Планировщик обновления реакций"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    store = get_sqlite_store(DB_PATH)
     
     try:
         # Находим события, которые нужно обновить
         current_time = int(time.time())
         
         # События через 1 час
-        cursor.execute("""
+        for (news_id,) in store.query("""
             SELECT news_id FROM news_reactions 
             WHERE price_1h IS NULL 
             AND event_timestamp <= ?
-        """, ((current_time - 3600) * 1000,))
-        
-        for (news_id,) in cursor.fetchall():
+        """, ((current_time - 3600) * 1000,)):
             update_reaction_prices(news_id, 1)
             classify_reaction(news_id)
         
         # События через 4 часа
-        cursor.execute("""
+        for (news_id,) in store.query("""
             SELECT news_id FROM news_reactions 
             WHERE price_4h IS NULL 
             AND event_timestamp <= ?
-        """, ((current_time - 14400) * 1000,))
-        
-        for (news_id,) in cursor.fetchall():
+        """, ((current_time - 14400) * 1000,)):
             update_reaction_prices(news_id, 4)
         
         # События через 24 часа
-        cursor.execute("""
+        for (news_id,) in store.query("""
             SELECT news_id FROM news_reactions 
             WHERE price_24h IS NULL 
             AND event_timestamp <= ?
-        """, ((current_time - 86400) * 1000,))
-        
-        for (news_id,) in cursor.fetchall():
+        """, ((current_time - 86400) * 1000,)):
             update_reaction_prices(news_id, 24)
             
     except Exception as e:
         print(f"❌ Ошибка планировщика: {e}")
-    finally:
-        conn.close()
 
 if __name__ == "__main__":
     # Инициализация БД
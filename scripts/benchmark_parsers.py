@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пропускной способности парсеров сигналов (signals/parsers)
+Генерирует офлайн-корпус сообщений в стиле каналов и меряет msg/sec, p50/p99 и аллокации
+
+Запуск:
+    python scripts/benchmark_parsers.py                       # корпус 2000 сообщений, seed 42
+    python scripts/benchmark_parsers.py --output bench.json   # сохранить результат
+    python scripts/benchmark_parsers.py --compare bench.json  # сравнить с прошлым прогоном
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# Добавляем корневую папку в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Версия генератора корпуса - менять при изменении шаблонов, иначе прогоны несравнимы
+CORPUS_VERSION = 1
+
+SYMBOLS = ['BTC', 'ETH', 'SOL', 'SUI', 'APT', 'DOGE', 'PEPE', 'ARB', 'OP', 'TIA', 'WIF', 'YGG', 'TAC', 'ALPINE']
+EMOJIS = ['🚀', '🔥', '💎', '📍', '💰', '📈', '📉', '⚡️', '✅', '🎯', '🟢', '🔴']
+
+
+def _price(rng: random.Random) -> float:
+    magnitude = rng.choice([0.001, 0.1, 1, 10, 100, 1000, 30000])
+    return round(rng.uniform(1, 9) * magnitude, 4 if magnitude < 1 else 2)
+
+
+def _whales_signal(rng: random.Random) -> str:
+    symbol = rng.choice(SYMBOLS)
+    entry = _price(rng)
+    targets = ", ".join(f"${entry * (1 + 0.02 * (i + 1)):.4f}" for i in range(rng.randint(2, 7)))
+    return (
+        f"Longing #{symbol} Here\n\nLong (5x - 10x)\n\n"
+        f"Entry: ${entry:.4f} - ${entry * 0.98:.4f}\n\n"
+        f"Reason: Chart looks bullish for it. Worth buying for short-mid term quick profits too.\n\n"
+        f"Targets: {targets}\n\nStoploss: ${entry * 0.9:.4f}"
+    )
+
+
+def _spot_signal(rng: random.Random) -> str:
+    symbol = rng.choice(SYMBOLS)
+    entry = _price(rng)
+    return (
+        f"Buying #{symbol} Here in spot\n\nYou can long in {rng.randint(2, 5)}x leverage, too.\n\n"
+        f"Entry: {entry}-{entry * 0.97:.5f}$\n\n"
+        f"Reason: Currently in demanding zone.Volume growing up.\n\n"
+        f"Targets: {entry * 1.1:.5f}$, {entry * 1.25:.5f}$\n\nStoploss: {entry * 0.85:.5f}$"
+    )
+
+
+def _russian_signal(rng: random.Random) -> str:
+    symbol = rng.choice(SYMBOLS)
+    side = rng.choice(['ЛОНГ', 'ШОРТ'])
+    entry = _price(rng)
+    tps = "\n".join(f"Цель {i + 1}: {entry * (1 + 0.03 * (i + 1)):.4f}" for i in range(rng.randint(1, 5)))
+    return (
+        f"{rng.choice(EMOJIS)} {symbol}/USDT {side} x{rng.choice([5, 10, 20])}\n"
+        f"Вход: {entry} - {entry * 0.99:.4f}\n{tps}\nСтоп: {entry * 0.93:.4f}"
+    )
+
+
+def _short_signal(rng: random.Random) -> str:
+    symbol = rng.choice(SYMBOLS)
+    side = rng.choice(['LONG', 'SHORT'])
+    entry = _price(rng)
+    return f"#{symbol} {side} {rng.randint(3, 25)}x\nEntry: {entry}\nTP1: {entry * 1.05:.4f}\nSL: {entry * 0.95:.4f}"
+
+
+def _pump_news(rng: random.Random) -> str:
+    symbol = rng.choice(SYMBOLS)
+    return (
+        f"{rng.choice(EMOJIS)}{rng.choice(EMOJIS)} #{symbol} запампили на +{rng.randint(10, 90)}% со вчерашнего вечера. "
+        f"В {rng.randint(10, 23)}:{rng.randint(10, 59)} по мск он закрепился в топе по спотовым покупкам на Binance, "
+        f"а затем на всех CEX."
+    )
+
+
+def _noise(rng: random.Random) -> str:
+    return rng.choice([
+        "Доброе утро, трейдеры! Сегодня ожидается волатильность. Будьте осторожны с рисками.",
+        "ок",
+        "Thanks everyone for joining our VIP group 🙏",
+        "Admin announcement: server maintenance tonight",
+        "https://t.me/joinchat/xxx https://t.me/a https://t.me/b",
+        "Рынок сегодня спокойный, ждем новостей по ФРС 📊",
+    ])
+
+
+def _long_analysis(rng: random.Random) -> str:
+    symbol = rng.choice(SYMBOLS)
+    paragraph = (
+        f"{symbol} is testing the resistance zone again, volume is growing and RSI is neutral. "
+        f"Support around {_price(rng)} held three times this week. "
+    )
+    return (paragraph * rng.randint(10, 40)) + "\n" + _whales_signal(rng)
+
+
+TEMPLATES = [
+    (_whales_signal, 25),
+    (_spot_signal, 10),
+    (_russian_signal, 15),
+    (_short_signal, 15),
+    (_pump_news, 10),
+    (_noise, 20),
+    (_long_analysis, 5),
+]
+
+
+def generate_corpus(size: int = 2000, seed: int = 42) -> List[str]:
+    """Детерминированный корпус сообщений (одинаковый для одинаковых size/seed)"""
+    rng = random.Random(seed)
+    generators = [gen for gen, _ in TEMPLATES]
+    weights = [weight for _, weight in TEMPLATES]
+    return [rng.choices(generators, weights)[0](rng) for _ in range(size)]
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def bench(name: str, func: Callable[[str], Any], corpus: List[str], warmup: int = 50,
+          alloc_sample: int = 200, repeat: int = 3) -> Dict[str, Any]:
+    """Прогон одной функции по корпусу: время на сообщение и аллокации"""
+    for text in corpus[:warmup]:
+        _safe_call(func, text)
+
+    # Проход 1: время (без tracemalloc - он искажает тайминги), лучший из repeat прогонов
+    best_total = None
+    latencies: List[float] = []
+    parsed = 0
+    for _ in range(max(1, repeat)):
+        run_latencies = []
+        run_parsed = 0
+        started = time.perf_counter()
+        for text in corpus:
+            t0 = time.perf_counter()
+            if _safe_call(func, text) is not None:
+                run_parsed += 1
+            run_latencies.append(time.perf_counter() - t0)
+        total = time.perf_counter() - started
+
+        if best_total is None or total < best_total:
+            best_total, latencies, parsed = total, run_latencies, run_parsed
+
+    # Проход 2: аллокации (пиковая память на сообщение) на детерминированной выборке корпуса
+    sample = corpus[:alloc_sample] if alloc_sample else corpus
+    tracemalloc.start()
+    peak_total = 0
+    for text in sample:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        _safe_call(func, text)
+        _, peak = tracemalloc.get_traced_memory()
+        peak_total += peak - base
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'name': name,
+        'messages': len(corpus),
+        'parsed': parsed,
+        'msgs_per_sec': len(corpus) / best_total if best_total else 0.0,
+        'p50_us': _percentile(latencies, 50) * 1e6,
+        'p99_us': _percentile(latencies, 99) * 1e6,
+        'alloc_kb_per_msg': peak_total / len(sample) / 1024 if sample else 0.0,
+    }
+
+
+def _safe_call(func: Callable[[str], Any], text: str) -> Any:
+    try:
+        return func(text)
+    except Exception:
+        return None
+
+
+def _parse_if_can(parser: Any, trader_id: str) -> Callable[[str], Any]:
+    def run(text: str) -> Any:
+        if parser.can_parse(text):
+            return parser.parse_signal(text, trader_id)
+        return None
+    return run
+
+
+def build_targets() -> Dict[str, Callable[[str], Any]]:
+    """Парсеры для бенчмарка (недоступные пропускаются)"""
+    targets: Dict[str, Callable[[str], Any]] = {}
+
+    candidates = [
+        ('whales_crypto', 'signals.parsers.whales_crypto_parser', 'WhalesCryptoParser'),
+        ('2trade', 'signals.parsers.parser_2trade', 'TwoTradeParser'),
+        ('crypto_hub', 'signals.parsers.crypto_hub_parser', 'CryptoHubParser'),
+        ('ghost_test', 'signals.parsers.ghost_test_parser', 'GhostTestParser'),
+        ('cryptoattack24', 'signals.parsers.cryptoattack24_parser', 'CryptoAttack24Wrapper'),
+        ('universal_fallback', 'signals.parsers.universal_fallback_parser', 'UniversalFallbackParser'),
+    ]
+
+    import importlib
+    for name, module_name, class_name in candidates:
+        try:
+            parser = getattr(importlib.import_module(module_name), class_name)()
+            targets[name] = _parse_if_can(parser, 'bench')
+        except Exception as e:
+            print(f"⚠️ {name} skipped: {e}")
+
+    try:
+        from signals.trader_detector import TraderDetector
+        detector = TraderDetector()
+        targets['trader_detector'] = detector.detect_trader
+    except Exception as e:
+        print(f"⚠️ trader_detector skipped: {e}")
+
+    try:
+        from signals.parsers.parser_factory import get_parser_factory
+        factory = get_parser_factory()
+        targets['parse_with_fallback'] = lambda text: factory.parse_with_fallback(text, trader_id='bench')
+    except Exception as e:
+        print(f"⚠️ parse_with_fallback skipped: {e}")
+
+    return targets
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_report(results: List[Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]] = None):
+    """Таблица результатов (с дельтой к baseline если передан)"""
+    header = f"{'parser':<22}{'msg/s':>12}{'p50 us':>11}{'p99 us':>11}{'KB/msg':>9}{'parsed':>8}"
+    if baseline:
+        header += f"{'Δ msg/s':>10}"
+    print(header)
+    print("-" * len(header))
+
+    for row in results:
+        line = (f"{row['name']:<22}{row['msgs_per_sec']:>12.0f}{row['p50_us']:>11.1f}"
+                f"{row['p99_us']:>11.1f}{row['alloc_kb_per_msg']:>9.1f}{row['parsed']:>8}")
+        if baseline:
+            old = baseline.get(row['name'])
+            if old and old.get('msgs_per_sec'):
+                delta = (row['msgs_per_sec'] / old['msgs_per_sec'] - 1) * 100
+                line += f"{delta:>+9.1f}%"
+            else:
+                line += f"{'n/a':>10}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GHOST parsers throughput benchmark")
+    parser.add_argument('--size', type=int, default=2000, help="Размер корпуса")
+    parser.add_argument('--seed', type=int, default=42, help="Seed генератора корпуса")
+    parser.add_argument('--repeat', type=int, default=3, help="Прогонов на парсер (берется лучший)")
+    parser.add_argument('--alloc-sample', type=int, default=200,
+                        help="Сколько сообщений мерить под tracemalloc (0 = весь корпус)")
+    parser.add_argument('--only', nargs='*', help="Бенчмаркать только эти парсеры")
+    parser.add_argument('--output', help="Сохранить результаты в JSON")
+    parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    # Парсеры логируют каждое сообщение на INFO - это мерить не нужно
+    logging.disable(logging.CRITICAL)
+
+    corpus = generate_corpus(args.size, args.seed)
+    targets = build_targets()
+    if args.only:
+        targets = {name: func for name, func in targets.items() if name in args.only}
+
+    print(f"🧪 Corpus: {len(corpus)} messages (seed={args.seed}, v{CORPUS_VERSION}), "
+          f"avg {sum(map(len, corpus)) / len(corpus):.0f} chars")
+
+    # Подавляем print() внутри парсеров на время замеров
+    results = []
+    with open(os.devnull, 'w') as devnull:
+        for name, func in targets.items():
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                results.append(bench(name, func, corpus, alloc_sample=args.alloc_sample, repeat=args.repeat))
+            finally:
+                sys.stdout = stdout
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        if previous.get('corpus') != {'size': args.size, 'seed': args.seed, 'version': CORPUS_VERSION}:
+            print("⚠️ Baseline was run on a different corpus - deltas are not comparable")
+        baseline = {row['name']: row for row in previous.get('results', [])}
+
+    print_report(results, baseline)
+
+    if args.output:
+        report = {
+            'timestamp': datetime.now().isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'corpus': {'size': args.size, 'seed': args.seed, 'version': CORPUS_VERSION},
+            'alloc_sample': args.alloc_sample,
+            'repeat': args.repeat,
+            'results': results
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,7 @@ CREATE TABLE IF NOT EXISTS signals_raw (
     text TEXT NOT NULL,
     meta JSONB,
     processed BOOLEAN DEFAULT false,
+    content_hash VARCHAR(40) UNIQUE,
     created_at TIMESTAMP DEFAULT NOW()
 );
 
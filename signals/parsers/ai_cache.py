@@ -0,0 +1,298 @@
+"""
+GHOST AI Cache
+Кеш ответов AI моделей: точный хеш нормализованного текста + проверка почти-дубликатов по шинглам
+Склейка одновременных одинаковых запросов и ограничение параллельных вызовов моделей
+Кеш ответов по изображениям через перцептивный хеш (dHash) для репостов скриншотов
+"""
+
+import asyncio
+import hashlib
+import io
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional, Set, Tuple
+
+# Эмодзи, пунктуация и прочий шум, который не меняет смысл сигнала
+_NOISE_RE = re.compile(r'[^\w\s.,/%$#-]+')
+_SPACE_RE = re.compile(r'\s+')
+_NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)?')
+_TICKER_RE = re.compile(r'(?:[#$][A-Za-z]{2,10}|\b[A-Z]{2,10}\b)')
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация текста сообщения для ключа кеша"""
+    text = _NOISE_RE.sub(' ', text or '')
+    return _SPACE_RE.sub(' ', text).strip().lower()
+
+
+def text_signature(text: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """
+    Сигнатура сигнала: числа и тикеры
+    Почти-дубликатом считается только текст с той же сигнатурой - иначе другие цены/монета
+    """
+    numbers = frozenset(n.replace(',', '.') for n in _NUMBER_RE.findall(text or ''))
+    tickers = frozenset(t.lstrip('#$').upper() for t in _TICKER_RE.findall(text or ''))
+    return numbers, tickers
+
+
+def text_shingles(normalized: str, size: int = 3) -> FrozenSet[int]:
+    """Хеши словесных шинглов нормализованного текста"""
+    words = normalized.split()
+    if len(words) <= size:
+        return frozenset([hash(normalized)])
+    return frozenset(hash(' '.join(words[i:i + size])) for i in range(len(words) - size + 1))
+
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Entry:
+    __slots__ = ('value', 'expires_at', 'signature', 'shingles')
+
+    def __init__(self, value: Any, expires_at: float, signature: Tuple, shingles: FrozenSet[int]):
+        self.value = value
+        self.expires_at = expires_at
+        self.signature = signature
+        self.shingles = shingles
+
+
+class SemanticCache:
+    """LRU+TTL кеш: точное совпадение по хешу, затем поиск почти-дубликата среди записей с той же сигнатурой"""
+
+    def __init__(self, maxsize: int = 5000, ttl: float = 6 * 3600, similarity: float = 0.85):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity = similarity
+
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._by_signature: Dict[Tuple, Set[str]] = {}
+
+        self.stats = {
+            'exact_hits': 0,
+            'near_hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+
+    @staticmethod
+    def key_for(text: str, namespace: str = '') -> str:
+        normalized = normalize_text(text)
+        return hashlib.sha1(f"{namespace}\x00{normalized}".encode('utf-8')).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_signature.get(entry.signature)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_signature[entry.signature]
+
+    def get(self, text: str, namespace: str = '') -> Tuple[Optional[Any], Optional[str]]:
+        """
+        Поиск в кеше
+
+        Returns:
+            (значение или None, 'exact' / 'near' / None)
+        """
+        now = time.monotonic()
+        key = self.key_for(text, namespace)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.stats['exact_hits'] += 1
+                return entry.value, 'exact'
+            self._drop(key)
+
+        signature = (namespace,) + text_signature(text)
+        candidates = self._by_signature.get(signature)
+        if candidates:
+            shingles = text_shingles(normalize_text(text))
+            best_key, best_score = None, self.similarity
+            for candidate_key in list(candidates):
+                candidate = self._entries[candidate_key]
+                if candidate.expires_at <= now:
+                    self._drop(candidate_key)
+                    continue
+                score = jaccard(shingles, candidate.shingles)
+                if score >= best_score:
+                    best_key, best_score = candidate_key, score
+
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                self.stats['near_hits'] += 1
+                return self._entries[best_key].value, 'near'
+
+        self.stats['misses'] += 1
+        return None, None
+
+    def put(self, text: str, value: Any, namespace: str = '', ttl: float = None):
+        """Сохранение ответа в кеш"""
+        key = self.key_for(text, namespace)
+        self._drop(key)
+
+        signature = (namespace,) + text_signature(text)
+        self._entries[key] = _Entry(
+            value,
+            time.monotonic() + (ttl if ttl is not None else self.ttl),
+            signature,
+            text_shingles(normalize_text(text))
+        )
+        self._by_signature.setdefault(signature, set()).add(key)
+
+        while len(self._entries) > self.maxsize:
+            oldest_key = next(iter(self._entries))
+            self._drop(oldest_key)
+            self.stats['evictions'] += 1
+
+    def hit_ratio(self) -> float:
+        hits = self.stats['exact_hits'] + self.stats['near_hits']
+        return hits / max(hits + self.stats['misses'], 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'size': len(self._entries), 'hit_ratio': self.hit_ratio()}
+
+
+class RequestCoalescer:
+    """Одновременные запросы с одинаковым ключом ждут один общий вызов"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: отмена одного ожидающего не отменяет общий вызов
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(factory())
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+def dhash(image_data: bytes, hash_size: int = 8) -> int:
+    """
+    Разностный перцептивный хеш (dHash) изображения
+    Устойчив к пересжатию, масштабированию и мелким правкам скриншота
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_data)) as image:
+        image.draft('L', (hash_size * 4, hash_size * 4))  # быстрый downscale для JPEG
+        small = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = list(small.getdata())
+
+    value = 0
+    width = hash_size + 1
+    for row in range(hash_size):
+        offset = row * width
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+class ImageHashCache:
+    """
+    LRU+TTL кеш по перцептивному хешу: совпадение при расстоянии Хэмминга <= max_distance
+    64-битный хеш режется на 8 байтовых полос - при max_distance < 8 хотя бы одна полоса совпадает точно
+    """
+
+    _BANDS = 8
+
+    def __init__(self, maxsize: int = 2000, ttl: float = 24 * 3600, max_distance: int = 6):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_distance = min(max_distance, self._BANDS - 1)
+
+        self._entries: 'OrderedDict[Tuple[str, int], Tuple[Any, float]]' = OrderedDict()
+        self._bands: Dict[Tuple[str, int, int], Set[int]] = {}
+
+        self.stats = {
+            'exact_hits': 0,
+            'near_hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+
+    @classmethod
+    def _band_keys(cls, namespace: str, image_hash: int):
+        return [(namespace, band, (image_hash >> (band * 8)) & 0xFF) for band in range(cls._BANDS)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: Tuple[str, int]):
+        if self._entries.pop(key, None) is None:
+            return
+        namespace, image_hash = key
+        for band_key in self._band_keys(namespace, image_hash):
+            hashes = self._bands.get(band_key)
+            if hashes is not None:
+                hashes.discard(image_hash)
+                if not hashes:
+                    del self._bands[band_key]
+
+    def get(self, image_hash: int, namespace: str = '') -> Tuple[Optional[Any], Optional[str]]:
+        """(значение или None, 'exact' / 'near' / None)"""
+        now = time.monotonic()
+
+        entry = self._entries.get((namespace, image_hash))
+        if entry is not None:
+            if entry[1] > now:
+                self._entries.move_to_end((namespace, image_hash))
+                self.stats['exact_hits'] += 1
+                return entry[0], 'exact'
+            self._drop((namespace, image_hash))
+
+        candidates: Set[int] = set()
+        for band_key in self._band_keys(namespace, image_hash):
+            candidates.update(self._bands.get(band_key, ()))
+
+        best_hash, best_distance = None, self.max_distance + 1
+        for candidate in candidates:
+            distance = bin(candidate ^ image_hash).count('1')
+            if distance < best_distance:
+                best_hash, best_distance = candidate, distance
+
+        if best_hash is not None:
+            key = (namespace, best_hash)
+            value, expires_at = self._entries[key]
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.stats['near_hits'] += 1
+                return value, 'near'
+            self._drop(key)
+
+        self.stats['misses'] += 1
+        return None, None
+
+    def put(self, image_hash: int, value: Any, namespace: str = '', ttl: float = None):
+        key = (namespace, image_hash)
+        self._drop(key)
+        self._entries[key] = (value, time.monotonic() + (ttl if ttl is not None else self.ttl))
+        for band_key in self._band_keys(namespace, image_hash):
+            self._bands.setdefault(band_key, set()).add(image_hash)
+
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+            self.stats['evictions'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = self.stats['exact_hits'] + self.stats['near_hits']
+        return {**self.stats, 'size': len(self._entries), 'hit_ratio': hits / max(hits + self.stats['misses'], 1)}
@@ -11,6 +11,8 @@ import asyncio
 from typing import Dict, List, Optional, Any, Union
 from datetime import datetime
 
+from .ai_cache import RequestCoalescer, SemanticCache
+
 logger = logging.getLogger(__name__)
 
 class AIFallbackParser:
@@ -19,6 +21,8 @@ class AIFallbackParser:
     def __init__(self):
         self.openai_client = None
         self.gemini_client = None
+        # HTTP клиент к локальной заглушке моделей (GHOST_AI_STUB_URL) - для офлайн-тестов
+        self.stub_client = None
         
         # Инициализируем доступные AI клиенты
         self._initialize_ai_clients()
@@ -29,9 +33,26 @@ class AIFallbackParser:
             "gemini": self._get_gemini_prompt()
         }
         
+        # Кеш ответов: точный хеш нормализованного текста + почти-дубликаты (GHOST_AI_CACHE_SIZE=0 - выключен)
+        cache_size = int(os.getenv("GHOST_AI_CACHE_SIZE", "5000") or 0)
+        self.cache = SemanticCache(
+            maxsize=cache_size,
+            ttl=float(os.getenv("GHOST_AI_CACHE_TTL", "21600")),
+            similarity=float(os.getenv("GHOST_AI_NEAR_DUP", "0.85"))
+        ) if cache_size > 0 else None
+        
+        # Одинаковые одновременные запросы ждут один вызов модели
+        self.coalescer = RequestCoalescer()
+        
+        # Ограничение параллельных вызовов моделей
+        self.max_concurrency = max(1, int(os.getenv("GHOST_AI_MAX_CONCURRENCY", "4") or 4))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        
         # Статистика AI парсинга
         self.ai_stats = {
             "total_requests": 0,
+            "ai_calls": 0,
+            "cache_hits": 0,
             "openai_success": 0,
             "gemini_success": 0,
             "failures": 0,
@@ -43,6 +64,14 @@ class AIFallbackParser:
     def _initialize_ai_clients(self):
         """Инициализация AI клиентов"""
         
+        # Локальная заглушка вместо реальных API
+        stub_url = os.getenv("GHOST_AI_STUB_URL")
+        if stub_url:
+            from .ai_stub import StubModelClient
+            self.stub_client = StubModelClient(stub_url)
+            logger.info(f"✅ AI stub backend: {stub_url}")
+            return
+        
         # OpenAI GPT
         try:
             import openai
@@ -144,31 +173,58 @@ Text:
     
     async def parse_with_ai(self, text: str, 
                            preferred_ai: str = "openai") -> Optional[Dict[str, Any]]:
-        """Основная функция AI парсинга"""
+        """Основная функция AI парсинга (кеш -> склейка одинаковых запросов -> модель)"""
         
         self.ai_stats["total_requests"] += 1
         
+        if self.cache is not None:
+            cached, hit_type = self.cache.get(text)
+            if cached is not None:
+                self.ai_stats["cache_hits"] += 1
+                logger.debug(f"♻️ AI cache {hit_type} hit: {cached.get('symbol', 'N/A')}")
+                return {**cached, "ai_cache": hit_type}
+        
+        result = await self.coalescer.run(
+            SemanticCache.key_for(text),
+            lambda: self._parse_uncached(text, preferred_ai)
+        )
+        return dict(result) if result else None
+    
+    async def _parse_uncached(self, text: str, preferred_ai: str) -> Optional[Dict[str, Any]]:
+        """Вызов моделей с ограничением параллельности и сохранением успешного ответа в кеш"""
+        async with self._semaphore:
+            result = await self._call_models(text, preferred_ai)
+        
+        if result and self.cache is not None:
+            self.cache.put(text, result)
+        return result
+    
+    async def _call_models(self, text: str, preferred_ai: str) -> Optional[Dict[str, Any]]:
+        """Предпочтительная модель, затем вторая как fallback"""
+        
+        self.ai_stats["ai_calls"] += 1
+        
         # Попробуем предпочтительный AI
-        if preferred_ai == "openai" and self.openai_client:
+        if preferred_ai == "openai" and self._has_backend("openai"):
             result = await self._parse_with_openai(text)
             if result:
                 self.ai_stats["openai_success"] += 1
                 return result
         
-        elif preferred_ai == "gemini" and self.gemini_client:
+        elif preferred_ai == "gemini" and self._has_backend("gemini"):
             result = await self._parse_with_gemini(text)
             if result:
                 self.ai_stats["gemini_success"] += 1
                 return result
         
         # Fallback на другой AI
-        if preferred_ai == "openai" and self.gemini_client:
+        if preferred_ai == "openai" and self._has_backend("gemini"):
             result = await self._parse_with_gemini(text)
             if result:
                 self.ai_stats["gemini_success"] += 1
                 return result
         
-        elif preferred_ai == "gemini" and self.openai_client:
+        elif preferred_ai == "gemini" and self._has_backend("openai"):
             result = await self._parse_with_openai(text)
             if result:
                 self.ai_stats["openai_success"] += 1
@@ -177,32 +233,40 @@ Text:
         self.ai_stats["failures"] += 1
         return None
     
+    def _has_backend(self, provider: str) -> bool:
+        if self.stub_client:
+            return True
+        return (self.openai_client if provider == "openai" else self.gemini_client) is not None
+    
     async def _parse_with_openai(self, text: str) -> Optional[Dict[str, Any]]:
         """Парсинг через OpenAI GPT"""
         try:
-            if not self.openai_client:
+            if not self._has_backend("openai"):
                 return None
             
             prompt = self.prompts["openai"] + text
             
-            response = await self.openai_client.ChatCompletion.acreate(
-                model="gpt-4o",  # Используем новую модель
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "You are a precise crypto trading signal parser. Return only valid JSON."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                max_tokens=500,
-                temperature=0.1,
-                response_format={"type": "json_object"}  # Принудительный JSON
-            )
-            
-            result_text = response.choices[0].message.content.strip()
+            if self.stub_client:
+                result_text = (await self.stub_client.complete("openai", prompt, model="gpt-4o")).strip()
+            else:
+                response = await self.openai_client.ChatCompletion.acreate(
+                    model="gpt-4o",  # Используем новую модель
+                    messages=[
+                        {
+                            "role": "system", 
+                            "content": "You are a precise crypto trading signal parser. Return only valid JSON."
+                        },
+                        {
+                            "role": "user", 
+                            "content": prompt
+                        }
+                    ],
+                    max_tokens=500,
+                    temperature=0.1,
+                    response_format={"type": "json_object"}  # Принудительный JSON
+                )
+                
+                result_text = response.choices[0].message.content.strip()
             
             # Парсим JSON
             try:
@@ -227,21 +291,24 @@ Text:
     async def _parse_with_gemini(self, text: str) -> Optional[Dict[str, Any]]:
         """Парсинг через Google Gemini"""
         try:
-            if not self.gemini_client:
+            if not self._has_backend("gemini"):
                 return None
             
             prompt = self.prompts["gemini"] + text
             
-            model = self.gemini_client.GenerativeModel('gemini-1.5-pro')
-            response = await model.generate_content_async(
-                prompt,
-                generation_config={
-                    "temperature": 0.1,
-                    "max_output_tokens": 500,
-                }
-            )
-            
-            result_text = response.text.strip()
+            if self.stub_client:
+                result_text = (await self.stub_client.complete("gemini", prompt, model="gemini-1.5-pro")).strip()
+            else:
+                model = self.gemini_client.GenerativeModel('gemini-1.5-pro')
+                response = await model.generate_content_async(
+                    prompt,
+                    generation_config={
+                        "temperature": 0.1,
+                        "max_output_tokens": 500,
+                    }
+                )
+                
+                result_text = response.text.strip()
             
             # Парсим JSON
             try:
@@ -340,21 +407,31 @@ Text:
         """Получение статистики AI парсинга"""
         stats = self.ai_stats.copy()
         
-        if stats["total_requests"] > 0:
-            success_rate = (stats["openai_success"] + stats["gemini_success"]) / stats["total_requests"]
+        if stats["ai_calls"] > 0:
+            success_rate = (stats["openai_success"] + stats["gemini_success"]) / stats["ai_calls"]
             stats["success_rate"] = success_rate
         else:
             stats["success_rate"] = 0.0
         
+        stats["coalesced"] = self.coalescer.coalesced
+        stats["max_concurrency"] = self.max_concurrency
+        if self.cache is not None:
+            stats["cache"] = self.cache.get_stats()
+        
         return stats
     
     def is_available(self) -> Dict[str, bool]:
         """Проверка доступности AI сервисов"""
         return {
-            "openai": self.openai_client is not None,
-            "gemini": self.gemini_client is not None,
-            "any_available": self.openai_client is not None or self.gemini_client is not None
+            "openai": self._has_backend("openai"),
+            "gemini": self._has_backend("gemini"),
+            "any_available": self._has_backend("openai") or self._has_backend("gemini")
         }
+    
+    async def close(self):
+        """Закрытие HTTP сессии заглушки"""
+        if self.stub_client:
+            await self.stub_client.close()
 
 
 # Глобальный экземпляр AI парсера
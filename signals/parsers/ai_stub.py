@@ -0,0 +1,273 @@
+"""
+GHOST AI Stub
+Локальный сервер-заглушка моделей (OpenAI / Gemini совместимые эндпоинты) для офлайн-тестов
+Отвечает детерминированно через UniversalFallbackParser с настраиваемой задержкой
+
+Запуск:
+    python -m signals.parsers.ai_stub --port 8765 --latency 0.8
+    GHOST_AI_STUB_URL=http://127.0.0.1:8765 python ...
+
+Проверка кеша AIFallbackParser (поднимает сервер сам и печатает hit ratio):
+    python -m signals.parsers.ai_stub --demo 500
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Маркеры, после которых в промптах AIFallbackParser идет сам текст сообщения
+_PROMPT_MARKERS = ("TEXT TO ANALYZE:", "\nText:\n")
+
+# Промпт ImageSignalParser: по картинке заглушка "видит" только подпись
+_CAPTION_MARKER = "CAPTION CONTEXT:"
+_CAPTION_END = "EXTRACT THE FOLLOWING"
+
+
+def _message_text(prompt: str) -> str:
+    position = prompt.find(_CAPTION_MARKER)
+    if position != -1:
+        end = prompt.find(_CAPTION_END, position)
+        return prompt[position + len(_CAPTION_MARKER):end if end != -1 else None].strip()
+
+    for marker in _PROMPT_MARKERS:
+        position = prompt.rfind(marker)
+        if position != -1:
+            return prompt[position + len(marker):].strip()
+    return prompt.strip()
+
+
+_fallback_parser = None
+
+
+def fake_model_answer(prompt: str) -> Dict[str, Any]:
+    """Детерминированный "ответ модели" в формате промпта AIFallbackParser"""
+    global _fallback_parser
+    if _fallback_parser is None:
+        from signals.parsers.universal_fallback_parser import UniversalFallbackParser
+        _fallback_parser = UniversalFallbackParser()
+
+    text = _message_text(prompt)
+    parser = _fallback_parser
+    signal = parser.parse_signal(text, "ai_stub") if parser.can_parse(text) else None
+
+    if signal is None or signal.direction is None:
+        return {"is_signal": False}
+
+    entry = signal.entry_zone or ([signal.entry_single] if signal.entry_single else [])
+    return {
+        "is_signal": True,
+        "symbol": signal.symbol,
+        "side": "LONG" if signal.direction.value in ("LONG", "BUY") else "SHORT",
+        "entry": entry,
+        "targets": signal.targets,
+        "stop_loss": signal.stop_loss,
+        "leverage": signal.leverage,
+        "reason": signal.reason,
+        "confidence": round(signal.confidence, 2)
+    }
+
+
+class StubModelServer:
+    """aiohttp приложение, имитирующее OpenAI chat completions и Gemini generateContent"""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, fail_rate: float = 0.0,
+                 provider_latency: Optional[Dict[str, float]] = None):
+        self.latency = latency
+        # Отдельная задержка на провайдера - для проверки гонки моделей
+        self.provider_latency = provider_latency or {}
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.requests = {'openai': 0, 'gemini': 0}
+        self.runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_post('/v1/chat/completions', self.handle_openai)
+        self.app.router.add_post('/v1beta/models/{model}:generateContent', self.handle_gemini)
+        self.app.router.add_get('/stats', self.handle_stats)
+
+    async def _answer(self, provider: str, prompt: str) -> Optional[str]:
+        self.requests[provider] += 1
+        latency = self.provider_latency.get(provider, self.latency)
+        await asyncio.sleep(max(0.0, latency + random.uniform(-self.jitter, self.jitter)))
+        if self.fail_rate and random.random() < self.fail_rate:
+            return None
+        return json.dumps(fake_model_answer(prompt), ensure_ascii=False)
+
+    async def handle_openai(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        content = body['messages'][-1]['content']
+        if isinstance(content, list):
+            content = ' '.join(part.get('text', '') for part in content if part.get('type') == 'text')
+
+        answer = await self._answer('openai', content)
+        if answer is None:
+            return web.json_response({'error': {'message': 'stub failure'}}, status=503)
+        return web.json_response({'choices': [{'message': {'role': 'assistant', 'content': answer}}]})
+
+    async def handle_gemini(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        parts = body['contents'][-1]['parts']
+        prompt = ' '.join(part.get('text', '') for part in parts if 'text' in part)
+
+        answer = await self._answer('gemini', prompt)
+        if answer is None:
+            return web.json_response({'error': {'message': 'stub failure'}}, status=503)
+        return web.json_response({'candidates': [{'content': {'parts': [{'text': answer}]}}]})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.requests)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765) -> str:
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        url = f"http://{host}:{bound_port}"
+        logger.info(f"✅ AI stub server listening on {url}")
+        return url
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+class StubModelClient:
+    """HTTP клиент к заглушке (или любому совместимому эндпоинту) вместо SDK"""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        return self._session
+
+    async def complete(self, provider: str, prompt: str, model: str = "stub",
+                       images: List[Dict[str, Any]] = None) -> str:
+        """Текст ответа модели (ошибки HTTP поднимаются как исключения)"""
+        session = await self._get_session()
+
+        if provider == 'gemini':
+            parts = [{'text': prompt}] + [{'inline_data': image} for image in images or []]
+            url = f"{self.base_url}/v1beta/models/{model}:generateContent"
+            async with session.post(url, json={'contents': [{'parts': parts}]}) as response:
+                response.raise_for_status()
+                data = await response.json()
+            return data['candidates'][0]['content']['parts'][0]['text']
+
+        content: Any = prompt
+        if images:
+            content = [{'type': 'text', 'text': prompt}] + [
+                {'type': 'image_url', 'image_url': {'url': f"data:{image['mime_type']};base64,{image['data']}"}}
+                for image in images
+            ]
+        payload = {'model': model, 'messages': [{'role': 'user', 'content': content}]}
+        async with session.post(f"{self.base_url}/v1/chat/completions", json=payload) as response:
+            response.raise_for_status()
+            data = await response.json()
+        return data['choices'][0]['message']['content']
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+
+def _demo_corpus(size: int, seed: int = 42) -> List[str]:
+    """Корпус с репостами и слегка измененными копиями (эмодзи, пробелы, регистр)"""
+    from scripts.benchmark_parsers import generate_corpus
+
+    rng = random.Random(seed)
+    originals = generate_corpus(size=max(size // 3, 1), seed=seed)
+    corpus = []
+    for _ in range(size):
+        text = rng.choice(originals)
+        variant = rng.random()
+        if variant < 0.3:
+            text = text + " 🚀🚀"
+        elif variant < 0.5:
+            text = "  " + text.replace("\n", " \n ")
+        elif variant < 0.6:
+            text = "Forwarded: " + text
+        corpus.append(text)
+    return corpus
+
+
+async def run_demo(size: int, latency: float, concurrency: int):
+    """Прогон AIFallbackParser через заглушку и отчет по кешу"""
+    import os
+    import time
+
+    server = StubModelServer(latency=latency)
+    url = await server.start(port=0)
+    os.environ['GHOST_AI_STUB_URL'] = url
+
+    from signals.parsers.ai_fallback_parser import AIFallbackParser
+
+    parser = AIFallbackParser()
+    corpus = _demo_corpus(size)
+    queue = list(corpus)
+
+    async def worker():
+        while queue:
+            await parser.parse_with_ai(queue.pop())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stats = parser.get_ai_stats()
+    print(f"📊 Messages: {len(corpus)} in {elapsed:.2f}s ({len(corpus) / elapsed:.1f} msg/s)")
+    print(f"   Model requests: {server.requests}")
+    print(f"   Cache: {json.dumps(stats.get('cache', {}), ensure_ascii=False)}")
+    print(f"   Coalesced: {stats.get('coalesced', 0)}")
+
+    await parser.close()
+    await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GHOST local AI model stub")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help="Задержка ответа модели, сек")
+    parser.add_argument('--openai-latency', type=float, default=None)
+    parser.add_argument('--gemini-latency', type=float, default=None)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--demo', type=int, default=0, help="Прогнать N сообщений через AIFallbackParser")
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR if args.demo else logging.INFO)
+
+    if args.demo:
+        asyncio.run(run_demo(args.demo, args.latency, args.concurrency))
+        return
+
+    async def serve():
+        provider_latency = {name: value for name, value in
+                            (('openai', args.openai_latency), ('gemini', args.gemini_latency)) if value is not None}
+        server = StubModelServer(args.latency, args.jitter, args.fail_rate, provider_latency)
+        await server.start(args.host, args.port)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
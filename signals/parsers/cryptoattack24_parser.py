@@ -263,6 +263,46 @@ class CryptoAttack24Parser:
             'pattern_count': sum(len(patterns) for patterns in self.patterns.values())
         }
 
+class CryptoAttack24Wrapper:
+    """Wrapper для совместимости с SignalParserBase (can_parse/parse_signal -> ParsedSignal)"""
+    
+    def __init__(self):
+        self.parser = CryptoAttack24Parser()
+        self.source_name = "cryptoattack24"
+    
+    def can_parse(self, text: str) -> bool:
+        return self.parser._is_noise(text) == False and len(text.strip()) > 20
+    
+    def parse_signal(self, text: str, trader_id: str):
+        result = self.parser.parse_message(text)
+        if result and result.confidence >= 0.6:
+            # Конвертируем в ParsedSignal формат
+            return self._convert_to_parsed_signal(result, trader_id, text)
+        return None
+    
+    def _convert_to_parsed_signal(self, ca24_signal, trader_id: str, raw_text: str):
+        from .signal_parser_base import ParsedSignal, SignalDirection
+        
+        # Определяем направление на основе действия
+        direction = SignalDirection.BUY if ca24_signal.action in ["pump", "growth"] else SignalDirection.SELL
+        
+        signal = ParsedSignal(
+            signal_id=f"{trader_id}_{int(datetime.now().timestamp())}",
+            source="cryptoattack24",
+            trader_id=trader_id,
+            raw_text=raw_text,
+            timestamp=ca24_signal.timestamp or datetime.now(),
+            symbol=ca24_signal.symbol,
+            direction=direction
+        )
+        
+        # Дополнительные поля
+        signal.confidence = ca24_signal.confidence
+        signal.reason = ca24_signal.context
+        signal.is_valid = True
+        
+        return signal
+
 # Функция для тестирования парсера
 def test_cryptoattack24_parser():
     """Тестирование парсера с примерами сообщений"""
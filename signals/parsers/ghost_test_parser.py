@@ -23,6 +23,12 @@ try:
 except ImportError:
     IMAGE_PARSER_AVAILABLE = False
 
+# Локальный OCR для скриншотов (pytesseract + tesseract-ocr)
+try:
+    from .image_ocr import OCR_AVAILABLE, ocr_image
+except ImportError:
+    OCR_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 class GhostTestParser(SignalParserBase):
@@ -128,10 +134,10 @@ class GhostTestParser(SignalParserBase):
             
             # Сначала пробуем парсить изображение если есть
             image_signal_data = None
-            if image_data and self.image_parser:
+            if image_data and (self.image_parser or OCR_AVAILABLE):
                 try:
                     logger.info("🖼️ Attempting to parse image signal...")
-                    # Для совместимости пока делаем синхронно - создаем простую заглушку
+                    # Синхронный путь: локальный OCR + подпись (AI модели - через ImageSignalParser)
                     image_signal_data = self._parse_image_signal_sync(image_data, image_format, text)
                     if image_signal_data:
                         logger.info("✅ Image signal data extracted successfully")
@@ -238,13 +244,14 @@ class GhostTestParser(SignalParserBase):
             return None
     
     def _parse_image_signal_sync(self, image_data: bytes, image_format: str, caption: str = "") -> Optional[Dict[str, Any]]:
-        """Синхронный парсинг изображения (базовая версия)"""
-        if not self.image_parser:
+        """
+        Синхронный парсинг изображения: локальный OCR, затем подпись для недостающих полей
+        OCR блокирует на сотни миллисекунд - из async кода parse_signal с image_data вызывать через asyncio.to_thread
+        """
+        if not self.image_parser and not OCR_AVAILABLE:
             return None
             
         try:
-            # Простая заглушка для изображений - извлекаем базовую информацию
-            # В будущем можно добавить OCR или другие методы
             result = {
                 'symbol': None,
                 'direction': None,  
@@ -257,20 +264,39 @@ class GhostTestParser(SignalParserBase):
                 'has_image': True
             }
             
+            # Текст со скриншота через локальный OCR и те же экстракторы, что и для текста
+            ocr = ocr_image(image_data) if OCR_AVAILABLE else None
+            if ocr and ocr.text:
+                ocr_text = self.clean_text(ocr.text)
+                direction = self.extract_direction_ghost(ocr_text)
+                result.update({
+                    'symbol': self.extract_symbol_ghost(ocr_text),
+                    'direction': direction.value if direction else None,
+                    'entry_prices': self.extract_entry_prices_ghost(ocr_text),
+                    'targets': self.extract_targets_ghost(ocr_text),
+                    'stop_loss': self.extract_stop_loss_ghost(ocr_text),
+                    'leverage': self.extract_leverage_ghost(ocr_text),
+                    'confidence': ocr.confidence,
+                    'parse_method': 'image_ocr',
+                    'ocr_text': ocr.text
+                })
+                logger.info(f"🔎 Extracted from image OCR: symbol={result['symbol']}, direction={result['direction']}")
+            
             # Если есть caption (подпись к изображению) - пробуем извлечь из неё данные
             if caption and len(caption) > 10:
                 caption_upper = caption.upper()
                 
                 # Ищем символ в подписи
                 crypto_mentions = re.findall(r'#?([A-Z]{2,10})', caption_upper)
-                if crypto_mentions:
+                if crypto_mentions and not result['symbol']:
                     result['symbol'] = crypto_mentions[0]
                 
                 # Ищем направление в подписи
-                if re.search(r'\b(LONG|BUY|LONGING)\b', caption_upper):
-                    result['direction'] = 'LONG'
-                elif re.search(r'\b(SHORT|SELL|SHORTING)\b', caption_upper):
-                    result['direction'] = 'SHORT'
+                if not result['direction']:
+                    if re.search(r'\b(LONG|BUY|LONGING)\b', caption_upper):
+                        result['direction'] = 'LONG'
+                    elif re.search(r'\b(SHORT|SELL|SHORTING)\b', caption_upper):
+                        result['direction'] = 'SHORT'
                 
                 logger.info(f"📝 Extracted from image caption: symbol={result.get('symbol')}, direction={result.get('direction')}")
             
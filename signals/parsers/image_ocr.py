@@ -0,0 +1,124 @@
+"""
+GHOST Image OCR
+Локальный OCR скриншотов сигналов (Tesseract) без сети и GPU
+Предобработка: grayscale, инверсия темной темы, upscale мелких картинок, бинаризация по Otsu
+"""
+
+import io
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Tesseract опционален: нужен pytesseract и бинарник tesseract-ocr в системе
+try:
+    import pytesseract
+    pytesseract.get_tesseract_version()
+    OCR_AVAILABLE = True
+except Exception:
+    pytesseract = None
+    OCR_AVAILABLE = False
+
+# psm 6 - единый блок текста (типичная карточка сигнала), цифры и тикеры без словаря
+DEFAULT_TESSERACT_CONFIG = "--oem 1 --psm 6 -c load_system_dawg=0 -c load_freq_dawg=0"
+
+
+@dataclass
+class OcrResult:
+    """Результат распознавания"""
+    text: str
+    confidence: float  # средняя уверенность по словам, 0.0-1.0
+    elapsed: float
+
+
+def _otsu_threshold(image: Image.Image) -> int:
+    """Порог бинаризации по Otsu из гистограммы (без numpy)"""
+    histogram = image.histogram()[:256]
+    total = sum(histogram)
+    sum_total = sum(i * count for i, count in enumerate(histogram))
+
+    sum_background, weight_background = 0.0, 0
+    best_threshold, best_variance = 127, 0.0
+    for level, count in enumerate(histogram):
+        weight_background += count
+        if weight_background == 0:
+            continue
+        weight_foreground = total - weight_background
+        if weight_foreground == 0:
+            break
+        sum_background += level * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_total - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = level, variance
+    return best_threshold
+
+
+def preprocess_image(image_data: bytes, min_width: int = 1200) -> Image.Image:
+    """Подготовка скриншота к OCR: темный текст на белом фоне, достаточное разрешение"""
+    with Image.open(io.BytesIO(image_data)) as image:
+        gray = ImageOps.exif_transpose(image).convert('L')
+
+    # Темная тема Telegram/бирж - инвертируем, Tesseract лучше читает темный текст на светлом
+    if sum(i * c for i, c in enumerate(gray.histogram())) / max(gray.width * gray.height, 1) < 128:
+        gray = ImageOps.invert(gray)
+
+    if gray.width < min_width:
+        scale = min(4.0, min_width / max(gray.width, 1))
+        gray = gray.resize((int(gray.width * scale), int(gray.height * scale)), Image.LANCZOS)
+
+    gray = ImageOps.autocontrast(gray, cutoff=1)
+    threshold = _otsu_threshold(gray)
+    return gray.point(lambda value: 255 if value > threshold else 0, mode='1')
+
+
+def ocr_image(image_data: bytes, lang: Optional[str] = None,
+              config: str = DEFAULT_TESSERACT_CONFIG) -> Optional[OcrResult]:
+    """Распознавание текста скриншота (None если OCR недоступен или картинка не читается)"""
+    if not OCR_AVAILABLE:
+        return None
+
+    started = time.perf_counter()
+    try:
+        image = preprocess_image(image_data)
+        data = pytesseract.image_to_data(
+            image,
+            lang=lang or os.getenv("GHOST_OCR_LANG", "eng"),
+            config=config,
+            output_type=pytesseract.Output.DICT
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Local OCR failed: {e}")
+        return None
+
+    # Собираем строки по (block, par, line) и считаем среднюю уверенность по словам
+    lines: List[str] = []
+    current_line = None
+    confidences = []
+    for word, conf, block, par, line in zip(data['text'], data['conf'], data['block_num'],
+                                            data['par_num'], data['line_num']):
+        word = word.strip()
+        if not word:
+            continue
+        key = (block, par, line)
+        if key != current_line:
+            lines.append(word)
+            current_line = key
+        else:
+            lines[-1] += ' ' + word
+        conf = float(conf)
+        if conf >= 0:
+            confidences.append(conf)
+
+    text = '\n'.join(lines)
+    confidence = (sum(confidences) / len(confidences) / 100.0) if confidences else 0.0
+    elapsed = time.perf_counter() - started
+
+    logger.info(f"🔎 Local OCR: {len(text)} chars, confidence {confidence:.0%}, {elapsed * 1000:.0f}ms")
+    return OcrResult(text=text, confidence=confidence, elapsed=elapsed)
@@ -5,7 +5,9 @@ GHOST Image Signal Parser
 
 import os
 import io
+import json
 import base64
+import asyncio
 import logging
 from typing import Optional, Dict, Any, List
 from PIL import Image
@@ -13,6 +15,9 @@ import requests
 from datetime import datetime
 from dotenv import load_dotenv
 
+from .ai_cache import ImageHashCache, dhash, text_signature
+from .image_ocr import OCR_AVAILABLE, ocr_image
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -21,17 +26,55 @@ logger = logging.getLogger(__name__)
 class ImageSignalParser:
     """Парсер сигналов из изображений"""
     
-    def __init__(self):
+    def __init__(self, text_parsers: Optional[List[Any]] = None):
         self.openai_client = None
         self.gemini_client = None
+        # HTTP клиент к локальной заглушке моделей (GHOST_AI_STUB_URL)
+        self.stub_client = None
         
         # Инициализируем AI клиенты
         self._initialize_ai_clients()
         
+        # race - модели параллельно, первый валидный ответ побеждает; best - ждем все и берем лучший
+        self.mode = os.getenv("GHOST_IMAGE_PARSE_MODE", "race")
+        self.deadline = float(os.getenv("GHOST_IMAGE_PARSE_DEADLINE", "20"))
+        
+        # Кеш по перцептивному хешу: репосты и пересжатые скриншоты не идут в модели повторно
+        cache_size = int(os.getenv("GHOST_IMAGE_CACHE_SIZE", "2000") or 0)
+        self.cache = ImageHashCache(
+            maxsize=cache_size,
+            max_distance=int(os.getenv("GHOST_IMAGE_HASH_DISTANCE", "6"))
+        ) if cache_size > 0 else None
+        # Ответ "не сигнал" кешируется коротко (0 - не кешируется): ошибка модели не должна жить сутки
+        self.negative_ttl = float(os.getenv("GHOST_IMAGE_NEGATIVE_TTL", "300") or 0)
+        
+        # Локальный OCR перед AI: текст скриншота идет в обычные текстовые парсеры
+        self.ocr_enabled = OCR_AVAILABLE and os.getenv("GHOST_IMAGE_OCR", "1") != "0"
+        self.ocr_min_confidence = float(os.getenv("GHOST_OCR_MIN_CONFIDENCE", "0.6"))
+        self.ocr_min_text_confidence = float(os.getenv("GHOST_OCR_MIN_TEXT_CONFIDENCE", "0.5"))
+        self._text_parsers = text_parsers
+        
+        self.stats = {
+            "requests": 0,
+            "cache_hits": 0,
+            "ocr_resolved": 0,
+            "ocr_escalated": 0,
+            "race_wins": {"openai": 0, "gemini": 0},
+            "timeouts": 0,
+            "failures": 0
+        }
+        
         logger.info("Image Signal Parser initialized")
     
     def _initialize_ai_clients(self):
         """Инициализация AI клиентов для анализа изображений"""
+        stub_url = os.getenv("GHOST_AI_STUB_URL")
+        if stub_url:
+            from .ai_stub import StubModelClient
+            self.stub_client = StubModelClient(stub_url)
+            logger.info(f"✅ AI stub backend for image analysis: {stub_url}")
+            return
+        
         try:
             # OpenAI для анализа изображений
             try:
@@ -63,39 +106,200 @@ class ImageSignalParser:
     
     async def parse_image_signal(self, image_data: bytes, 
                                image_format: str = "PNG",
-                               telegram_caption: str = "") -> Optional[Dict[str, Any]]:
-        """Парсинг торгового сигнала из изображения"""
+                               telegram_caption: str = "",
+                               mode: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Парсинг торгового сигнала из изображения (кеш по pHash -> гонка моделей или лучший из всех)"""
         try:
             logger.info(f"🖼️ Analyzing image signal, format: {image_format}, caption: {telegram_caption[:50]}...")
+            self.stats["requests"] += 1
             
-            # Пробуем разные AI модели
-            results = []
-            
-            # OpenAI GPT-4 Vision
-            if self.openai_client:
-                openai_result = await self._analyze_with_openai(image_data, telegram_caption)
-                if openai_result:
-                    results.append(("openai", openai_result))
-            
-            # Google Gemini Vision
-            if self.gemini_client:
-                gemini_result = await self._analyze_with_gemini(image_data, telegram_caption)
-                if gemini_result:
-                    results.append(("gemini", gemini_result))
-            
-            # Выбираем лучший результат
-            if results:
-                best_result = self._select_best_result(results)
-                logger.info(f"✅ Image signal parsed successfully with {best_result['ai_model']}")
-                return best_result
-            else:
+            image_hash = None
+            namespace = self._caption_namespace(telegram_caption)
+            if self.cache is not None:
+                try:
+                    image_hash = await asyncio.to_thread(dhash, image_data)
+                except Exception as e:
+                    logger.warning(f"⚠️ Image hash failed, cache skipped: {e}")
+                
+                if image_hash is not None:
+                    cached, hit_type = self.cache.get(image_hash, namespace)
+                    if cached is not None:
+                        self.stats["cache_hits"] += 1
+                        logger.info(f"♻️ Image cache {hit_type} hit: {cached.get('symbol', 'N/A')}")
+                        return {**cached, "image_cache": hit_type}
+            
+            if self.ocr_enabled:
+                result = await self._local_ocr_prepass(image_data, telegram_caption)
+                if result is not None:
+                    self.stats["ocr_resolved"] += 1
+                    self._cache_result(image_hash, result, namespace)
+                    logger.info(f"✅ Image signal resolved by local OCR: {result.get('symbol')} {result.get('side')}")
+                    return result
+                self.stats["ocr_escalated"] += 1
+            
+            backends = self._available_backends()
+            if not backends:
                 logger.warning("⚠️ No AI models available for image analysis")
                 return None
+            
+            if (mode or self.mode) == "race":
+                result = await self._race_models(backends, image_data, telegram_caption)
+            else:
+                result = await self._best_of_models(backends, image_data, telegram_caption)
+            
+            if result is None:
+                self.stats["failures"] += 1
+                logger.warning("⚠️ No AI model returned a result for image")
+                return None
+            
+            self._cache_result(image_hash, result, namespace)
+            
+            logger.info(f"✅ Image signal parsed successfully with {result.get('ai_model')}")
+            return result
                 
         except Exception as e:
             logger.error(f"❌ Error parsing image signal: {e}")
             return None
     
+    def _cache_result(self, image_hash: Optional[int], result: Dict[str, Any], namespace: str):
+        """Сигнал кешируется на обычный TTL, ответ "не сигнал" - на negative_ttl"""
+        if image_hash is None:
+            return
+        if result.get("is_signal"):
+            self.cache.put(image_hash, dict(result), namespace)
+        elif self.negative_ttl > 0:
+            self.cache.put(image_hash, dict(result), namespace, ttl=self.negative_ttl)
+    
+    @property
+    def text_parsers(self) -> List[Any]:
+        if self._text_parsers is None:
+            from .universal_fallback_parser import UniversalFallbackParser
+            self._text_parsers = [UniversalFallbackParser()]
+        return self._text_parsers
+    
+    async def _local_ocr_prepass(self, image_data: bytes, caption: str = "") -> Optional[Dict[str, Any]]:
+        """
+        OCR скриншота + текстовые парсеры
+        None - уверенности не хватает, нужна AI модель
+        """
+        ocr = await asyncio.to_thread(ocr_image, image_data)
+        if ocr is None or not ocr.text or ocr.confidence < self.ocr_min_text_confidence:
+            return None
+        
+        text = f"{caption}\n{ocr.text}" if caption else ocr.text
+        for parser in self.text_parsers:
+            try:
+                if not parser.can_parse(text):
+                    continue
+                signal = parser.parse_signal(text, "image_ocr")
+            except Exception as e:
+                logger.warning(f"⚠️ Text parser failed on OCR text: {e}")
+                continue
+            
+            if signal and signal.is_valid and signal.direction and signal.confidence >= self.ocr_min_confidence:
+                entry = signal.entry_zone or ([signal.entry_single] if signal.entry_single else [])
+                return {
+                    "is_signal": True,
+                    "symbol": signal.symbol,
+                    "side": "LONG" if signal.direction.value in ("LONG", "BUY") else "SHORT",
+                    "entry": entry,
+                    "targets": signal.targets,
+                    "stop_loss": signal.stop_loss,
+                    "leverage": signal.leverage,
+                    "confidence": signal.confidence,
+                    "reason": signal.reason,
+                    "ai_model": "local_ocr",
+                    "ai_confidence": ocr.confidence,
+                    "analysis_method": "local_ocr",
+                    "ocr_text": ocr.text,
+                    "ocr_time": round(ocr.elapsed, 3)
+                }
+        
+        return None
+    
+    @staticmethod
+    def _caption_namespace(caption: str) -> str:
+        """Подпись влияет на ответ модели - в ключ кеша идут ее числа и тикеры"""
+        if not caption:
+            return ""
+        numbers, tickers = text_signature(caption)
+        return f"{','.join(sorted(numbers))}/{','.join(sorted(tickers))}"
+    
+    def _available_backends(self) -> List[tuple]:
+        backends = []
+        if self.openai_client or self.stub_client:
+            backends.append(("openai", self._analyze_with_openai))
+        if self.gemini_client or self.stub_client:
+            backends.append(("gemini", self._analyze_with_gemini))
+        return backends
+    
+    async def _race_models(self, backends: List[tuple], image_data: bytes,
+                           caption: str) -> Optional[Dict[str, Any]]:
+        """
+        Все модели параллельно с общим дедлайном: первый ответ с сигналом побеждает, остальные отменяются
+        Ответ "не сигнал" принимается, только если ни одна модель не нашла сигнал
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.deadline
+        
+        tasks = {asyncio.create_task(analyze(image_data, caption)): name for name, analyze in backends}
+        pending = set(tasks)
+        fallback = None
+        
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.stats["timeouts"] += 1
+                    logger.warning(f"⏱️ Image analysis deadline ({self.deadline}s) exceeded")
+                    break
+                
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if not result:
+                        continue
+                    
+                    name = tasks[task]
+                    if result.get("is_signal"):
+                        self.stats["race_wins"][name] += 1
+                        result["analysis_method"] = "race_ai_vision"
+                        result["models_used"] = [name]
+                        result["race_time"] = round(loop.time() - started, 3)
+                        return result
+                    
+                    if fallback is None:
+                        fallback = (name, result)
+        finally:
+            # SDK вызовы в потоках отменить нельзя - их ответ просто отбрасывается
+            for task in pending:
+                task.cancel()
+        
+        if fallback:
+            name, result = fallback
+            result["analysis_method"] = "race_ai_vision"
+            result["models_used"] = [name]
+            return result
+        
+        return None
+    
+    async def _best_of_models(self, backends: List[tuple], image_data: bytes,
+                              caption: str) -> Optional[Dict[str, Any]]:
+        """Все модели параллельно, выбор ответа с наибольшей confidence"""
+        try:
+            answers = await asyncio.wait_for(
+                asyncio.gather(*(analyze(image_data, caption) for _, analyze in backends)),
+                timeout=self.deadline
+            )
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            logger.warning(f"⏱️ Image analysis deadline ({self.deadline}s) exceeded")
+            return None
+        
+        results = [(name, answer) for (name, _), answer in zip(backends, answers) if answer]
+        return self._select_best_result(results) if results else None
+    
     async def _analyze_with_openai(self, image_data: bytes, caption: str = "") -> Optional[Dict[str, Any]]:
         """Анализ изображения с помощью OpenAI GPT-4 Vision"""
         try:
@@ -105,30 +309,37 @@ class ImageSignalParser:
             # Создаем промпт
             prompt = self._get_image_analysis_prompt(caption)
             
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4-vision-preview",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
+            if self.stub_client:
+                result_text = await self.stub_client.complete(
+                    "openai", prompt, model="gpt-4-vision-preview",
+                    images=[{"mime_type": "image/jpeg", "data": base64_image}]
+                )
+            else:
+                # Синхронный SDK - в отдельном потоке, чтобы не блокировать event loop и гонку моделей
+                response = await asyncio.to_thread(
+                    self.openai_client.chat.completions.create,
+                    model="gpt-4-vision-preview",
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": prompt},
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:image/jpeg;base64,{base64_image}"
+                                    }
                                 }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000,
-                temperature=0.1
-            )
-            
-            result_text = response.choices[0].message.content
+                            ]
+                        }
+                    ],
+                    max_tokens=1000,
+                    temperature=0.1
+                )
+                
+                result_text = response.choices[0].message.content
             
             # Парсим JSON ответ
-            import json
             result = json.loads(result_text)
             result["ai_model"] = "gpt-4-vision"
             result["ai_confidence"] = 0.85
@@ -142,17 +353,22 @@ class ImageSignalParser:
     async def _analyze_with_gemini(self, image_data: bytes, caption: str = "") -> Optional[Dict[str, Any]]:
         """Анализ изображения с помощью Google Gemini Vision"""
         try:
-            # Конвертируем в PIL Image
-            image = Image.open(io.BytesIO(image_data))
-            
             # Создаем промпт
             prompt = self._get_image_analysis_prompt(caption)
             
-            response = self.gemini_client.generate_content([prompt, image])
-            result_text = response.text
+            if self.stub_client:
+                result_text = await self.stub_client.complete(
+                    "gemini", prompt, model="gemini-pro-vision",
+                    images=[{"mime_type": "image/jpeg", "data": base64.b64encode(image_data).decode('utf-8')}]
+                )
+            else:
+                # Конвертируем в PIL Image
+                image = Image.open(io.BytesIO(image_data))
+                
+                response = await asyncio.to_thread(self.gemini_client.generate_content, [prompt, image])
+                result_text = response.text
             
             # Парсим JSON ответ
-            import json
             result = json.loads(result_text)
             result["ai_model"] = "gemini-vision"
             result["ai_confidence"] = 0.80
@@ -208,7 +424,7 @@ RETURN VALID JSON ONLY:
 }
 
 If no trading signal is found, return: {"is_signal": false}
-        """.format(caption=caption if caption else "No caption provided")
+        """.replace("{caption}", caption if caption else "No caption provided")
         
         return base_prompt
     
@@ -233,6 +449,18 @@ If no trading signal is found, return: {"is_signal": false}
             # Возвращаем первый доступный результат
             return results[0][1] if results else {}
     
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика анализа изображений"""
+        stats = {**self.stats, "race_wins": dict(self.stats["race_wins"]), "mode": self.mode}
+        if self.cache is not None:
+            stats["cache"] = self.cache.get_stats()
+        return stats
+    
+    async def close(self):
+        """Закрытие HTTP сессии заглушки"""
+        if self.stub_client:
+            await self.stub_client.close()
+    
     def is_image_message(self, message_data: Dict[str, Any]) -> bool:
         """Проверка, содержит ли сообщение изображение"""
         try:
@@ -327,5 +555,4 @@ async def test_image_parser():
 
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(test_image_parser())
@@ -0,0 +1,380 @@
+"""
+GHOST Parser Executor
+Вынос regex-парсинга в пул рабочих процессов с жестким бюджетом времени на сообщение
+Event loop (Telethon, WebSocket фиды) не блокируется длинными сообщениями и тяжелыми regex
+"""
+
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import fields, is_dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .signal_codec import decode_signal, encode_signal
+from .signal_parser_base import ParsedSignal
+
+logger = logging.getLogger(__name__)
+
+# Парсеры по умолчанию: имя -> "module:Class" (импортируются лениво внутри воркера)
+DEFAULT_PARSER_SPECS = {
+    'ghost_test': 'signals.parsers.ghost_test_parser:GhostTestParser',
+    'cryptoattack24': 'signals.parsers.cryptoattack24_parser:CryptoAttack24Wrapper',
+    'universal_fallback': 'signals.parsers.universal_fallback_parser:UniversalFallbackParser',
+    'comprehensive': 'signals.parsers.parser_executor:ComprehensiveRuleParser',
+}
+
+# Поле, которое не гоняем через pipe - текст у вызывающей стороны уже есть
+_RAW_TEXT_FIELD = 'raw_text'
+
+# Метка результата, упакованного бинарным кодеком ParsedSignal
+_CODEC_MARKER = '@signal_codec'
+
+# Состояние воркера (заполняется один раз при старте процесса)
+_worker_parsers: Dict[str, Any] = {}
+
+
+def spec_for(parser: Any) -> Optional[str]:
+    """Строка "module:Class" для экземпляра парсера (None если класс нельзя импортировать)"""
+    cls = type(parser)
+    if '<locals>' in cls.__qualname__:
+        return None
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def _load_parser(spec: str) -> Any:
+    """Создание экземпляра парсера по строке "module:Class" """
+    module_name, _, class_name = spec.partition(':')
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)()
+
+
+def pack_result(obj: Any) -> Optional[Tuple]:
+    """
+    Компактная упаковка результата парсинга для передачи из воркера:
+    (module, class, значения полей по порядку, дополнительные атрибуты) без raw_text
+    """
+    if obj is None:
+        return None
+
+    cls = type(obj)
+    if not is_dataclass(obj):
+        return ('', '', obj, None)
+
+    field_names = [f.name for f in fields(obj)]
+    extras = {k: v for k, v in vars(obj).items() if k not in field_names} or None
+
+    if cls is ParsedSignal:
+        try:
+            return (_CODEC_MARKER, '', encode_signal(obj, keep_text=False), extras)
+        except (struct.error, TypeError, ValueError, KeyError, AttributeError):
+            pass  # нестандартные значения полей - упаковываем как обычный dataclass
+
+    values = tuple(None if name == _RAW_TEXT_FIELD else getattr(obj, name) for name in field_names)
+
+    return (cls.__module__, cls.__qualname__, values, extras)
+
+
+def unpack_result(packed: Optional[Tuple], raw_text: str = "") -> Any:
+    """Восстановление результата парсинга из компактного кортежа"""
+    if packed is None:
+        return None
+
+    module_name, class_name, values, extras = packed
+    if not module_name:
+        return values
+
+    if module_name == _CODEC_MARKER:
+        obj = decode_signal(values)
+        obj.raw_text = raw_text
+    else:
+        cls = getattr(importlib.import_module(module_name), class_name)
+
+        # Создаем объект без __init__/__post_init__ - значения уже нормализованы в воркере
+        obj = cls.__new__(cls)
+        for f, value in zip(fields(cls), values):
+            setattr(obj, f.name, raw_text if f.name == _RAW_TEXT_FIELD else value)
+
+    # Атрибуты, которые парсеры навешивают после создания (parse_method, detected_trader_style...)
+    if extras:
+        for key, value in extras.items():
+            setattr(obj, key, value)
+
+    return obj
+
+
+def _worker_main(conn, parser_specs: Dict[str, str]):
+    """Цикл рабочего процесса: предзагрузка парсеров и обработка заданий из pipe"""
+    logging.getLogger().setLevel(logging.WARNING)
+
+    for name, spec in parser_specs.items():
+        try:
+            _worker_parsers[name] = _load_parser(spec)
+        except (Exception, SystemExit) as e:
+            logger.warning(f"⚠️ Parser {name} not available in worker: {e}")
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        if job is None:
+            break
+
+        candidates, text, trader_id = job
+        try:
+            conn.send(('ok',) + _select_and_parse(candidates, text, trader_id))
+        except Exception as e:
+            conn.send(('error', None, repr(e)))
+
+
+def _select_and_parse(candidates: List[str], text: str, trader_id: str) -> Tuple[Optional[str], Optional[Tuple]]:
+    """Первый парсер из списка, который может обработать текст, парсит его"""
+    for name in candidates:
+        parser = _worker_parsers.get(name)
+        if parser is None:
+            continue
+        if parser.can_parse(text):
+            return name, pack_result(parser.parse_signal(text, trader_id))
+
+    return None, None
+
+
+class ComprehensiveRuleParser:
+    """Rule-based часть ComprehensiveMessageParser без Telegram/Supabase/AI клиентов"""
+
+    def __init__(self):
+        # Модуль завершает процесс при отсутствии telethon/openai - это ловит воркер
+        from signals.parsers.comprehensive_message_parser import ComprehensiveMessageParser, ParsedMessage
+
+        self.parser = ComprehensiveMessageParser()
+        self.message_cls = ParsedMessage
+        self.handlers = {
+            'trading_signal': self.parser.parse_trading_signal,
+            'news': self.parser.parse_news_message,
+            'whale_alert': self.parser.parse_whale_alert,
+            'analysis': self.parser.parse_analysis_message,
+        }
+
+    def can_parse(self, text: str) -> bool:
+        return bool(text and text.strip())
+
+    def parse_signal(self, text: str, trader_id: str) -> Any:
+        from datetime import datetime
+
+        message_type = self.parser.classify_message_type(text)
+        parsed = self.message_cls(
+            message_id="",
+            trader_id=trader_id,
+            raw_text=text,
+            timestamp=datetime.now(),
+            message_type=message_type
+        )
+
+        handler = self.handlers.get(message_type)
+        if handler:
+            # Обработчики объявлены async, но не ждут I/O - выполняем корутину до конца сразу
+            coro = handler(parsed, text)
+            try:
+                coro.send(None)
+            except StopIteration:
+                pass
+
+        return parsed
+
+
+class _Worker:
+    """Рабочий процесс с собственным pipe"""
+
+    def __init__(self, ctx, parser_specs: Dict[str, str]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, parser_specs), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(timeout=1)
+        except Exception:
+            pass
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=2)
+        except Exception:
+            pass
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class ParserExecutor:
+    """Пул процессов-парсеров с бюджетом времени на каждое сообщение"""
+
+    def __init__(self, parser_specs: Dict[str, str] = None, workers: int = 2,
+                 timeout: float = 2.0, start_method: Optional[str] = None):
+        self.parser_specs = dict(parser_specs or DEFAULT_PARSER_SPECS)
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.ctx = multiprocessing.get_context(start_method)
+
+        self._idle: Optional[asyncio.Queue] = None
+        self._all: List[_Worker] = []
+        # Потоки только ждут ответ в pipe, чтобы не держать event loop
+        self._io_threads: Optional[ThreadPoolExecutor] = None
+        # Остановка / kill+join старых процессов в потоках - join не держит event loop
+        self._reaping: Set[asyncio.Future] = set()
+
+        self.stats = {
+            'jobs': 0,
+            'parsed': 0,
+            'timeouts': 0,
+            'errors': 0,
+            'worker_restarts': 0,
+            'total_parse_time': 0.0
+        }
+
+    @property
+    def is_running(self) -> bool:
+        return self._idle is not None
+
+    async def start(self):
+        """Запуск рабочих процессов (парсеры предзагружаются в каждом)"""
+        if self.is_running:
+            return
+
+        self._idle = asyncio.Queue()
+        self._io_threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="parser-io")
+
+        for _ in range(self.workers):
+            worker = _Worker(self.ctx, self.parser_specs)
+            self._all.append(worker)
+            self._idle.put_nowait(worker)
+
+        logger.info(f"✅ Parser executor started: {self.workers} workers, {self.timeout}s budget per message")
+
+    async def stop(self):
+        """Остановка рабочих процессов"""
+        if not self.is_running:
+            return
+
+        workers, self._all = self._all, []
+        self._idle = None
+        await asyncio.gather(*(asyncio.to_thread(worker.stop) for worker in workers), *self._reaping,
+                             return_exceptions=True)
+        self._io_threads.shutdown(wait=False)
+
+        logger.info("Parser executor stopped")
+
+    def _in_background(self, fn: Callable[[], Any]):
+        """Блокирующая остановка процесса в потоке; future хранится до завершения"""
+        future = asyncio.get_running_loop().run_in_executor(None, fn)
+        self._reaping.add(future)
+        future.add_done_callback(self._reaping.discard)
+
+    def _replace_worker(self, worker: _Worker) -> _Worker:
+        """Убиваем зависший процесс (join - в фоне) и поднимаем новый на его место"""
+        self._in_background(worker.kill)
+        if worker in self._all:
+            self._all.remove(worker)
+
+        replacement = _Worker(self.ctx, self.parser_specs)
+        self._all.append(replacement)
+        self.stats['worker_restarts'] += 1
+        return replacement
+
+    async def select_and_parse(self, candidates: List[str], text: str, trader_id: str,
+                               timeout: float = None) -> Tuple[Optional[str], Any]:
+        """
+        Выбор парсера и парсинг в рабочем процессе
+
+        Returns:
+            (имя сработавшего парсера или None, результат парсинга или None)
+        """
+        if not self.is_running:
+            await self.start()
+
+        budget = timeout if timeout is not None else self.timeout
+        self.stats['jobs'] += 1
+
+        worker = await self._idle.get()
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+
+        try:
+            worker.conn.send((candidates, text, trader_id))
+            ready = await loop.run_in_executor(self._io_threads, worker.conn.poll, budget)
+
+            if not ready:
+                self.stats['timeouts'] += 1
+                logger.warning(f"⏱️ Parse budget exceeded ({budget}s), restarting worker: {text[:50]}...")
+                worker = self._replace_worker(worker)
+                return None, None
+
+            status, parser_name, payload = worker.conn.recv()
+
+        except (EOFError, OSError, BrokenPipeError) as e:
+            self.stats['errors'] += 1
+            logger.error(f"❌ Parser worker died: {e}")
+            worker = self._replace_worker(worker)
+            return None, None
+
+        except asyncio.CancelledError:
+            # Ответ отмененного задания остался бы в pipe и достался следующему - воркер пересоздается
+            worker = self._replace_worker(worker)
+            raise
+
+        finally:
+            self.stats['total_parse_time'] += time.monotonic() - started
+            if self._idle is not None:
+                self._idle.put_nowait(worker)
+            else:
+                # Пул остановлен, пока задание выполнялось
+                self._in_background(worker.stop)
+
+        if status != 'ok':
+            self.stats['errors'] += 1
+            logger.error(f"❌ Parser error in worker: {payload}")
+            return None, None
+
+        result = unpack_result(payload, text)
+        if result is not None:
+            self.stats['parsed'] += 1
+
+        return parser_name, result
+
+    async def parse(self, parser_name: str, text: str, trader_id: str,
+                    timeout: float = None) -> Any:
+        """Парсинг конкретным парсером (с проверкой can_parse)"""
+        _, result = await self.select_and_parse([parser_name], text, trader_id, timeout)
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика пула"""
+        return {
+            **self.stats,
+            'workers': self.workers,
+            'avg_parse_time': self.stats['total_parse_time'] / max(self.stats['jobs'], 1)
+        }
+
+
+def create_parser_executor_from_env(parser_specs: Dict[str, str] = None) -> Optional[ParserExecutor]:
+    """
+    Создание пула по переменным окружения:
+    GHOST_PARSER_WORKERS (0 = выключено), GHOST_PARSER_TIMEOUT (секунды на сообщение)
+    """
+    workers = int(os.getenv('GHOST_PARSER_WORKERS', '0') or 0)
+    if workers <= 0:
+        return None
+
+    timeout = float(os.getenv('GHOST_PARSER_TIMEOUT', '2.0') or 2.0)
+    return ParserExecutor(parser_specs=parser_specs, workers=workers, timeout=timeout)
@@ -10,6 +10,7 @@ from typing import Dict, Type, Optional, Any, List
 from abc import ABC, abstractmethod
 
 from signals.trader_detector import TraderDetector, TraderStyle
+from signals.parsers.whales_crypto_parser import WhalesCryptoParser
 
 logger = logging.getLogger(__name__)
 
@@ -0,0 +1,334 @@
+"""
+GHOST Signal Codec
+Компактное slotted-представление ParsedSignal и бинарный формат на struct
+Словарь/JSON собирается только на границах (Supabase, Redis, render bridge)
+"""
+
+import json
+import math
+import struct
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+from .signal_parser_base import ParsedSignal, SignalDirection
+
+CODEC_VERSION = 1
+
+# Порядок важен: индекс направления пишется одним байтом
+_DIRECTIONS: List[Optional[SignalDirection]] = [None] + list(SignalDirection)
+_DIRECTION_CODES = {direction: code for code, direction in enumerate(_DIRECTIONS)}
+
+# version, flags, direction, n_entry, n_targets, n_errors,
+# timestamp, confidence, entry_single, stop_loss, tp1..tp4
+_HEADER = struct.Struct('<BBBBBBdddddddd')
+
+_FLAG_VALID = 0x01
+_FLAG_HAS_TEXT = 0x02
+_FLAG_NAIVE_TS = 0x04
+
+_NAN = float('nan')
+
+
+def _opt_float(value: Optional[float]) -> float:
+    return _NAN if value is None else float(value)
+
+
+def _from_float(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+def _pack_str(parts: List[bytes], value: Optional[str]):
+    """Строка с префиксом длины (0xFFFFFFFF = None)"""
+    if value is None:
+        parts.append(b'\xff\xff\xff\xff')
+        return
+    data = value.encode('utf-8')
+    parts.append(struct.pack('<I', len(data)))
+    parts.append(data)
+
+
+def _unpack_str(buffer: bytes, offset: int) -> Tuple[Optional[str], int]:
+    (length,) = struct.unpack_from('<I', buffer, offset)
+    offset += 4
+    if length == 0xFFFFFFFF:
+        return None, offset
+    return buffer[offset:offset + length].decode('utf-8'), offset + length
+
+
+@dataclass(slots=True)
+class CompactSignal:
+    """Компактный сигнал: без __dict__, списки -> кортежи, время -> epoch"""
+    signal_id: str
+    source: str
+    trader_id: str
+    symbol: str
+    direction: Optional[SignalDirection]
+    timestamp: float
+    naive_timestamp: bool = True
+    leverage: Optional[str] = None
+    entry_zone: Tuple[float, ...] = ()
+    entry_single: Optional[float] = None
+    targets: Tuple[float, ...] = ()
+    tp1: Optional[float] = None
+    tp2: Optional[float] = None
+    tp3: Optional[float] = None
+    tp4: Optional[float] = None
+    stop_loss: Optional[float] = None
+    reason: Optional[str] = None
+    confidence: float = 0.0
+    is_valid: bool = True
+    parse_errors: Tuple[str, ...] = ()
+    raw_text: Optional[str] = None
+
+    @classmethod
+    def from_parsed(cls, signal: ParsedSignal, keep_text: bool = True) -> 'CompactSignal':
+        """Сжатие ParsedSignal (raw_text можно отбросить для окон в памяти)"""
+        timestamp = signal.timestamp or datetime.now()
+        return cls(
+            signal_id=signal.signal_id,
+            source=signal.source,
+            trader_id=signal.trader_id,
+            symbol=signal.symbol,
+            direction=signal.direction,
+            timestamp=timestamp.timestamp(),
+            naive_timestamp=timestamp.tzinfo is None,
+            leverage=signal.leverage,
+            entry_zone=tuple(signal.entry_zone or ()),
+            entry_single=signal.entry_single,
+            targets=tuple(signal.targets or ()),
+            tp1=signal.tp1,
+            tp2=signal.tp2,
+            tp3=signal.tp3,
+            tp4=signal.tp4,
+            stop_loss=signal.stop_loss,
+            reason=signal.reason,
+            confidence=float(signal.confidence or 0.0),
+            is_valid=bool(signal.is_valid),
+            parse_errors=tuple(signal.parse_errors or ()),
+            raw_text=signal.raw_text if keep_text else None
+        )
+
+    def as_datetime(self) -> datetime:
+        """Время сигнала как datetime (naive/UTC как в исходном сигнале)"""
+        if self.naive_timestamp:
+            return datetime.fromtimestamp(self.timestamp)
+        return datetime.fromtimestamp(self.timestamp, tz=timezone.utc)
+
+    def to_parsed(self) -> ParsedSignal:
+        """Обратно в ParsedSignal для существующего кода"""
+        return ParsedSignal(
+            signal_id=self.signal_id,
+            source=self.source,
+            trader_id=self.trader_id,
+            raw_text=self.raw_text or "",
+            timestamp=self.as_datetime(),
+            symbol=self.symbol,
+            direction=self.direction,
+            leverage=self.leverage,
+            entry_zone=list(self.entry_zone),
+            entry_single=self.entry_single,
+            targets=list(self.targets),
+            tp1=self.tp1,
+            tp2=self.tp2,
+            tp3=self.tp3,
+            tp4=self.tp4,
+            stop_loss=self.stop_loss,
+            reason=self.reason,
+            confidence=self.confidence,
+            is_valid=self.is_valid,
+            parse_errors=list(self.parse_errors)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-совместимый словарь (только на границе: Supabase/Redis/HTTP)"""
+        return {
+            'signal_id': self.signal_id,
+            'source': self.source,
+            'trader_id': self.trader_id,
+            'raw_text': self.raw_text,
+            'timestamp': self.as_datetime().isoformat(),
+            'symbol': self.symbol,
+            'direction': self.direction.value if self.direction else None,
+            'leverage': self.leverage,
+            'entry_zone': list(self.entry_zone),
+            'entry_single': self.entry_single,
+            'targets': list(self.targets),
+            'tp1': self.tp1,
+            'tp2': self.tp2,
+            'tp3': self.tp3,
+            'tp4': self.tp4,
+            'stop_loss': self.stop_loss,
+            'reason': self.reason,
+            'confidence': self.confidence,
+            'is_valid': self.is_valid,
+            'parse_errors': list(self.parse_errors)
+        }
+
+    def encode(self) -> bytes:
+        """Бинарная сериализация (struct, без JSON)"""
+        flags = 0
+        if self.is_valid:
+            flags |= _FLAG_VALID
+        if self.raw_text is not None:
+            flags |= _FLAG_HAS_TEXT
+        if self.naive_timestamp:
+            flags |= _FLAG_NAIVE_TS
+
+        parts = [_HEADER.pack(
+            CODEC_VERSION, flags, _DIRECTION_CODES[self.direction],
+            len(self.entry_zone), len(self.targets), len(self.parse_errors),
+            self.timestamp, float(self.confidence),
+            _opt_float(self.entry_single), _opt_float(self.stop_loss),
+            _opt_float(self.tp1), _opt_float(self.tp2), _opt_float(self.tp3), _opt_float(self.tp4)
+        )]
+
+        prices = self.entry_zone + self.targets
+        if prices:
+            parts.append(struct.pack(f'<{len(prices)}d', *prices))
+
+        for value in (self.signal_id, self.source, self.trader_id, self.symbol, self.leverage, self.reason):
+            _pack_str(parts, value)
+        for error in self.parse_errors:
+            _pack_str(parts, error)
+        if self.raw_text is not None:
+            _pack_str(parts, self.raw_text)
+
+        return b''.join(parts)
+
+    @classmethod
+    def decode(cls, buffer: bytes) -> 'CompactSignal':
+        """Чтение из бинарного формата"""
+        (version, flags, direction_code, n_entry, n_targets, n_errors,
+         timestamp, confidence, entry_single, stop_loss,
+         tp1, tp2, tp3, tp4) = _HEADER.unpack_from(buffer, 0)
+
+        if version != CODEC_VERSION:
+            raise ValueError(f"Unsupported signal codec version: {version}")
+
+        offset = _HEADER.size
+        n_prices = n_entry + n_targets
+        prices = struct.unpack_from(f'<{n_prices}d', buffer, offset) if n_prices else ()
+        offset += 8 * n_prices
+
+        strings = []
+        for _ in range(6 + n_errors + (1 if flags & _FLAG_HAS_TEXT else 0)):
+            value, offset = _unpack_str(buffer, offset)
+            strings.append(value)
+
+        signal_id, source, trader_id, symbol, leverage, reason = strings[:6]
+        parse_errors = tuple(strings[6:6 + n_errors])
+        raw_text = strings[6 + n_errors] if flags & _FLAG_HAS_TEXT else None
+
+        return cls(
+            signal_id=signal_id,
+            source=source,
+            trader_id=trader_id,
+            symbol=symbol,
+            direction=_DIRECTIONS[direction_code],
+            timestamp=timestamp,
+            naive_timestamp=bool(flags & _FLAG_NAIVE_TS),
+            leverage=leverage,
+            entry_zone=prices[:n_entry],
+            entry_single=_from_float(entry_single),
+            targets=prices[n_entry:],
+            tp1=_from_float(tp1),
+            tp2=_from_float(tp2),
+            tp3=_from_float(tp3),
+            tp4=_from_float(tp4),
+            stop_loss=_from_float(stop_loss),
+            reason=reason,
+            confidence=confidence,
+            is_valid=bool(flags & _FLAG_VALID),
+            parse_errors=parse_errors,
+            raw_text=raw_text
+        )
+
+
+def encode_signal(signal: ParsedSignal, keep_text: bool = True) -> bytes:
+    """ParsedSignal -> bytes"""
+    return CompactSignal.from_parsed(signal, keep_text).encode()
+
+
+def decode_signal(buffer: bytes) -> ParsedSignal:
+    """bytes -> ParsedSignal"""
+    return CompactSignal.decode(buffer).to_parsed()
+
+
+# Ошибки кодека на нестандартных значениях полей (direction-строка, строковые цены, int плечо)
+CODEC_ERRORS = (struct.error, TypeError, ValueError, KeyError, AttributeError)
+
+
+def signal_to_dict(signal: Any, keep_text: bool = True) -> Dict[str, Any]:
+    """Словарь сигнала без кодека - для значений, которые кодек не принимает"""
+    data = {}
+    for key, value in vars(signal).items():
+        if isinstance(value, Enum):
+            value = value.value
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, tuple):
+            value = list(value)
+        data[key] = value
+    if not keep_text:
+        data['raw_text'] = None
+    return data
+
+
+class RecentSignalWindow:
+    """
+    Ограниченное окно последних сигналов в закодированном виде (bytes на сигнал)
+    Сигнал, который кодек не принимает, хранится словарем - окно не теряет сигналы из-за одного поля
+    """
+
+    def __init__(self, maxlen: int = 10000, keep_text: bool = False):
+        self.keep_text = keep_text
+        self._items: Deque[Union[bytes, Dict[str, Any]]] = deque(maxlen=maxlen)
+        self._sizes: Deque[int] = deque(maxlen=maxlen)
+        self._bytes = 0
+        self.fallback_count = 0
+
+    def append(self, signal: ParsedSignal):
+        try:
+            item = encode_signal(signal, self.keep_text)
+            size = len(item)
+        except CODEC_ERRORS:
+            item = signal_to_dict(signal, self.keep_text)
+            size = len(json.dumps(item, default=str))
+            self.fallback_count += 1
+        if len(self._items) == self._items.maxlen:
+            self._bytes -= self._sizes[0]
+        self._items.append(item)
+        self._sizes.append(size)
+        self._bytes += size
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @staticmethod
+    def _decode(item: Union[bytes, Dict[str, Any]]) -> Union[CompactSignal, Dict[str, Any]]:
+        return CompactSignal.decode(item) if isinstance(item, bytes) else item
+
+    def __iter__(self) -> Iterator[Union[CompactSignal, Dict[str, Any]]]:
+        # Декодируем лениво - только то, что реально читают
+        for item in self._items:
+            yield self._decode(item)
+
+    def latest(self, limit: int = 50) -> List[Union[CompactSignal, Dict[str, Any]]]:
+        """Последние сигналы, новые первыми (словарь - для сигналов, не прошедших кодек)"""
+        result = []
+        for item in reversed(self._items):
+            if len(result) >= limit:
+                break
+            result.append(self._decode(item))
+        return result
+
+    def latest_dicts(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Последние сигналы словарями, новые первыми"""
+        return [item if isinstance(item, dict) else item.to_dict() for item in self.latest(limit)]
+
+    def memory_bytes(self) -> int:
+        """Размер закодированных данных окна"""
+        return self._bytes
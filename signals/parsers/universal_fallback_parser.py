@@ -17,8 +17,7 @@ class UniversalFallbackParser(SignalParserBase):
     """Универсальный fallback парсер для любых торговых сигналов"""
     
     def __init__(self):
-        super().__init__()
-        self.source_name = "universal_fallback"
+        super().__init__("universal_fallback")
         logger.info("✅ Universal Fallback Parser initialized")
     
     def can_parse(self, text: str) -> bool:
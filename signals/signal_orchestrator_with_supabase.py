@@ -26,9 +26,15 @@ from signals.parsers.ghost_test_parser import GhostTestParser
 from signals.parsers.universal_fallback_parser import UniversalFallbackParser
 from signals.parsers.signal_parser_base import ParsedSignal
 
+from signals.parsers.parser_executor import create_parser_executor_from_env, spec_for
+from signals.parsers.signal_codec import RecentSignalWindow
+from core.message_dedupe import ContentDedupe
+from core.trader_registry import get_trader_registry_cache
+from core.write_behind import WriteBehindWriter
+
 # Импортируем CryptoAttack24 парсер
 try:
-    from signals.parsers.cryptoattack24_parser import CryptoAttack24Parser
+    from signals.parsers.cryptoattack24_parser import CryptoAttack24Wrapper
     CRYPTOATTACK24_AVAILABLE = True
 except ImportError:
     CRYPTOATTACK24_AVAILABLE = False
@@ -77,48 +83,46 @@ class SignalOrchestratorWithSupabase:
         
         # Добавляем CryptoAttack24 парсер если доступен
         if CRYPTOATTACK24_AVAILABLE:
-            # Создаем wrapper для совместимости с SignalParserBase
-            class CryptoAttack24Wrapper:
-                def __init__(self):
-                    self.parser = CryptoAttack24Parser()
-                    self.source_name = "cryptoattack24"
-                
-                def can_parse(self, text: str) -> bool:
-                    return self.parser._is_noise(text) == False and len(text.strip()) > 20
-                
-                def parse_signal(self, text: str, trader_id: str) -> Optional[ParsedSignal]:
-                    result = self.parser.parse_message(text)
-                    if result and result.confidence >= 0.6:
-                        # Конвертируем в ParsedSignal формат
-                        return self._convert_to_parsed_signal(result, trader_id, text)
-                    return None
-                
-                def _convert_to_parsed_signal(self, ca24_signal, trader_id: str, raw_text: str) -> ParsedSignal:
-                    from signals.parsers.signal_parser_base import SignalDirection
-                    
-                    # Определяем направление на основе действия
-                    direction = SignalDirection.BUY if ca24_signal.action in ["pump", "growth"] else SignalDirection.SELL
-                    
-                    signal = ParsedSignal(
-                        signal_id=f"{trader_id}_{int(datetime.now().timestamp())}",
-                        source="cryptoattack24",
-                        trader_id=trader_id,
-                        raw_text=raw_text,
-                        timestamp=ca24_signal.timestamp or datetime.now(),
-                        symbol=ca24_signal.symbol,
-                        direction=direction
-                    )
-                    
-                    # Дополнительные поля
-                    signal.confidence = ca24_signal.confidence
-                    signal.reason = ca24_signal.context
-                    signal.is_valid = True
-                    
-                    return signal
-            
             self.parsers['cryptoattack24'] = CryptoAttack24Wrapper()
             logger.info("✅ CryptoAttack24 parser integrated successfully")
         
+        # Универсальный fallback парсер (последний кандидат при выборе)
+        self.fallback_parser = UniversalFallbackParser()
+        
+        # Опциональный пул процессов для regex-парсинга (GHOST_PARSER_WORKERS > 0)
+        parser_specs = {name: spec_for(parser) for name, parser in self.parsers.items()}
+        parser_specs['universal_fallback'] = spec_for(self.fallback_parser)
+        self.parser_executor = create_parser_executor_from_env(
+            {name: spec for name, spec in parser_specs.items() if spec}
+        )
+        if self.parser_executor:
+            logger.info(f"✅ Parser executor enabled: {self.parser_executor.workers} workers")
+        
+        # Окно последних сигналов в бинарном виде (GHOST_RECENT_SIGNALS штук)
+        self.recent_signals = RecentSignalWindow(maxlen=int(os.getenv('GHOST_RECENT_SIGNALS', '50000') or 50000))
+        
+        # Анти-дубликат сырых сигналов по хешу текста в фиксированном окне (GHOST_RAW_DEDUPE_HOURS, по умолчанию 2ч)
+        self.raw_dedupe = ContentDedupe(
+            window_seconds=float(os.getenv('GHOST_RAW_DEDUPE_HOURS', '2') or 2) * 3600
+        )
+        # Колонка signals_raw.content_hash (уникальная) - сбрасывается, если миграция не применена
+        self._raw_hash_column = True
+        
+        # Write-behind (GHOST_WRITE_BEHIND=1): строки уходят в локальный outbox, в Supabase - пачками в фоне
+        self.write_behind: Optional[WriteBehindWriter] = None
+        if self.supabase and os.getenv('GHOST_WRITE_BEHIND', '0') == '1':
+            self.write_behind = WriteBehindWriter(self.supabase, conflict_keys={
+                'signals_raw': 'content_hash',
+                'signals_parsed': 'checksum',
+                'v_trades': 'id'
+            }, optional_keys={'signals_raw'})  # без миграции 002 signals_raw пишется без content_hash
+            logger.info("✅ Write-behind persistence enabled")
+        
+        # Кеш trader_registry: загрузка при старте, дальше проверки трейдера без запросов
+        self.trader_cache = get_trader_registry_cache()
+        if self.supabase:
+            self.trader_cache.load(self.supabase)
+        
         # Статистика
         self.stats = {
             'signals_processed': 0,
@@ -142,6 +146,10 @@ class SignalOrchestratorWithSupabase:
     async def start_telegram_listening(self):
         """Запуск прослушивания Telegram каналов"""
         try:
+            # Досылаем то, что осталось в write-behind outbox с прошлого запуска
+            if self.write_behind:
+                self.write_behind.start()
+            
             from core.telegram_listener import TelegramListener
             
             api_id = os.getenv('TELEGRAM_API_ID')
@@ -247,137 +255,48 @@ class SignalOrchestratorWithSupabase:
             # Сначала сохраняем сырой сигнал в Supabase
             await self._save_raw_signal_to_supabase(trader_id, raw_text)
             
-            # Этап 1: Выбор лучшего парсера
-            best_parser = None
-            best_parser_name = None
+            # Этап 1: Выбор лучшего парсера и парсинг
+            candidates = self._parser_candidates(trader_id, source_hint)
             
-            # ПРИОРИТЕТ: Сначала ищем специальный парсер для этого трейдера
-            if trader_id in self.parsers:
-                parser = self.parsers[trader_id]
-                logger.info(f"🎯 Проверяем специализированный парсер для {trader_id}: {type(parser).__name__}")
-                
-                if parser.can_parse(raw_text):
-                    best_parser = parser
-                    best_parser_name = trader_id
-                    logger.info(f"✅ Используем специализированный парсер: {trader_id}")
-                else:
-                    logger.info(f"⚠️ Специализированный парсер {trader_id} не может обработать этот текст")
+            if self.parser_executor and not image_data:
+                # Парсинг в пуле процессов с бюджетом времени - event loop не блокируется
+                best_parser_name, signal = await self.parser_executor.select_and_parse(candidates, raw_text, trader_id)
+            elif image_data:
+                # Изображение разбирается синхронным OCR (Tesseract) - в потоке, чтобы не держать listener
+                best_parser_name, signal = await asyncio.to_thread(
+                    self._select_and_parse, candidates, raw_text, trader_id, image_data, image_format
+                )
             else:
-                logger.warning(f"⚠️ Специализированный парсер для {trader_id} не найден!")
-                logger.info(f"   Доступные парсеры: {list(self.parsers.keys())}")
-            
-            # Если специализированный не найден, пробуем подсказку источника
-            if not best_parser and source_hint and source_hint in self.parsers:
-                parser = self.parsers[source_hint]
-                if parser.can_parse(raw_text):
-                    best_parser = parser
-                    best_parser_name = source_hint
-            
-            # Если ничего не сработало, используем приоритетный порядок
-            if not best_parser:
-                # Порядок приоритета парсеров
-                priority_order = ['whales_crypto_guide', 'cryptoattack24', 
-                                '2trade_premium', 'crypto_hub_vip']
-                
-                for parser_name in priority_order:
-                    if parser_name in self.parsers:
-                        parser = self.parsers[parser_name]
-                        # Для Ghost Test передаем информацию об изображении в can_parse
-                        if parser_name == "ghostsignaltest" and hasattr(parser, 'can_parse'):
-                            try:
-                                can_parse_result = parser.can_parse(raw_text, has_image=bool(image_data))
-                            except TypeError:
-                                can_parse_result = parser.can_parse(raw_text)
-                        else:
-                            can_parse_result = parser.can_parse(raw_text)
-                            
-                        if can_parse_result:
-                            best_parser = parser
-                            best_parser_name = parser_name
-                            break
-                
-                # Если приоритетные не сработали, пробуем остальные
-                if not best_parser:
-                    for parser_name, parser in self.parsers.items():
-                        if parser_name not in priority_order:
-                            # Для Ghost Test передаем информацию об изображении в can_parse
-                            if parser_name == "ghostsignaltest" and hasattr(parser, 'can_parse'):
-                                try:
-                                    can_parse_result = parser.can_parse(raw_text, has_image=bool(image_data))
-                                except TypeError:
-                                    can_parse_result = parser.can_parse(raw_text)
-                            else:
-                                can_parse_result = parser.can_parse(raw_text)
-                                
-                            if can_parse_result:
-                                best_parser = parser
-                                best_parser_name = parser_name
-                                break
-            
-            # Если ни один специализированный парсер не сработал, пробуем fallback
-            if not best_parser:
-                # Создаем fallback парсер если его нет
-                if not hasattr(self, 'fallback_parser'):
-                    self.fallback_parser = UniversalFallbackParser()
-                    
-                logger.info("🤖 Пробуем универсальный fallback парсер...")
-                if self.fallback_parser.can_parse(raw_text):
-                    signal = self.fallback_parser.parse_signal(raw_text, trader_id)
-                    if signal:
-                        logger.info(f"✅ Универсальный fallback парсер сработал!")
-                        
-                        # Сохраняем результат fallback парсера
-                        await self._save_parsed_signal_to_supabase(signal, 'universal_fallback', raw_text)
-                        
-                        if trader_id in ['ghostsignaltest', 'ghost_test']:
-                            await self._save_to_v_trades_table(signal, trader_id, raw_text)
-                        
-                        # Статистика зависит от валидности
-                        if signal.is_valid:
-                            self.stats['signals_saved'] += 1
-                            logger.info(f"✅ VALID fallback signal: {signal.symbol} {signal.direction}")
-                        else:
-                            logger.warning(f"⚠️ INVALID fallback signal: {signal.symbol} {signal.direction} | Errors: {signal.parse_errors}")
-                        
-                        self.stats['parsers_used']['universal_fallback'] = self.stats['parsers_used'].get('universal_fallback', 0) + 1
-                        return signal
-                else:
-                    logger.warning("⚠️ Даже fallback парсер не может обработать этот текст")
+                best_parser_name, signal = self._select_and_parse(candidates, raw_text, trader_id, image_data, image_format)
             
-            if not best_parser:
+            if not best_parser_name:
                 logger.warning(f"⚠️ No suitable parser found for signal from {trader_id}")
                 self.stats['signals_failed'] += 1
                 return None
             
-            # Парсим сигнал (с поддержкой изображений для Ghost Test)
-            if trader_id == "ghostsignaltest" and hasattr(best_parser, 'parse_signal') and image_data:
-                # Для Ghost Test Parser передаем image_data
-                try:
-                    signal = best_parser.parse_signal(raw_text, trader_id, image_data=image_data, image_format=image_format)
-                    logger.info("🖼️ Used Ghost Test Parser with image support")
-                except TypeError:
-                    # Fallback если метод не поддерживает image_data
-                    signal = best_parser.parse_signal(raw_text, trader_id)
-                    logger.warning("⚠️ Ghost Test Parser doesn't support image_data, using text only")
-            else:
-                # Обычный вызов для всех остальных парсеров
-                signal = best_parser.parse_signal(raw_text, trader_id)
-            
             if not signal:
                 logger.warning(f"⚠️ Failed to parse signal with {best_parser_name}")
                 self.stats['signals_failed'] += 1
                 return None
             
             # Обновляем статистику парсера
-            self.stats['parsers_used'][best_parser_name] += 1
+            self.stats['parsers_used'][best_parser_name] = self.stats['parsers_used'].get(best_parser_name, 0) + 1
             
             # Сохраняем ВСЕ сигналы в Supabase (включая невалидные)
             await self._save_parsed_signal_to_supabase(signal, best_parser_name, raw_text)
             
             # Для тестового канала ghostsignaltest также сохраняем в v_trades
-            if trader_id in ['ghostsignaltest', 'ghost_test'] and isinstance(self.parsers.get(trader_id), GhostTestParser):
+            if trader_id in ['ghostsignaltest', 'ghost_test'] and (
+                best_parser_name == 'universal_fallback' or isinstance(self.parsers.get(trader_id), GhostTestParser)
+            ):
                 await self._save_to_v_trades_table(signal, trader_id, raw_text)
             
+            # Окно в памяти - после сохранения: его ошибка не должна терять сигнал
+            try:
+                self.recent_signals.append(signal)
+            except Exception as e:
+                logger.warning(f"⚠️ Recent signals window skipped {getattr(signal, 'symbol', None)}: {e}")
+            
             # Статистика зависит от валидности
             if signal.is_valid:
                 self.stats['signals_saved'] += 1
@@ -392,21 +311,83 @@ class SignalOrchestratorWithSupabase:
             self.stats['signals_failed'] += 1
             return None
     
+    def _parser_candidates(self, trader_id: str, source_hint: str = None) -> List[str]:
+        """Порядок проверки парсеров: специализированный, подсказка источника, приоритетные, остальные, fallback"""
+        candidates = []
+        
+        # ПРИОРИТЕТ: Сначала специальный парсер для этого трейдера
+        if trader_id in self.parsers:
+            candidates.append(trader_id)
+        else:
+            logger.warning(f"⚠️ Специализированный парсер для {trader_id} не найден!")
+            logger.info(f"   Доступные парсеры: {list(self.parsers.keys())}")
+        
+        # Затем подсказка источника
+        if source_hint and source_hint in self.parsers:
+            candidates.append(source_hint)
+        
+        # Порядок приоритета парсеров
+        priority_order = ['whales_crypto_guide', 'cryptoattack24', 
+                        '2trade_premium', 'crypto_hub_vip']
+        candidates.extend(name for name in priority_order if name in self.parsers)
+        candidates.extend(name for name in self.parsers if name not in priority_order)
+        
+        # Универсальный fallback - последним
+        candidates.append('universal_fallback')
+        
+        # Убираем повторы, сохраняя порядок
+        return list(dict.fromkeys(candidates))
+    
+    def _select_and_parse(self, candidates: List[str], raw_text: str, trader_id: str,
+                          image_data: Optional[bytes] = None, image_format: str = "PNG"):
+        """Выбор первого подходящего парсера и парсинг в текущем процессе"""
+        for parser_name in candidates:
+            parser = self.fallback_parser if parser_name == 'universal_fallback' else self.parsers.get(parser_name)
+            if parser is None:
+                continue
+            
+            # Для Ghost Test передаем информацию об изображении в can_parse
+            if parser_name == "ghostsignaltest" and image_data:
+                try:
+                    can_parse_result = parser.can_parse(raw_text, has_image=True)
+                except TypeError:
+                    can_parse_result = parser.can_parse(raw_text)
+            else:
+                can_parse_result = parser.can_parse(raw_text)
+            
+            if not can_parse_result:
+                continue
+            
+            logger.info(f"✅ Используем парсер: {parser_name} ({type(parser).__name__})")
+            
+            # Парсим сигнал (с поддержкой изображений для Ghost Test)
+            if trader_id == "ghostsignaltest" and image_data:
+                try:
+                    signal = parser.parse_signal(raw_text, trader_id, image_data=image_data, image_format=image_format)
+                    logger.info("🖼️ Used Ghost Test Parser with image support")
+                except TypeError:
+                    # Fallback если метод не поддерживает image_data
+                    signal = parser.parse_signal(raw_text, trader_id)
+                    logger.warning("⚠️ Ghost Test Parser doesn't support image_data, using text only")
+            else:
+                signal = parser.parse_signal(raw_text, trader_id)
+            
+            return parser_name, signal
+        
+        return None, None
+    
     async def _save_raw_signal_to_supabase(self, trader_id: str, raw_text: str):
         """Сохранение сырого сигнала в Supabase с дедупликацией"""
+        dedupe_key = None
         try:
             if not self.supabase:
                 logger.warning("⚠️ Supabase not available, skipping raw signal save")
                 return
 
-            # Проверяем дубликаты по трейдеру и тексту за последние 2 часа
-            from datetime import timedelta
-            two_hours_ago = (datetime.now() - timedelta(hours=2)).isoformat()
-
-            # Исправлено: убираем select('id') так как колонки id нет в таблице
-            existing = self.supabase.table('signals_raw').select('*').eq('trader_id', trader_id).eq('text', raw_text.strip()).gte('created_at', two_hours_ago).limit(1).execute()
-            
-            if existing.data:
+            # Дубликат по трейдеру и тексту в фиксированном окне - проверка в памяти, без запроса в БД;
+            # тот же ключ пишется в signals_raw.content_hash, так что БД и память решают одинаково
+            dedupe_key = self.raw_dedupe.bucket_key(trader_id, raw_text)
+            if not self.raw_dedupe.check_and_add(dedupe_key):
                 logger.info(f"🔄 Duplicate signal ignored from {trader_id} (text: {raw_text[:30]}...)")
                 self.stats['duplicates_skipped'] = self.stats.get('duplicates_skipped', 0) + 1
                 return
@@ -419,8 +400,36 @@ class SignalOrchestratorWithSupabase:
                 'processed': False
             }
             
-            # Сохраняем в таблицу signals_raw
-            result = self.supabase.table('signals_raw').insert(raw_data).execute()
+            if self.write_behind:
+                # content_hash обязателен: по нему upsert идемпотентен при повторной отправке
+                raw_data['content_hash'] = dedupe_key
+                self.write_behind.enqueue('signals_raw', raw_data)
+                self.stats['raw_signals_saved'] = self.stats.get('raw_signals_saved', 0) + 1
+                return
+            
+            result = None
+            if self._raw_hash_column:
+                # Уникальный хеш (трейдер, текст, окно) - БД сама отсекает дубликаты других процессов
+                raw_data['content_hash'] = dedupe_key
+                try:
+                    result = self.supabase.table('signals_raw').upsert(
+                        raw_data, on_conflict='content_hash', ignore_duplicates=True
+                    ).execute()
+                except Exception as e:
+                    if 'content_hash' not in str(e):
+                        raise
+                    logger.warning("⚠️ signals_raw.content_hash missing - apply database/migrations/002_signals_raw_content_hash.sql")
+                    self._raw_hash_column = False
+                    raw_data.pop('content_hash', None)
+                
+                if result is not None and not result.data:
+                    logger.info(f"🔄 Duplicate signal ignored by database from {trader_id}")
+                    self.stats['duplicates_skipped'] = self.stats.get('duplicates_skipped', 0) + 1
+                    return
+            
+            if result is None:
+                # Сохраняем в таблицу signals_raw
+                result = self.supabase.table('signals_raw').insert(raw_data).execute()
             
             if result.data:
                 logger.info(f"✅ Raw signal saved to Supabase from {trader_id}")
@@ -432,6 +441,9 @@ class SignalOrchestratorWithSupabase:
         except Exception as e:
             logger.error(f"❌ Failed to save raw signal: {e}")
             self.stats['supabase_errors'] += 1
+            # Не сохранили - повтор того же текста не должен считаться дубликатом
+            if dedupe_key:
+                self.raw_dedupe.discard(dedupe_key)
     
     async def _save_parsed_signal_to_supabase(self, signal: ParsedSignal, parser_name: str, raw_text: str):
         """Сохранение обработанного сигнала в Supabase"""
@@ -474,10 +486,15 @@ class SignalOrchestratorWithSupabase:
                 'checksum': f"{signal.trader_id[:10]}_{signal.symbol[:10]}_{int(datetime.now().timestamp())}_{abs(hash(raw_text)) % 100000}"
             }
             
-            # Сохраняем в таблицу signals_parsed
-            result = self.supabase.table('signals_parsed').insert(signal_data).execute()
+            # Сохраняем в таблицу signals_parsed (checksum уникален - ключ идемпотентности для write-behind)
+            if self.write_behind:
+                self.write_behind.enqueue('signals_parsed', signal_data)
+                saved = True
+            else:
+                result = self.supabase.table('signals_parsed').insert(signal_data).execute()
+                saved = bool(result.data)
             
-            if result.data:
+            if saved:
                 logger.info(f"✅ Parsed signal saved to Supabase: {signal.symbol}")
                 self.stats['supabase_saves'] += 1
             else:
@@ -612,10 +629,15 @@ class SignalOrchestratorWithSupabase:
                 'updated_at': current_timestamp.isoformat()
             }
             
-            # Сохраняем в таблицу v_trades
-            result = self.supabase.table('v_trades').insert(v_trades_data).execute()
+            # Сохраняем в таблицу v_trades (id генерируется здесь - повтор из outbox не создаст дубль)
+            if self.write_behind:
+                self.write_behind.enqueue('v_trades', v_trades_data)
+                saved = True
+            else:
+                result = self.supabase.table('v_trades').insert(v_trades_data).execute()
+                saved = bool(result.data)
             
-            if result.data:
+            if saved:
                 is_valid = getattr(signal, 'is_valid', True)
                 status = 'cancelled' if not is_valid else 'sim_open'
                 validation_info = ""
@@ -675,29 +697,30 @@ class SignalOrchestratorWithSupabase:
             'uptime_human': str(uptime),
             'supabase_connected': self.supabase is not None,
             'parsers_available': list(self.parsers.keys()),
+            'recent_signals': len(self.recent_signals),
+            'recent_signals_bytes': self.recent_signals.memory_bytes(),
+            'recent_signals_uncompressed': self.recent_signals.fallback_count,
+            'raw_dedupe': self.raw_dedupe.get_stats(),
+            'trader_cache': self.trader_cache.get_stats(),
+            'write_behind': self.write_behind.get_stats() if self.write_behind else None,
             'success_rate': (self.stats['signals_saved'] / max(self.stats['signals_processed'], 1)) * 100
         }
     
+    def get_recent_signals(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Последние сигналы в виде словарей (конвертация только здесь, на выходе)"""
+        return self.recent_signals.latest_dicts(limit)
+    
     async def _ensure_trader_exists(self, trader_id: str, source_hint: str = None):
         """Убеждаемся что трейдер существует в trader_registry"""
         try:
             if not self.supabase:
                 return
             
-            # Проверяем существует ли трейдер
-            result = self.supabase.table('trader_registry').select('trader_id').eq('trader_id', trader_id).execute()
+            # Проверка по кешу; новый трейдер вставляется сквозь кеш
+            await self.trader_cache.ensure(
+                self.supabase, trader_id, lambda: self._get_trader_info(trader_id, source_hint)
+            )
             
-            if not result.data:
-                # Создаем нового трейдера
-                trader_info = self._get_trader_info(trader_id, source_hint)
-                
-                insert_result = self.supabase.table('trader_registry').insert(trader_info).execute()
-                
-                if insert_result.data:
-                    logger.info(f"✅ Создан новый трейдер: {trader_id}")
-                else:
-                    logger.error(f"❌ Ошибка создания трейдера: {trader_id}")
-                    
         except Exception as e:
             logger.error(f"❌ Ошибка проверки трейдера: {e}")
     
@@ -779,6 +802,13 @@ class SignalOrchestratorWithSupabase:
         
         return None
 
+    async def stop(self):
+        """Остановка: сброс write-behind outbox (остаток переживет рестарт) и пула процессов-парсеров"""
+        if self.write_behind:
+            await self.write_behind.stop()
+        if self.parser_executor:
+            await self.parser_executor.stop()
+    
     async def test_supabase_connection(self) -> bool:
         """Тест подключения к Supabase"""
         try:
@@ -5,7 +5,7 @@ GHOST Trader Detector
 
 import re
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
@@ -27,13 +27,61 @@ class DetectionPattern:
     exclusion_patterns: List[str]
     min_confidence: float
 
+# Символы, которые re.IGNORECASE сопоставляет с ASCII буквами, а str.lower() - нет
+_IGNORECASE_EXTRA_FOLD = str.maketrans({'\u017f': 's', '\u0131': 'i'})
+
+def _literal_prefix(pattern: str) -> str:
+    """Литеральное начало regex (обязательная подстрока любого совпадения) для быстрой префильтрации"""
+    if '|' in pattern:
+        return ''
+    
+    prefix = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                break  # \s, \d и т.п. - уже не литерал
+            literal = pattern[i + 1]
+            i += 2
+        elif char in '.^$*+?{}[]()':
+            break
+        else:
+            literal = char
+            i += 1
+        
+        # Квантификатор делает последний символ необязательным
+        if i < len(pattern) and pattern[i] in '*?{':
+            break
+        prefix.append(literal)
+        if i < len(pattern) and pattern[i] == '+':
+            break
+    
+    return ''.join(prefix).lower()
+
 class TraderDetector:
     """Класс для автоматического определения трейдеров"""
     
     def __init__(self):
         self.patterns = self._initialize_patterns()
+        self._compile_patterns()
         logger.info("Trader Detector initialized with patterns for different trading styles")
     
+    def _compile_patterns(self):
+        """Общая таблица уникальных ключевых слов и regex всех стилей (каждый проверяется один раз на сообщение)"""
+        keywords: Dict[str, None] = {}
+        regexes: Dict[str, Tuple[re.Pattern, str]] = {}
+        
+        for pattern in self.patterns.values():
+            for keyword in pattern.keywords:
+                keywords.setdefault(keyword.lower(), None)
+            for regex in pattern.required_patterns + pattern.optional_patterns + pattern.exclusion_patterns:
+                if regex not in regexes:
+                    regexes[regex] = (re.compile(regex, re.IGNORECASE), _literal_prefix(regex))
+        
+        self._keywords = list(keywords)
+        self._regexes = list(regexes.items())
+    
     def _initialize_patterns(self) -> Dict[TraderStyle, DetectionPattern]:
         """Инициализация паттернов для каждого стиля трейдера"""
         
@@ -122,9 +170,12 @@ class TraderDetector:
         best_confidence = 0.0
         best_details = {}
         
+        # Один проход по тексту для всех стилей, затем только арифметика по найденному
+        hits = self._scan(text_clean)
+        
         # Проверяем каждый стиль
         for style, pattern in self.patterns.items():
-            confidence, details = self._calculate_confidence(text_clean, pattern)
+            confidence, details = self._score(pattern, *hits)
             
             if confidence > best_confidence and confidence >= pattern.min_confidence:
                 best_match = style
@@ -137,13 +188,37 @@ class TraderDetector:
     
     def _clean_text(self, text: str) -> str:
         """Очистка и нормализация текста"""
-        # Убираем лишние пробелы и переносы
-        text = re.sub(r'\s+', ' ', text.strip())
-        return text
+        # Убираем лишние пробелы и переносы (то же, что re.sub(r'\s+', ' ', text.strip()))
+        return ' '.join(text.split())
+    
+    def _scan(self, text: str) -> Tuple[Set[str], Set[str]]:
+        """Найденные в тексте ключевые слова и regex (общие для всех стилей)"""
+        text_lower = text.lower()
+        text_folded = text_lower.translate(_IGNORECASE_EXTRA_FOLD)
+        
+        # Позиции совпадают с исходным текстом, если lower() не менял длину
+        same_positions = len(text_folded) == len(text)
+        
+        keyword_hits = {keyword for keyword in self._keywords if keyword in text_lower}
+        
+        # Литеральный префикс отсекает regex без шансов на совпадение до запуска движка,
+        # а поиск начинается с первого вхождения префикса
+        pattern_hits = set()
+        for source, (regex, anchor) in self._regexes:
+            position = text_folded.find(anchor)
+            if position < 0:
+                continue
+            if regex.search(text, position if same_positions else 0):
+                pattern_hits.add(source)
+        
+        return keyword_hits, pattern_hits
     
     def _calculate_confidence(self, text: str, pattern: DetectionPattern) -> Tuple[float, Dict]:
         """Расчет уверенности для конкретного паттерна"""
-        text_lower = text.lower()
+        return self._score(pattern, *self._scan(text))
+    
+    def _score(self, pattern: DetectionPattern, keyword_hits: Set[str], pattern_hits: Set[str]) -> Tuple[float, Dict]:
+        """Расчет уверенности стиля по результатам общего прохода"""
         details = {
             'matched_keywords': [],
             'matched_required': [],
@@ -154,7 +229,7 @@ class TraderDetector:
         # Проверяем ключевые слова
         keyword_score = 0
         for keyword in pattern.keywords:
-            if keyword.lower() in text_lower:
+            if keyword.lower() in keyword_hits:
                 details['matched_keywords'].append(keyword)
                 keyword_score += 1
         
@@ -163,7 +238,7 @@ class TraderDetector:
         # Проверяем обязательные паттерны
         required_score = 0
         for req_pattern in pattern.required_patterns:
-            if re.search(req_pattern, text, re.IGNORECASE):
+            if req_pattern in pattern_hits:
                 details['matched_required'].append(req_pattern)
                 required_score += 1
         
@@ -172,7 +247,7 @@ class TraderDetector:
         # Проверяем опциональные паттерны
         optional_score = 0
         for opt_pattern in pattern.optional_patterns:
-            if re.search(opt_pattern, text, re.IGNORECASE):
+            if opt_pattern in pattern_hits:
                 details['matched_optional'].append(opt_pattern)
                 optional_score += 1
         
@@ -181,7 +256,7 @@ class TraderDetector:
         # Проверяем исключающие паттерны
         exclusion_penalty = 0
         for excl_pattern in pattern.exclusion_patterns:
-            if re.search(excl_pattern, text, re.IGNORECASE):
+            if excl_pattern in pattern_hits:
                 details['exclusions_found'].append(excl_pattern)
                 exclusion_penalty += 0.3  # Штраф за каждое исключение
         
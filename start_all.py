@@ -125,6 +125,9 @@ class UnifiedSystemManager:
             logger.error(f"❌ Критическая ошибка в цикле оркестратора: {e}")
             import traceback
             logger.error(traceback.format_exc())
+        finally:
+            # Завершение (в т.ч. отменой задачи): сброс outbox и остановка пула парсеров
+            await orchestrator.stop()
     
     async def start_orchestrator(self):
         """Запуск центрального оркестратора"""
@@ -109,6 +109,9 @@ class SimpleSystemManager:
             logger.error(f"❌ Критическая ошибка в цикле оркестратора: {e}")
             import traceback
             logger.error(traceback.format_exc())
+        finally:
+            # Завершение (в т.ч. отменой задачи): сброс outbox и остановка пула парсеров
+            await orchestrator.stop()
     
     def start_health_server(self):
         """Запуск HTTP сервера для health checks"""
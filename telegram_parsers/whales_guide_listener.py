@@ -9,7 +9,6 @@ import os
 import sys
 from datetime import datetime
 from typing import Optional
-import sqlite3
 import json
 
 # Добавляем путь к корню проекта
@@ -19,6 +18,7 @@ from telethon import TelegramClient, events
 from telethon.tl.types import Channel, Chat
 from signals.whales_crypto_parser import WhalesCryptoParser
 from database.supabase_client import SupabaseClient
+from core.sqlite_store import get_sqlite_store
 
 # Настройка логирования
 logging.basicConfig(
@@ -50,6 +50,7 @@ class WhalesGuideListener:
         # База данных
         self.supabase = SupabaseClient()
         self.local_db_path = 'whales_signals.db'
+        self.local_db = get_sqlite_store(self.local_db_path)
         
         # Telegram клиент
         self.client = None
@@ -67,12 +68,9 @@ class WhalesGuideListener:
     
     def init_local_database(self):
         """Инициализация локальной базы данных для кэширования"""
-        try:
-            conn = sqlite3.connect(self.local_db_path)
-            cursor = conn.cursor()
-            
+        def create_tables(conn):
             # Таблица для кэширования сообщений
-            cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS whales_messages (
                     id INTEGER PRIMARY KEY,
                     message_id INTEGER UNIQUE,
@@ -86,7 +84,7 @@ class WhalesGuideListener:
             ''')
             
             # Таблица для статистики
-            cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS stats (
                     id INTEGER PRIMARY KEY,
                     date DATE UNIQUE,
@@ -95,9 +93,9 @@ class WhalesGuideListener:
                     errors_count INTEGER DEFAULT 0
                 )
             ''')
-            
-            conn.commit()
-            conn.close()
+        
+        try:
+            self.local_db.run(create_tables).result()
             logger.info("✅ Local database initialized")
             
         except Exception as e:
@@ -239,10 +237,8 @@ class WhalesGuideListener:
     async def save_message_to_cache(self, message):
         """Сохранение сообщения в локальный кэш"""
         try:
-            conn = sqlite3.connect(self.local_db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
+            # Очередь писателя: обработчик сообщения не ждет диск
+            self.local_db.execute('''
                 INSERT OR IGNORE INTO whales_messages 
                 (message_id, channel_id, text, date) 
                 VALUES (?, ?, ?, ?)
@@ -253,9 +249,6 @@ class WhalesGuideListener:
                 message.date
             ))
             
-            conn.commit()
-            conn.close()
-            
         except Exception as e:
             logger.error(f"Error saving message to cache: {e}")
     
@@ -296,18 +289,12 @@ class WhalesGuideListener:
                 self.stats['signals_saved'] += 1
                 logger.info(f"💾 Signal saved to database: {signal.symbol}")
                 
-                # Обновляем локальный кэш
-                conn = sqlite3.connect(self.local_db_path)
-                cursor = conn.cursor()
-                
-                cursor.execute('''
+                # Обновляем локальный кэш (после INSERT этого сообщения - писатель FIFO)
+                self.local_db.execute('''
                     UPDATE whales_messages 
                     SET is_signal = TRUE, parsed_signal = ?
                     WHERE message_id = ?
                 ''', (json.dumps(signal_data), message.id))
-                
-                conn.commit()
-                conn.close()
             else:
                 logger.error("❌ Failed to save signal to database")
                 
@@ -349,6 +336,8 @@ class WhalesGuideListener:
         """Остановка слушателя"""
         if self.client:
             await self.client.disconnect()
+        # Дописать очередь локального кэша, не блокируя loop
+        await asyncio.to_thread(self.local_db.flush, 5.0)
         logger.info("🛑 Listener stopped")
         self.print_stats()
 